@@ -0,0 +1,60 @@
+"""Compares the HTML extraction backends against the original BeautifulSoup implementation.
+Usage: python benchmarks/bench_extract.py [--pages DIR] [--repeat N]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from bs4 import BeautifulSoup
+from utils.html_extract import SELECTORS, UNWANTED_TAGS, available_backends, extract_content
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pages')
+
+def legacy_extract(html: str) -> str:
+    # WebScraper._parse_content before pluggable backends: clean the whole document, then select
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(UNWANTED_TAGS):
+        element.decompose()
+    for selector in SELECTORS:
+        element = soup.select_one(selector)
+        if element:
+            return element.get_text(separator='\n', strip=True)
+    return ''
+
+def time_call(extract, html: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(html)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', default=PAGES_DIR, help='Directory of saved .html review pages')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pages, '*.html')))
+    backends = available_backends()
+    print(f"{'page':<28}{'size':>10}{'legacy ms':>12}" + ''.join(f'{b + " ms":>16}' for b in backends))
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        expected = legacy_extract(html)
+        legacy_ms = time_call(legacy_extract, html, args.repeat)
+
+        row = f"{os.path.basename(path):<28}{len(html) // 1024:>8}KB{legacy_ms:>12.2f}"
+        for backend in backends:
+            if extract_content(html, backend=backend, max_bytes=0) != expected:
+                print(f"warning: {backend} output differs from legacy on {os.path.basename(path)}")
+            ms = time_call(lambda h: extract_content(h, backend=backend, max_bytes=0), html, args.repeat)
+            row += f"{ms:>9.2f} ({legacy_ms / ms:>3.0f}x)"
+        print(row)
+
+if __name__ == '__main__':
+    main()
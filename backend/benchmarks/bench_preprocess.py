@@ -0,0 +1,67 @@
+"""Compares the OCR preprocessing tiers: latency of each tier and, when tesseract is installed, OCR accuracy
+against the ground-truth .txt next to each sample prescription.
+Usage: python benchmarks/bench_preprocess.py [--images DIR] [--repeat N]
+"""
+
+import argparse
+import difflib
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import pytesseract
+from PIL import Image
+from utils.image_processing import PREPROCESS_TIERS, ImageProcessor
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'images')
+
+def tesseract_available() -> bool:
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def accuracy(text: str, expected: str) -> float:
+    # Character-level similarity after collapsing whitespace, which tesseract reflows freely
+    return difflib.SequenceMatcher(None, ' '.join(text.split()), ' '.join(expected.split())).ratio()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=IMAGES_DIR, help='Directory of sample prescriptions with .txt ground truth')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    with_ocr = tesseract_available()
+    if not with_ocr:
+        print("tesseract not found, reporting latency only")
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images, '*')) if not p.endswith('.txt'))
+    modes = ['adaptive'] + PREPROCESS_TIERS
+    print(f"{'image':<28}{'noise':>7}" + ''.join(f'{m + " ms":>16}' for m in modes))
+
+    for path in paths:
+        image = Image.open(path)
+        image.load()
+        truth_path = os.path.splitext(path)[0] + '.txt'
+        expected = open(truth_path, encoding='utf-8').read() if os.path.exists(truth_path) else None
+
+        row, noise = '', 0.0
+        for mode in modes:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                processed, tier, noise = processor._preprocess_image(image, mode)
+            ms = (time.perf_counter() - start) / args.repeat * 1000
+            cell = f"{ms:.0f}" + (f" {tier}" if mode == 'adaptive' else '')
+            if with_ocr and expected is not None:
+                text = pytesseract.image_to_string(processed, config=processor.ocr_config)
+                cell += f" {accuracy(text, expected):.0%}"
+            row += f"{cell:>16}"
+        print(f"{os.path.basename(path):<28}{noise:>7.1f}{row}")
+
+if __name__ == '__main__':
+    main()
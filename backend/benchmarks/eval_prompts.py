@@ -0,0 +1,68 @@
+"""Checks that the compact prompt variant gives the same verdicts as the full one on a fixed fixture set.
+Needs PERPLEXITY_API_KEY, or SONAR_BASE_URL pointing at a compatible server; the verdict cache is bypassed.
+Exits non-zero when verdict agreement is below --min-agreement; cases that errored count as disagreements.
+Usage: python benchmarks/eval_prompts.py [--fixtures FILE] [--variant compact] [--min-agreement 0.9]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from prompts import PROMPTS, prompt_version, token_counts
+from sonar_client import SonarClient
+from verdict_cache import VerdictCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'prompt_eval.jsonl')
+
+def load_fixtures(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def verdict(client: SonarClient, variant: str, case: dict) -> dict:
+    client.prompt_variant = variant
+    return client.analyse(case['text'], case['model_type'])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=FIXTURES)
+    parser.add_argument('--baseline', default='full')
+    parser.add_argument('--variant', default='compact')
+    parser.add_argument('--min-agreement', type=float, default=0.9, help='Fraction of cases that must agree (default 0.9)')
+    args = parser.parse_args()
+
+    counts = token_counts()
+    print(f"{'template':<28}{'tokens':>8}")
+    for model_type, variants in PROMPTS.items():
+        for variant in (args.baseline, args.variant):
+            version = prompt_version(model_type, variant)
+            print(f"{version:<28}{counts[version]:>8}")
+    print()
+
+    client = SonarClient(cache=VerdictCache(max_entries=0, db_path=None))
+    cases = load_fixtures(args.fixtures)
+    agreed = 0
+    score_diffs = []
+    print(f"{'case':<26}{args.baseline:>14}{args.variant:>14}  agree")
+    for case in cases:
+        base = verdict(client, args.baseline, case)
+        other = verdict(client, args.variant, case)
+        if 'error' in base or 'error' in other:
+            print(f"{case['id']:<26}  error: {base.get('error') or other.get('error')}")
+            continue
+        same = base['fraud_detected'] == other['fraud_detected']
+        agreed += same
+        score_diffs.append(abs(float(base['confidence']) - float(other['confidence'])))
+        print(f"{case['id']:<26}{float(base['confidence']):>14.2f}{float(other['confidence']):>14.2f}  {'yes' if same else 'NO'}")
+
+    agreement = agreed / len(cases) if cases else 0.0
+    print(f"\nverdict agreement: {agreed}/{len(cases)} ({agreement:.0%})"
+          + (f", mean score difference: {sum(score_diffs) / len(score_diffs):.3f}" if score_diffs else ""))
+    if agreement < args.min_agreement:
+        print(f"FAIL: agreement below --min-agreement {args.min_agreement:.0%}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Local stand-in for the Sonar chat completions API, so the backend can be benchmarked without network access.
+Point the backend at it with SONAR_BASE_URL=http://127.0.0.1:8001 (any PERPLEXITY_API_KEY will do).
+Usage: python benchmarks/fake_sonar.py [--port 8001] [--latency 0.4] [--token-delay 0.02]
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+FRAUD_MARKERS = ('!!!', 'best ever', 'amazing', 'life changing', 'unlimited', 'no prescriber', 'cash only')
+
+def verdict_for(messages: List[Dict]) -> Dict:
+    # Deterministic answer for the last user message, so repeated runs see the same verdicts
+    content = messages[-1].get('content', '') if messages else ''
+    if isinstance(content, list):
+        content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+    text = content.lower()
+    flagged = [marker for marker in FRAUD_MARKERS if marker in text]
+    jitter = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:4], 16) / 0xFFFF * 0.1
+    if flagged:
+        return {"score": round(0.1 + jitter, 2), "verdict": "fraudulent", "indicators": flagged,
+                "reasoning": "Exaggerated, repetitive wording typical of fake content; recommend verification."}
+    return {"score": round(0.85 + jitter, 2), "verdict": "genuine", "indicators": [],
+            "reasoning": "Specific, balanced details with no manipulation markers; high confidence."}
+
+def split_tokens(text: str, size: int = 4) -> List[str]:
+    # Roughly token-sized pieces, the way the real API streams its answer
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class FakeSonarHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        answer = json.dumps(verdict_for(body.get('messages', [])))
+        time.sleep(server.latency)  # Time to first token
+        if body.get('stream'):
+            self._stream(body.get('model', 'sonar-pro'), answer)
+            return
+        time.sleep(server.token_delay * len(split_tokens(answer)))
+        self._send_json(200, {
+            "id": "fake-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'sonar-pro'),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _stream(self, model: str, answer: str) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for piece in split_tokens(answer):
+                chunk = {
+                    "id": "fake-completion",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(self.server.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.server.lock:
+                self.server.closed_early += 1  # e.g. score-only requests hang up once they have the score
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeSonarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: float = 0.4, token_delay: float = 0.02):
+        super().__init__(address, FakeSonarHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests = 0
+        self.closed_early = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+def start(port: int = 0, latency: float = 0.4, token_delay: float = 0.02) -> FakeSonarServer:
+    # Serves from a background thread; port 0 picks a free one
+    server = FakeSonarServer(('127.0.0.1', port), latency, token_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.4, help='Seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Seconds between streamed chunks')
+    args = parser.parse_args()
+
+    server = FakeSonarServer(('127.0.0.1', args.port), args.latency, args.token_delay)
+    print(f"Fake Sonar listening on {server.base_url} (set SONAR_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Measures cold-start import time of the backend entry points, each in a fresh interpreter, and lists which heavy
+libraries each import pulled in. Save a run with --save and compare later runs against it with --baseline.
+Usage: python benchmarks/import_time.py [--targets sonar_client,app,asgi] [--repeat 7]
+       python -X importtime -c "import app" 2> importtime.log  # Per-module breakdown of one target
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+HEAVY_MODULES = ('flask', 'quart', 'openai', 'httpx', 'numpy', 'PIL', 'cv2', 'pytesseract', 'bs4', 'lxml', 'selectolax')
+
+# Runs in the child; the import is timed from inside so interpreter startup is not counted
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(target: str, repeat: int) -> Dict:
+    timings = []
+    loaded: List[str] = []
+    env = dict(os.environ, PERPLEXITY_API_KEY=os.getenv('PERPLEXITY_API_KEY', 'benchmark'), JOB_QUEUE_PATH=':memory:')
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(target=target, heavy=HEAVY_MODULES)],
+            cwd=SRC_DIR, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {target} failed:\n{result.stderr}")
+        row = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(row['seconds'])
+        loaded = row['loaded']
+    return {
+        "target": target,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "loaded": loaded
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default='sonar_client,utils.web_scraper,app,asgi')
+    parser.add_argument('--repeat', type=int, default=7, help='Fresh interpreters per target')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against results saved with --save')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {row['target']: row for row in json.load(f)['results']}
+
+    rows = []
+    print(f"{'target':<20}{'median ms':>11}{'min ms':>9}  heavy modules loaded")
+    for target in args.targets.split(','):
+        row = measure(target, args.repeat)
+        rows.append(row)
+        change = ''
+        before = baseline.get(target, {}).get('median_ms')
+        if before:
+            change = f"  ({(row['median_ms'] - before) / before:+.0%} vs {before} ms)"
+        print(f"{target:<20}{row['median_ms']:>11}{row['min_ms']:>9}  {', '.join(row['loaded']) or '-'}{change}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"python": sys.version.split()[0], "results": rows}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
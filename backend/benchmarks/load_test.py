@@ -0,0 +1,174 @@
+"""Load test for /analyse that runs without network access: a fake Sonar (fake_sonar.py) and a local copy of the
+fixture review pages (static_site.py) stand in for the outside world. Reports p50/p95/p99 latency and requests/sec
+per scenario at rising concurrency. Save a run with --save and compare later runs against it with --baseline.
+Usage: python benchmarks/load_test.py [--scenarios text,url,image] [--concurrency 1,4,16,64] [--requests 64]
+       python benchmarks/load_test.py --target http://127.0.0.1:5000  # An already running server
+"""
+
+import argparse
+import base64
+import contextlib
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src'))
+
+import fake_sonar
+import static_site
+
+FIXTURES = os.path.join(BENCH_DIR, 'fixtures')
+
+def load_reviews() -> List[str]:
+    with open(os.path.join(FIXTURES, 'prompt_eval.jsonl'), encoding='utf-8') as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    return [case['text'] for case in cases if case['model_type'] == 'reviews']
+
+def load_images() -> List[bytes]:
+    images = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, 'images', '*'))):
+        if path.endswith(('.png', '.jpg')):
+            with open(path, 'rb') as f:
+                images.append(f.read())
+    return images
+
+def make_scenarios(site: Optional[static_site.StaticSite]) -> Dict[str, Callable[[int], List]]:
+    # Every request gets a unique input so that caching and request coalescing don't hide the work being measured
+    reviews = load_reviews()
+    images = load_images()
+    scenarios = {
+        "text": lambda i: ["text", f"{reviews[i % len(reviews)]} (order {i})"],
+        # Bytes after the end-of-image marker are ignored by decoders but make each upload distinct
+        "image": lambda i: ["image", base64.b64encode(images[i % len(images)] + i.to_bytes(4, 'big')).decode('ascii')]
+    }
+    if site is not None:
+        # A distinct URL per request, so every scrape misses the page cache and is stored in the duplicate-review index
+        scenarios["url"] = lambda i: ["url", f"{site.url(site.pages[i % len(site.pages)])}?visit={i}"]
+    return scenarios
+
+def percentile(values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def run_level(target: str, make_input: Callable[[int], List], concurrency: int, count: int, mode: str) -> Dict:
+    local = threading.local()
+
+    def session() -> requests.Session:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.mount('http://', HTTPAdapter(pool_maxsize=1))
+        return local.session
+
+    def one(i: int) -> Optional[float]:
+        body = {"input": make_input(i)}
+        if mode != 'full':
+            body["mode"] = mode
+        start = time.perf_counter()
+        try:
+            response = session().post(f"{target}/analyse", json=body, timeout=120)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        return elapsed if ok else None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(count)))
+    wall = time.perf_counter() - start
+
+    latencies = [r for r in results if r is not None]
+    stats = {"concurrency": concurrency, "requests": count, "errors": count - len(latencies), "rps": round(len(latencies) / wall, 2)}
+    for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+        stats[name] = round(percentile(latencies, fraction) * 1000, 1) if latencies else None
+    return stats
+
+def start_local_server(sonar_url: str, keep_cache: bool) -> str:
+    # The backend reads its configuration at import, so the environment is set before app is imported
+    os.environ['SONAR_BASE_URL'] = sonar_url
+    os.environ.setdefault('PERPLEXITY_API_KEY', 'benchmark')
+    if not keep_cache:
+        os.environ['VERDICT_CACHE_SIZE'] = '0'
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # One access log line per request drowns the results
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def compare(row: Dict, baseline: Dict) -> str:
+    # Change against the saved run for the same scenario and concurrency; lower latency and higher rps are better
+    changes = []
+    for key in ('p50', 'p95', 'rps'):
+        before, after = baseline.get(key), row.get(key)
+        if before and after is not None:
+            changes.append(f"{key} {(after - before) / before:+.0%}")
+    return '  (' + ', '.join(changes) + ')' if changes else ''
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='text,url,image')
+    parser.add_argument('--concurrency', default='1,4,16,64')
+    parser.add_argument('--requests', type=int, default=64, help='Requests per concurrency level')
+    parser.add_argument('--mode', default='full', choices=['full', 'score'])
+    parser.add_argument('--latency', type=float, default=0.4, help='Fake Sonar seconds to first token')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Fake Sonar seconds between streamed chunks')
+    parser.add_argument('--target', help='Benchmark an already running server instead of starting one')
+    parser.add_argument('--cache', action='store_true', help='Keep the verdict cache on')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against results saved with --save')
+    parser.add_argument('--verbose', action='store_true', help="Show the backend's own output")
+    args = parser.parse_args()
+
+    site = static_site.start()
+    target = args.target
+    sonar = None
+    if target is None:
+        sonar = fake_sonar.start(latency=args.latency, token_delay=args.token_delay)
+        target = start_local_server(sonar.base_url, args.cache)
+        print(f"Fake Sonar at {sonar.base_url} ({args.latency}s to first token), backend at {target}")
+    else:
+        print(f"Benchmarking {target}; it must be configured with SONAR_BASE_URL pointing at a fake_sonar.py instance")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {(row['scenario'], row['concurrency']): row for row in json.load(f)['results']}
+
+    scenarios = make_scenarios(site)
+    rows = []
+    print(f"\n{'scenario':<10}{'conc':>6}{'reqs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name in args.scenarios.split(','):
+        if name not in scenarios:
+            print(f"Unknown scenario {name}, expected one of {', '.join(scenarios)}")
+            continue
+        for concurrency in (int(c) for c in args.concurrency.split(',')):
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                row = {"scenario": name, **run_level(target, scenarios[name], concurrency, max(args.requests, concurrency), args.mode)}
+            rows.append(row)
+            cells = ''.join(f"{'-' if row[key] is None else row[key]:>10}" for key in ('p50', 'p95', 'p99'))
+            print(f"{name:<10}{concurrency:>6}{row['requests']:>6}{row['errors']:>8}{cells}{row['rps']:>9}"
+                  + compare(row, baseline.get((name, concurrency), {})))
+
+    if sonar is not None:
+        print(f"\nFake Sonar served {sonar.requests} calls, {sonar.closed_early} streams closed early")
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"mode": args.mode, "latency": args.latency, "results": rows}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Serves the saved review pages in benchmarks/fixtures/pages over local HTTP, with a permissive robots.txt,
+so WebScraper can be exercised without network access. Last-Modified/If-Modified-Since work as on a real site.
+Usage: python benchmarks/static_site.py [--port 8002] [--pages DIR]
+"""
+
+import argparse
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pages')
+ROBOTS_TXT = b"User-agent: *\nAllow: /\n"
+
+class PageHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == '/robots.txt':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(ROBOTS_TXT)))
+            self.send_header('Cache-Control', 'max-age=3600')
+            self.end_headers()
+            self.wfile.write(ROBOTS_TXT)
+            return
+        super().do_GET()
+
+class StaticSite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, pages_dir: str = PAGES_DIR):
+        super().__init__(('127.0.0.1', port), functools.partial(PageHandler, directory=pages_dir))
+        self.pages = sorted(name for name in os.listdir(pages_dir) if name.endswith('.html'))
+
+    def url(self, page: str) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/{page}"
+
+def start(port: int = 0, pages_dir: str = PAGES_DIR) -> StaticSite:
+    site = StaticSite(port, pages_dir)
+    threading.Thread(target=site.serve_forever, daemon=True).start()
+    return site
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--pages', default=PAGES_DIR)
+    args = parser.parse_args()
+
+    site = StaticSite(args.port, args.pages)
+    for page in site.pages:
+        print(site.url(page))
+    try:
+        site.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
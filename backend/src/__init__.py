@@ -1,7 +1,21 @@
 # Backend top level package
 
+import importlib
+from typing import Any
+
 __version__ = "0.1.0"
-__all__ = ["SonarClient", "detect_fraud"]
+__all__ = ["SonarClient", "run_analysis"]
+
+# Loaded on first access (PEP 562): SonarClient alone doesn't need Flask, and nothing here needs cv2 or bs4
+_EXPORTS = {
+    "SonarClient": ".sonar_client",
+    "run_analysis": ".app",
+}
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
 
-from .sonar_client import SonarClient
-from .app import detect_fraud
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
@@ -1,12 +1,43 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import base64
-from io import BytesIO
-from typing import Dict, Any
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from typing import Dict, Any, Generator, List, Optional, Tuple
 
-from utils.web_scraper import WebScraper
-from utils.image_processing import ImageProcessor
-from sonar_client import SonarClient
+try:
+    from .utils.web_scraper import WebScraper
+    from .utils.image_processing import ImageProcessor
+    from .utils.job_queue import JobQueue, JobQueueFull, LANES, callback_url_error
+    from .utils.metrics import debug_sample, metrics
+    from .utils.minhash_lsh import ReviewIndex, compact_reviews
+    from .utils.ocr_pool import OCRPool, OCRQueueFull
+    from .utils.phash_index import PHashIndex
+    from .utils.prescreen import PreScreener
+    from .utils.singleflight import SingleFlight
+    from .utils.text_chunking import split_reviews
+    from .sonar_client import SonarClient
+except ImportError:
+    from utils.web_scraper import WebScraper
+    from utils.image_processing import ImageProcessor
+    from utils.job_queue import JobQueue, JobQueueFull, LANES, callback_url_error
+    from utils.metrics import debug_sample, metrics
+    from utils.minhash_lsh import ReviewIndex, compact_reviews
+    from utils.ocr_pool import OCRPool, OCRQueueFull
+    from utils.phash_index import PHashIndex
+    from utils.prescreen import PreScreener
+    from utils.singleflight import SingleFlight
+    from utils.text_chunking import split_reviews
+    from sonar_client import SonarClient
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 500))
+OCR_ENABLED = os.getenv('OCR_ENABLED', '0') == '1'  # Sends tesseract text alongside prescription images
+ANALYSIS_MODES = ('full', 'score')  # 'score' returns only the fraud score, for triage
 
 app = Flask(__name__)
 CORS(app)
@@ -14,12 +45,266 @@ CORS(app)
 sonar = SonarClient()
 web_scraper = WebScraper()
 image_processor = ImageProcessor()
+ocr_pool = OCRPool()
+phash_index = PHashIndex()
+prescreener = PreScreener()
+review_index = ReviewIndex()
+in_flight = SingleFlight()
+
+def prepare_input(input_type: str, content: str, model_type: Optional[str] = None, source: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[Tuple[Dict[str, Any], int]]]:
+    # Scrape/preprocess one input, returning the Sonar inputs or an (error body, status) on failure.
+    # source is the page URL of already scraped text, used to remember its reviews
+    processed_text = ""
+    ocr_text = None
+    image_hash = None
+    if input_type == "image":
+        try:
+            with metrics.timer('image_normalize'):
+                processed_text, image_stats = image_processor.normalize_image(content)
+            if not processed_text:
+                return {}, ({"error": "Image processing failed: unreadable or unsupported image"}, 400)
+            image_hash = image_stats.get('phash')
+            if OCR_ENABLED:
+                ocr_text = extract_image_text(content)
+            model_type = 'prescription'
+
+        except Exception as e:
+            print(f"Image processing error: {str(e)}")
+            return {}, ({"error": f"Image processing failed: {str(e)}"}, 400)
+
+    elif input_type == 'url':
+        source = content
+        try:
+            with metrics.timer('scrape'):
+                _, content = web_scraper.fetch_page(content)
+            processed_text = content if content else ""
+            model_type = 'reviews'
+        except Exception as e:
+            print(f"Web scraping error: {str(e)}")
+            return {}, ({"error": f"Web scraping failed: {str(e)}"}, 400)
+
+    elif input_type == 'text':
+        processed_text = content
+        model_type = model_type or 'reviews'
+
+    else:
+        print("Invalid input type provided.")
+        return {}, ({"error": "Invalid input type"}, 400)
+
+    # Validate processed text
+    if not processed_text.strip():
+        print("No processable content found.")
+        return {}, ({"error": "No processable content found"}, 400)
+
+    # Validate model type
+    if model_type not in ['prescription', 'reviews']:
+        print("Invalid model type provided.")
+        return {}, ({"error": "Invalid model type"}, 400)
+
+    prompt_text, review_clusters = processed_text, []
+    if input_type != 'image' and model_type == 'reviews':
+        prompt_text, review_clusters = review_evidence(processed_text, source)
+
+    debug_sample("Processing text", processed_text)
+    return {
+        "processed_text": processed_text,
+        "model_type": model_type,
+        "text": ocr_text if input_type == 'image' else prompt_text,
+        "image_base64": processed_text if input_type == 'image' else None,
+        "phash": image_hash,
+        "review_clusters": review_clusters
+    }, None
+
+def review_evidence(text: str, source: Optional[str]) -> Tuple[str, List[Dict[str, Any]]]:
+    # Near-duplicate reviews on this page and on pages seen before; the prompt gets a summary instead of every copy
+    try:
+        with metrics.timer('review_index'):
+            reviews = split_reviews(text)
+            clusters = review_index.find_duplicates(reviews, source)
+    except Exception as e:
+        print(f"Review index error: {str(e)}")
+        return text, []
+    return (compact_reviews(reviews, clusters) if clusters else text), clusters
+
+def extract_image_text(content: str) -> Optional[str]:
+    # OCR text is supporting context for the image, so a saturated or slow pool just skips it
+    try:
+        with metrics.timer('ocr'):
+            return ocr_pool.run(content) or None
+    except OCRQueueFull as e:
+        print(f"Skipping OCR: {str(e)}")
+    except Exception as e:
+        print(f"OCR error: {str(e) or type(e).__name__}")
+    return None
+
+def verdict_body(analysis: Dict[str, Any], processed_text: str) -> Dict[str, Any]:
+    body = {
+        "fraud_detected": analysis.get('fraud_detected', False),
+        "reasoning": analysis.get('reasoning', ''),
+        "confidence": float(analysis.get('confidence', 0.5)),
+        "indicators": analysis.get('indicators', []),
+        "processed_text": processed_text
+    }
+    if analysis.get('score_only'):
+        body["score_only"] = True  # Re-request without a mode for the reasoning
+    return body
+
+def find_near_duplicate(prepared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Closest previously analysed image, e.g. a forged prescription resubmitted after a rescan or a changed date.
+    # Only reported alongside the new verdict: prescriptions on one doctor's template hash as close as rescans
+    # of a single image, so a match never replaces the analysis
+    if prepared.get('phash') is None:
+        return None
+    return phash_index.lookup(prepared['phash'])
+
+def local_verdict(prepared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Empty or blatantly copy-pasted review text is answered from cheap text features instead of Sonar
+    verdict = prescreener.screen(prepared['processed_text'], prepared['model_type'])
+    if not verdict:
+        return None
+    verdict["processed_text"] = prepared['processed_text']
+    if prepared.get('review_clusters'):
+        verdict["duplicate_reviews"] = prepared['review_clusters']
+    return verdict
+
+def remember_verdict(prepared: Dict[str, Any], analysis: Dict[str, Any], body: Dict[str, Any], match: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if prepared.get('phash') is not None and 'error' not in analysis and not analysis.get('score_only'):
+        phash_index.add(prepared['phash'], analysis)
+    if match:
+        body["near_duplicate"] = match
+    if prepared.get('review_clusters'):
+        body["duplicate_reviews"] = prepared['review_clusters']
+    return body
+
+def coalesce_key(input_type: Any, content: Any, model_type: Optional[str], mode: str = 'full') -> str:
+    # Requests that would produce the same analysis share one key, e.g. the same URL with a different #fragment
+    content = str(content)
+    if input_type == 'url':
+        parts = urlsplit(content.strip())
+        content = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+    elif input_type == 'text':
+        content = ' '.join(content.split())
+    elif input_type == 'image':
+        content = content.split(',', 1)[-1]
+    return hashlib.sha256(f"{input_type}\x00{model_type or ''}\x00{mode}\x00{content}".encode('utf-8')).hexdigest()
+
+def run_analysis(input_type: str, content: str, model_type: Optional[str] = None, mode: str = 'full') -> Tuple[Dict[str, Any], int]:
+    # Identical requests already in flight wait for that scrape and analysis instead of starting their own
+    if mode not in ANALYSIS_MODES:
+        return {"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}, 400
+    body, status = in_flight.do(coalesce_key(input_type, content, model_type, mode), analyse_input, input_type, content, model_type, mode)
+    return dict(body), status  # Each caller gets its own copy, e.g. batch adds a per-item status
+
+# Runs /jobs submissions in the background. Workers start on the first submission, or from start_workers()
+job_queue = JobQueue(run_analysis)
+draining = threading.Event()
+
+def warm_up() -> None:
+    # One-off work for a server that loads the app before forking, so that every worker inherits it.
+    # Nothing here opens a connection: sockets and SQLite handles must not be shared across the fork
+    image_processor.warm_up()
+
+def start_workers() -> None:
+    # Per-process setup, run after the fork by serve.py and at startup by the other servers. Every store gets its
+    # own SQLite connection (in-memory ones a fresh, empty database), job workers pick up queued and orphaned jobs (threads don't survive a
+    # fork) and a Sonar probe opens this process's first pooled connection
+    for store in (job_queue, sonar.cache, phash_index, review_index, web_scraper.page_cache):
+        store.reopen()
+    job_queue.resume()
+    sonar.probe()
+
+def drain(timeout: Optional[float] = None) -> None:
+    # Stops taking background work and lets running jobs and OCR finish. Requests in flight are drained by the server
+    draining.set()
+    job_queue.shutdown(wait=True, timeout=timeout)
+    ocr_pool.shutdown(wait=True)
+
+def readiness(coalescing: Dict[str, int]) -> Tuple[Dict[str, Any], int]:
+    # Ready unless draining or Sonar is unreachable or failing; queue depth is reported for the load balancer
+    upstream = sonar.health()
+    jobs = job_queue.stats()
+    if draining.is_set():
+        status = "draining"
+    elif not upstream["healthy"]:
+        status = "unavailable"
+    else:
+        status = "ok"
+    queue_depth = {
+        "jobs_queued": sum(jobs["queued"].values()),
+        "jobs_running": jobs["running"],
+        "ocr_in_flight": ocr_pool.stats()["in_flight"],
+        "analyses_in_flight": coalescing["in_flight"]
+    }
+    return {"status": status, "upstream": {"sonar": upstream}, "queue_depth": queue_depth, "jobs": jobs}, 200 if status == "ok" else 503
+
+def analyse_input(input_type: str, content: str, model_type: Optional[str] = None, mode: str = 'full') -> Tuple[Dict[str, Any], int]:
+    # Scrape/preprocess one input and analyse it, returning the response body and HTTP status
+    prepared, error = prepare_input(input_type, content, model_type)
+    if error:
+        return error
+
+    match = find_near_duplicate(prepared)
+    shortcut = local_verdict(prepared)
+    if shortcut:
+        return shortcut, 200
+
+    try:
+        if mode == 'score':
+            analysis = sonar.score(prepared['text'], prepared['model_type'], prepared['image_base64'])
+        else:
+            analysis = sonar.analyse( text=prepared['text'],
+                                      image_base64=prepared['image_base64'],
+                                      model_type=prepared['model_type'])
+    except Exception as e:
+        print(f"Sonar error: {str(e)}")
+        metrics.inc('errors_total', stage='sonar')
+        return {"error": f"Analysis failed: {str(e)}"}, 500
+
+    debug_sample("Analysis result", analysis)
+    if 'error' in analysis:
+        return {"error": f"Analysis failed: {analysis['error']}"}, 502
+    return remember_verdict(prepared, analysis, verdict_body(analysis, prepared['processed_text']), match), 200
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_analysis(prepared: Dict[str, Any]) -> Generator[str, None, None]:
+    # Forward partial tokens as they arrive and finish with the parsed verdict
+    match = find_near_duplicate(prepared)
+    shortcut = local_verdict(prepared)
+    if shortcut:
+        yield sse_event("verdict", shortcut)
+        return
+
+    try:
+        chunks = sonar.analyse( text=prepared['text'],
+                                image_base64=prepared['image_base64'],
+                                model_type=prepared['model_type'],
+                                stream=True)
+        if isinstance(chunks, dict):  # Analysis failed before streaming started
+            yield sse_event("error", {"error": f"Analysis failed: {chunks.get('error', '')}"})
+            return
+
+        for chunk in chunks:
+            if 'partial' in chunk:
+                yield sse_event("partial", chunk)
+            elif 'error' in chunk:
+                yield sse_event("error", {"error": f"Analysis failed: {chunk['error']}"})
+            else:
+                yield sse_event("verdict", remember_verdict(prepared, chunk, verdict_body(chunk, prepared['processed_text']), match))
+    except Exception as e:
+        print(f"Sonar error: {str(e)}")
+        metrics.inc('errors_total', stage='sonar')
+        yield sse_event("error", {"error": f"Analysis failed: {str(e)}"})
+
+def wants_stream(data: Dict[str, Any]) -> bool:
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
 
 @app.route('/analyse', methods=['GET', 'POST'])  
 def analyse() -> Dict[str, Any]: 
     try:
         data = request.get_json() 
-        print("Received data:", data)  
+        debug_sample("Received data", data)
         if not data:
             print("Missing required fields in request data.")
             return jsonify({"error": "Missing Fields"}), 400
@@ -27,74 +312,121 @@ def analyse() -> Dict[str, Any]:
         input_type = data['input'][0]
         content = data['input'][1]
 
-        # if content.startswith('http'):
-        #     model_type = data.get('model_type', 'review')
-        # else:
+        if wants_stream(data):
+            # Preprocessing errors are still reported as plain JSON before the stream opens
+            prepared, error = prepare_input(input_type, content, data.get('model_type'))
+            if error:
+                return jsonify(error[0]), error[1]
+            return Response(
+                stream_with_context(stream_analysis(prepared)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
 
-        processed_text = ""
-        if input_type == "image":
-            try:
-                # processed_img, text = image_processor.process_image(content)
-                # processed_text = text
+        body, status = run_analysis(input_type, content, data.get('model_type'), data.get('mode', 'full'))
+        return jsonify(body), status
 
-                processed_text = content
-                model_type = 'prescription'
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
-            except Exception as e:
-                print(f"Image processing error: {str(e)}")
-                return jsonify({"error": f"Image processing failed: {str(e)}"}), 400
+@app.route('/analyse/batch', methods=['POST'])
+def analyse_batch() -> Dict[str, Any]:
+    try:
+        data = request.get_json()
+        inputs = data.get('inputs') if data else None
+        if not isinstance(inputs, list) or not inputs:
+            print("Missing inputs list in batch request.")
+            return jsonify({"error": "Missing Fields"}), 400
+        if len(inputs) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} inputs)"}), 400
 
-        elif input_type == 'url':
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_CONCURRENCY, len(inputs)))
+        default_model_type = data.get('model_type')
+        mode = data.get('mode', 'full')
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}), 400
+
+        def run_item(item: Any) -> Dict[str, Any]:
             try:
-                _, content = web_scraper.fetch_page(content)
-                processed_text = content if content else ""
-                model_type = 'reviews'
+                body, status = run_analysis(item[0], item[1], default_model_type, mode)
             except Exception as e:
-                print(f"Web scraping error: {str(e)}")
-                return jsonify({"error": f"Web scraping failed: {str(e)}"}), 400
+                body, status = {"error": f"Invalid batch item: {str(e)}"}, 400
+            body["status"] = status
+            return body
 
-        elif input_type == 'text':
-            processed_text = content
-        
-        else:
-            print("Invalid input type provided.")
-            return jsonify({"error": "Invalid input type"}), 400
-        
-        # Validate processed text
-        if not processed_text.strip():
-            print("No processable content found.")
-            return jsonify({"error": "No processable content found"}), 400
-        
-        # Validate model type
-        if model_type not in ['prescription', 'reviews']:
-            print("Invalid model type provided.")
-            return jsonify({"error": "Invalid model type"}), 400
-
-        print(f"Processing text: {processed_text[:1000]}...")
+        # Scrapes and Sonar calls are I/O bound, so threads overlap them and the batch takes as long as its slowest item
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run_item, inputs))
 
-        try:
-            analysis = sonar.analyse( text=processed_text if input_type != 'image' else None,
-                                      image_base64=processed_text if input_type == 'image' else None,
-                                      model_type=model_type)
-        except Exception as e:
-            print(f"Sonar error: {str(e)}")
-            return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
+        return jsonify({"results": results}), 200
 
-        print("Analysis result:", analysis)  
-        return jsonify({
-            "fraud_detected": analysis.get('is_fraud', False),
-            "reasoning": analysis.get('reasoning', ''),
-            "confidence": analysis.get('confidence', 0.5),
-            "processed_text": processed_text
-        })
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid batch request: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_job() -> Dict[str, Any]:
+    # Queues an /analyse request and returns at once; the verdict is polled from /jobs/<id> or POSTed to callback_url
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('input'), list) or len(data['input']) != 2:
+            print("Missing required fields in job request.")
+            return jsonify({"error": "Missing Fields"}), 400
+
+        mode = data.get('mode', 'full')
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}), 400
+        priority = data.get('priority', 'interactive')
+        if priority not in LANES:
+            return jsonify({"error": f"Unknown priority '{priority}' (expected one of {', '.join(LANES)})"}), 400
+        callback_url = data.get('callback_url')
+        error = callback_url_error(callback_url) if callback_url is not None else None
+        if error:
+            return jsonify({"error": error}), 400
+
+        job = job_queue.submit(data['input'][0], data['input'][1], data.get('model_type'), mode, priority, callback_url)
+        response = jsonify(job)
+        response.status_code = 202
+        response.headers['Location'] = f"/jobs/{job['job_id']}"
+        return response
+
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         app.logger.error(f"Unexpected error: {str(e)}")
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str) -> Dict[str, Any]:
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job), 200
+
+@app.before_request
+def start_timer() -> None:
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response: Response) -> Response:
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('requests_total', endpoint=endpoint, status=str(response.status_code))
+    metrics.observe('request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint() -> Response:
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/status', methods=['GET'])
 def status_check() -> Dict[str, Any]:
-    return jsonify({"status": "ok"}), 200
+    body, status = readiness(in_flight.stats())
+    return jsonify({**body, "cache": sonar.cache.stats(), "images": image_processor.stats(), "ocr": ocr_pool.stats(), "duplicates": phash_index.stats(), "prescreen": prescreener.stats(), "reviews": review_index.stats(), "sonar": sonar.stats(), "coalescing": in_flight.stats()}), status
 
 if __name__ == '__main__':
+    # Development server; use serve.py in production
+    start_workers()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,245 @@
+# Asyncio-native server with the same contract as app.py, e.g. `hypercorn asgi:app` from src, or
+# `hypercorn backend.src.asgi:app` from the repository root.
+# Scraping and Sonar calls are awaited rather than run in a thread, so one process can hold
+# hundreds of in-flight analyses.
+
+import asyncio
+import time
+from functools import partial
+from typing import Any, AsyncGenerator, Callable, Dict, Optional, Tuple
+
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+
+try:
+    from .app import (ANALYSIS_MODES, BATCH_CONCURRENCY, MAX_BATCH_SIZE, coalesce_key, drain, find_near_duplicate,
+                      image_processor, job_queue, local_verdict, ocr_pool, phash_index, prepare_input, prescreener,
+                      readiness, remember_verdict, review_index, sonar, sse_event, start_workers, verdict_body, web_scraper)
+    from .utils.job_queue import JobQueueFull, LANES, callback_url_error
+    from .utils.metrics import debug_sample, metrics
+    from .utils.singleflight import AsyncSingleFlight
+except ImportError:
+    from app import (ANALYSIS_MODES, BATCH_CONCURRENCY, MAX_BATCH_SIZE, coalesce_key, drain, find_near_duplicate,
+                     image_processor, job_queue, local_verdict, ocr_pool, phash_index, prepare_input, prescreener,
+                     readiness, remember_verdict, review_index, sonar, sse_event, start_workers, verdict_body, web_scraper)
+    from utils.job_queue import JobQueueFull, LANES, callback_url_error
+    from utils.metrics import debug_sample, metrics
+    from utils.singleflight import AsyncSingleFlight
+
+app = cors(Quart(__name__))
+in_flight = AsyncSingleFlight()
+
+async def in_thread(func: Callable[..., Any], *args: Any) -> Any:
+    # Review indexing, image work, the local checks and the job store are synchronous; running them on the default
+    # executor keeps the event loop free for other requests
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+def local_checks(prepared: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    return find_near_duplicate(prepared), local_verdict(prepared)
+
+async def aprepare_input(input_type: str, content: str, model_type: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[Tuple[Dict[str, Any], int]]]:
+    # Only scraping is awaited natively; the rest of preparation is shared with the sync server and runs in a thread
+    if input_type == 'url':
+        try:
+            with metrics.timer('scrape'):
+                _, text = await web_scraper.afetch_page(content)
+        except Exception as e:
+            print(f"Web scraping error: {str(e)}")
+            return {}, ({"error": f"Web scraping failed: {str(e)}"}, 400)
+        return await in_thread(partial(prepare_input, 'text', text or "", 'reviews', source=content))
+    return await in_thread(prepare_input, input_type, content, model_type)
+
+async def run_analysis(input_type: str, content: str, model_type: Optional[str] = None, mode: str = 'full') -> Tuple[Dict[str, Any], int]:
+    if mode not in ANALYSIS_MODES:
+        return {"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}, 400
+    body, status = await in_flight.do(coalesce_key(input_type, content, model_type, mode), analyse_input, input_type, content, model_type, mode)
+    return dict(body), status
+
+async def analyse_input(input_type: str, content: str, model_type: Optional[str] = None, mode: str = 'full') -> Tuple[Dict[str, Any], int]:
+    prepared, error = await aprepare_input(input_type, content, model_type)
+    if error:
+        return error
+
+    match, shortcut = await in_thread(local_checks, prepared)
+    if shortcut:
+        return shortcut, 200
+
+    try:
+        if mode == 'score':
+            analysis = await sonar.ascore(prepared['text'], prepared['model_type'], prepared['image_base64'])
+        else:
+            analysis = await sonar.aanalyse( text=prepared['text'],
+                                             image_base64=prepared['image_base64'],
+                                             model_type=prepared['model_type'])
+    except Exception as e:
+        print(f"Sonar error: {str(e)}")
+        metrics.inc('errors_total', stage='sonar')
+        return {"error": f"Analysis failed: {str(e)}"}, 500
+
+    debug_sample("Analysis result", analysis)
+    if 'error' in analysis:
+        return {"error": f"Analysis failed: {analysis['error']}"}, 502
+    return await in_thread(remember_verdict, prepared, analysis, verdict_body(analysis, prepared['processed_text']), match), 200
+
+async def stream_analysis(prepared: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    match, shortcut = await in_thread(local_checks, prepared)
+    if shortcut:
+        yield sse_event("verdict", shortcut)
+        return
+
+    try:
+        chunks = await sonar.aanalyse( text=prepared['text'],
+                                       image_base64=prepared['image_base64'],
+                                       model_type=prepared['model_type'],
+                                       stream=True)
+        if isinstance(chunks, dict):  # Analysis failed before streaming started
+            yield sse_event("error", {"error": f"Analysis failed: {chunks.get('error', '')}"})
+            return
+
+        async for chunk in chunks:
+            if 'partial' in chunk:
+                yield sse_event("partial", chunk)
+            elif 'error' in chunk:
+                yield sse_event("error", {"error": f"Analysis failed: {chunk['error']}"})
+            else:
+                verdict = await in_thread(remember_verdict, prepared, chunk, verdict_body(chunk, prepared['processed_text']), match)
+                yield sse_event("verdict", verdict)
+    except Exception as e:
+        print(f"Sonar error: {str(e)}")
+        metrics.inc('errors_total', stage='sonar')
+        yield sse_event("error", {"error": f"Analysis failed: {str(e)}"})
+
+@app.route('/analyse', methods=['GET', 'POST'])
+async def analyse() -> Dict[str, Any]:
+    try:
+        data = await request.get_json()
+        debug_sample("Received data", data)
+        if not data:
+            print("Missing required fields in request data.")
+            return jsonify({"error": "Missing Fields"}), 400
+
+        input_type = data['input'][0]
+        content = data['input'][1]
+
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            prepared, error = await aprepare_input(input_type, content, data.get('model_type'))
+            if error:
+                return jsonify(error[0]), error[1]
+            return Response(
+                stream_analysis(prepared),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        body, status = await run_analysis(input_type, content, data.get('model_type'), data.get('mode', 'full'))
+        return jsonify(body), status
+
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/analyse/batch', methods=['POST'])
+async def analyse_batch() -> Dict[str, Any]:
+    try:
+        data = await request.get_json()
+        inputs = data.get('inputs') if data else None
+        if not isinstance(inputs, list) or not inputs:
+            print("Missing inputs list in batch request.")
+            return jsonify({"error": "Missing Fields"}), 400
+        if len(inputs) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} inputs)"}), 400
+
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_CONCURRENCY, len(inputs)))
+        default_model_type = data.get('model_type')
+        mode = data.get('mode', 'full')
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}), 400
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_item(item: Any) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    body, status = await run_analysis(item[0], item[1], default_model_type, mode)
+                except Exception as e:
+                    body, status = {"error": f"Invalid batch item: {str(e)}"}, 400
+            body["status"] = status
+            return body
+
+        results = await asyncio.gather(*(run_item(item) for item in inputs))
+        return jsonify({"results": list(results)}), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid batch request: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job() -> Dict[str, Any]:
+    # Jobs share app.py's queue and its worker threads, so they run the threaded pipeline
+    try:
+        data = await request.get_json()
+        if not data or not isinstance(data.get('input'), list) or len(data['input']) != 2:
+            print("Missing required fields in job request.")
+            return jsonify({"error": "Missing Fields"}), 400
+
+        mode = data.get('mode', 'full')
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"Unknown mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})"}), 400
+        priority = data.get('priority', 'interactive')
+        if priority not in LANES:
+            return jsonify({"error": f"Unknown priority '{priority}' (expected one of {', '.join(LANES)})"}), 400
+        callback_url = data.get('callback_url')
+        error = await in_thread(callback_url_error, callback_url) if callback_url is not None else None
+        if error:
+            return jsonify({"error": error}), 400
+
+        job = await in_thread(job_queue.submit, data['input'][0], data['input'][1], data.get('model_type'), mode, priority, callback_url)
+        return jsonify(job), 202, {'Location': f"/jobs/{job['job_id']}"}
+
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id: str) -> Dict[str, Any]:
+    job = await in_thread(job_queue.get, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job), 200
+
+@app.before_request
+async def start_timer() -> None:
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request(response: Response) -> Response:
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('requests_total', endpoint=endpoint, status=str(response.status_code))
+    metrics.observe('request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint() -> Response:
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/status', methods=['GET'])
+async def status_check() -> Dict[str, Any]:
+    # The Sonar probe is blocking, so it runs off the event loop
+    body, status = await in_thread(readiness, in_flight.stats())
+    return jsonify({**body, "cache": sonar.cache.stats(), "images": image_processor.stats(), "ocr": ocr_pool.stats(), "duplicates": phash_index.stats(), "prescreen": prescreener.stats(), "reviews": review_index.stats(), "sonar": sonar.stats(), "coalescing": in_flight.stats()}), status
+
+@app.before_serving
+async def start_background_work() -> None:
+    await in_thread(start_workers)
+
+@app.after_serving
+async def close_clients() -> None:
+    await in_thread(drain)
+    await web_scraper.aclose()
+    await sonar.async_client.close()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,112 @@
+# System prompt templates. Each template is versioned; bump its version whenever the wording changes so that
+# evaluation results and cached verdicts can be traced back to the prompt that produced them.
+
+import os
+import textwrap
+from typing import Dict, List, Optional
+
+try:
+    from .utils.text_chunking import estimate_tokens
+except ImportError:
+    from utils.text_chunking import estimate_tokens
+
+PROMPT_VARIANT = os.getenv('PROMPT_VARIANT', 'full')  # 'full' or 'compact', chosen per deployment
+PROMPT_VARIANTS = ['full', 'compact']
+
+_OUTPUT_FORMAT = """
+    Answer only with a JSON object with these keys, in this order:
+    {{"score": <decimal between 0.0 and 1.0>, "verdict": "genuine" | "suspicious" | "fraudulent", "indicators": [<fraud indicators found, a few words each>], "reasoning": "<at most 200 characters>"}}
+    The score is how genuine the {subject} is: 0.0 is certainly fraudulent, 1.0 is certainly genuine.
+    Write the reasoning in a professional and objective tone, not in the first person. Say "high confidence" if you are sure the {subject} is genuine and "recommend verification" if it doesn't look correct.
+"""
+
+TEMPLATES = {
+    "prescription": {
+        "full": (3, """
+            You are a highly specialized medical fraud detection AI trained on a vast corpus of authentic and forged prescriptions, pharmacological databases, and clinical best practices.
+            Your primary objective is to identify fraudulent, forged, or medically unsafe prescriptions.
+
+            Analyze each prescription for the following:
+            - Logical consistency between medication, dosage, and patient context (if provided).
+            - Invalid, outdated, or dangerous drug combinations.
+            - Red flags such as impossible dosages, incorrect formats, or unlicensed prescribers.
+            - Signs of forgery, such as inconsistent terminology, atypical abbreviations, or altered structure.
+
+            Output a structured analysis that includes:
+            1. Specific fraud indicators found.
+            2. Risk level (Low / Moderate / High).
+            3. Recommended actions (e.g., flag for review, urgent rejection, pharmacist verification).
+            4. Reasoning grounded in clinical knowledge and fraud detection patterns.
+
+            Act with precision, caution, and a strong bias toward patient safety.
+        """ + _OUTPUT_FORMAT.format(subject="prescription")),
+        "compact": (2, """
+            You detect fraudulent, forged or medically unsafe prescriptions.
+            Check drug/dose/patient consistency, dangerous combinations, impossible doses, bad formats, unlicensed prescribers and signs of forgery or alteration. Favour patient safety.
+        """ + _OUTPUT_FORMAT.format(subject="prescription")),
+    },
+    "reviews": {
+        "full": (3, """
+            You are an advanced AI trained in linguistic forensics and deception detection, with expertise in analyzing online reviews and articles for fraud, manipulation, and astroturfing.
+
+            Your task is to evaluate the authenticity of the provided content by:
+            - Identifying unnatural patterns such as exaggerated positivity/negativity, repetition, emotional inflation, or copy-paste anomalies.
+            - Detecting signs of coordinated bot activity, sudden review bursts, or unnatural reviewer behavior.
+            - Analyzing language for deception markers: hedging, vagueness, hyperbole, or implausible specificity.
+
+            Provide an expert report including:
+            1. Linguistic and behavioral fraud signals present.
+            2. Confidence level in the detection (Low / Medium / High).
+            3. Examples from the text supporting your assessment.
+            4. Final verdict: Likely Genuine / Possibly Fraudulent / Likely Fraudulent.
+
+            Base your output on known patterns in fake reviews, psychological profiling, and forensic linguistic principles.
+            Judge both the appearance and the content of the text, and the source where appropriate.
+        """ + _OUTPUT_FORMAT.format(subject="review")),
+        "compact": (2, """
+            You detect fake reviews and astroturfing.
+            Look for exaggerated or emotional language, repetition and copy-paste, coordinated or bot-like reviewers, review bursts, and deception markers (vagueness, hyperbole, implausible detail).
+        """ + _OUTPUT_FORMAT.format(subject="review")),
+    },
+}
+
+def clean(template: str) -> str:
+    # Dedent, drop repeated instructions and collapse blank runs; indentation and duplicates are paid for on every call
+    lines: List[str] = []
+    seen = set()
+    for line in textwrap.dedent(template).strip().splitlines():
+        line = line.strip()
+        if line and line in seen:
+            continue
+        if not line and (not lines or not lines[-1]):
+            continue
+        seen.add(line)
+        lines.append(line)
+    return '\n'.join(lines).strip()
+
+# Cleaned once at import rather than on every request
+PROMPTS: Dict[str, Dict[str, str]] = {
+    model_type: {variant: clean(text) for variant, (_, text) in variants.items()}
+    for model_type, variants in TEMPLATES.items()
+}
+
+def get_prompt(model_type: str, variant: str = PROMPT_VARIANT) -> Optional[str]:
+    variants = PROMPTS.get(model_type)
+    if not variants:
+        return None
+    return variants.get(variant, variants['full'])
+
+def prompt_version(model_type: str, variant: str = PROMPT_VARIANT) -> Optional[str]:
+    variants = TEMPLATES.get(model_type)
+    if not variants:
+        return None
+    variant = variant if variant in variants else 'full'
+    return f"{model_type}/{variant}/v{variants[variant][0]}"
+
+def token_counts() -> Dict[str, int]:
+    # Estimated input tokens each template adds to every call
+    return {
+        prompt_version(model_type, variant): estimate_tokens(text)
+        for model_type, variants in PROMPTS.items()
+        for variant, text in variants.items()
+    }
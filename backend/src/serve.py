@@ -0,0 +1,94 @@
+# Production server: gunicorn with threaded worker processes, e.g. `pip install -e .[serve]` then
+# `cd src && python serve.py --workers 4 --threads 16`. The app is loaded and warmed once in the master and
+# inherited by every worker; per-process state (SQLite connections, job workers, Sonar connections) is set up
+# after the fork. On SIGTERM each worker stops accepting, reports itself as draining on /status and lets
+# in-flight analyses and jobs finish within the graceful timeout.
+
+import argparse
+import os
+import signal
+import threading
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+
+SERVE_BIND = os.getenv('SERVE_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', os.cpu_count() or 2))
+SERVE_THREADS = int(os.getenv('SERVE_THREADS', 16))  # Analyses mostly wait on Sonar and scrapes, so threads are cheap
+SERVE_TIMEOUT = int(os.getenv('SERVE_TIMEOUT', 120))  # Workers silent for longer than this are restarted
+SERVE_GRACEFUL_TIMEOUT = int(os.getenv('SERVE_GRACEFUL_TIMEOUT', 60))  # Time in-flight analyses get on shutdown
+SERVE_MAX_REQUESTS = int(os.getenv('SERVE_MAX_REQUESTS', 0))  # Recycle workers after this many requests, 0 to never
+SERVE_EXIT_MARGIN = int(os.getenv('SERVE_EXIT_MARGIN', 5))  # Part of the graceful timeout kept back for exiting cleanly
+
+_drainer = None  # Drains jobs and OCR alongside the in-flight requests once SIGTERM arrives
+
+def post_fork(server: Any, worker: Any) -> None:
+    import app as backend
+    backend.start_workers()
+
+def post_worker_init(worker: Any) -> None:
+    # gunicorn's own SIGTERM handler stops the accept loop; /status should also start failing at that point
+    import app as backend
+    handle_exit = worker.handle_exit
+
+    def on_term(signum: int, frame: Any) -> None:
+        # The graceful timeout starts now, so jobs and OCR drain in the background rather than after the requests
+        global _drainer
+        backend.draining.set()
+        if _drainer is None:
+            budget = max(0, worker.cfg.graceful_timeout - SERVE_EXIT_MARGIN)
+            _drainer = threading.Thread(target=backend.drain, kwargs={"timeout": budget}, name="drain", daemon=True)
+            _drainer.start()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_term)
+
+def worker_exit(server: Any, worker: Any) -> None:
+    # By now gunicorn's graceful period has mostly run out; only a short wait is left before the master kills us
+    import app as backend
+    if _drainer is not None:
+        _drainer.join(SERVE_EXIT_MARGIN)
+    else:  # Recycled after SERVE_MAX_REQUESTS rather than terminated
+        backend.drain(timeout=SERVE_EXIT_MARGIN)
+
+class Server(BaseApplication):
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        # With preload_app this runs once in the master, before any worker is forked
+        import app as backend
+        backend.warm_up()
+        return backend.app
+
+def options(bind: str = SERVE_BIND, workers: int = SERVE_WORKERS, threads: int = SERVE_THREADS) -> Dict[str, Any]:
+    return {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "timeout": SERVE_TIMEOUT,
+        "graceful_timeout": SERVE_GRACEFUL_TIMEOUT,
+        "max_requests": SERVE_MAX_REQUESTS,
+        "max_requests_jitter": SERVE_MAX_REQUESTS // 10,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run the Aethon backend under gunicorn')
+    parser.add_argument('--bind', default=SERVE_BIND)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS, help='Request threads per worker')
+    args = parser.parse_args()
+    Server(options(args.bind, args.workers, args.threads)).run()
+
+if __name__ == '__main__':
+    main()
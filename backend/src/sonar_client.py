@@ -1,88 +1,373 @@
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+import asyncio
+import base64
+import email.utils
+import httpx
 import os
-from typing import Dict, Union, Generator, Optional
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Union, Generator, Optional
 from dotenv import load_dotenv
 
+# Relative imports when loaded as the src package (from src import SonarClient), top level when src/ is on sys.path
+try:
+    from .prompts import PROMPT_VARIANT, get_prompt, prompt_version
+    from .utils.metrics import debug_sample, metrics
+    from .utils.rate_limiter import RateLimiter
+    from .utils.response_parser import VERDICT_SCHEMA, ResponseParseError, StreamingScoreParser, parse_verdict
+    from .utils.text_chunking import chunk_text, estimate_tokens
+    from .verdict_cache import VerdictCache
+except ImportError:
+    from prompts import PROMPT_VARIANT, get_prompt, prompt_version
+    from utils.metrics import debug_sample, metrics
+    from utils.rate_limiter import RateLimiter
+    from utils.response_parser import VERDICT_SCHEMA, ResponseParseError, StreamingScoreParser, parse_verdict
+    from utils.text_chunking import chunk_text, estimate_tokens
+    from verdict_cache import VerdictCache
+
+try:
+    import h2  # httpx only negotiates HTTP/2 when h2 is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 load_dotenv()
 
+LONG_INPUT_TOKENS = int(os.getenv('LONG_INPUT_TOKENS', 3000))  # Longer text inputs are split and analysed in parallel
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 1500))
+CHUNK_CONCURRENCY = int(os.getenv('CHUNK_CONCURRENCY', 4))
+
+# Transport shared by every analysis in the process
+SONAR_MAX_CONNECTIONS = int(os.getenv('SONAR_MAX_CONNECTIONS', 64))
+SONAR_KEEPALIVE_CONNECTIONS = int(os.getenv('SONAR_KEEPALIVE_CONNECTIONS', 32))
+SONAR_KEEPALIVE_EXPIRY = float(os.getenv('SONAR_KEEPALIVE_EXPIRY', 60))
+SONAR_HTTP2 = os.getenv('SONAR_HTTP2', '1') == '1'
+SONAR_CONNECT_TIMEOUT = float(os.getenv('SONAR_CONNECT_TIMEOUT', 5))
+SONAR_TIMEOUT = float(os.getenv('SONAR_TIMEOUT', 60))  # Per call, and per chunk gap when streaming
+SONAR_MAX_RETRIES = int(os.getenv('SONAR_MAX_RETRIES', 3))
+SONAR_BACKOFF = float(os.getenv('SONAR_BACKOFF', 0.5))  # Base of the jittered exponential backoff, in seconds
+SONAR_BACKOFF_MAX = float(os.getenv('SONAR_BACKOFF_MAX', 20))  # Longer Retry-After values fail the call instead
+SONAR_REQUESTS_PER_MINUTE = float(os.getenv('SONAR_REQUESTS_PER_MINUTE', 0))  # 0 for no client-side limit
+SONAR_TOKENS_PER_MINUTE = float(os.getenv('SONAR_TOKENS_PER_MINUTE', 0))
+SONAR_HEALTH_INTERVAL = float(os.getenv('SONAR_HEALTH_INTERVAL', 30))  # Seconds between reachability probes, 0 to only watch calls
+SONAR_UNHEALTHY_FAILURES = int(os.getenv('SONAR_UNHEALTHY_FAILURES', 3))  # Consecutive failed calls before Sonar is reported down
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+MAX_TOKENS = 250
+SONAR_STRUCTURED_OUTPUT = os.getenv('SONAR_STRUCTURED_OUTPUT', '1') != '0'  # Ask for JSON through response_format
+SCORE_MAX_TOKENS = int(os.getenv('SONAR_SCORE_MAX_TOKENS', 24))  # Enough for the score that leads the answer
+SCORE_FRAUD_THRESHOLD = float(os.getenv('SCORE_FRAUD_THRESHOLD', 0.5))  # Score-only results below this are flagged
+REPAIR_PROMPT = 'Rewrite this answer as the JSON object described in your instructions, changing nothing else:\n'
+
 class SonarClient:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: Optional[VerdictCache] = None, rate_limiter: Optional[RateLimiter] = None):
+        # Retries are handled in _create/_acreate so they can honour Retry-After and pass through the rate limiter
+        self._http = DefaultHttpxClient(**self._transport_options())
         self.client = OpenAI(
             api_key=os.getenv('PERPLEXITY_API_KEY'),
-            base_url=os.getenv('SONAR_BASE_URL')
+            base_url=os.getenv('SONAR_BASE_URL'),
+            http_client=self._http,
+            max_retries=0
         )
+        # Used by the ASGI server so that in-flight analyses don't each hold a thread
+        self.async_client = AsyncOpenAI(
+            api_key=os.getenv('PERPLEXITY_API_KEY'),
+            base_url=os.getenv('SONAR_BASE_URL'),
+            http_client=DefaultAsyncHttpxClient(**self._transport_options()),
+            max_retries=0
+        )
+        self.timeout = httpx.Timeout(SONAR_TIMEOUT, connect=SONAR_CONNECT_TIMEOUT)
+        self.max_retries = SONAR_MAX_RETRIES
+        self.backoff = SONAR_BACKOFF
+        self.backoff_max = SONAR_BACKOFF_MAX
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(SONAR_REQUESTS_PER_MINUTE, SONAR_TOKENS_PER_MINUTE)
+        self.retries = 0
+        self.repairs = 0
+        self.consecutive_failures = 0
+        self._reachable = True
+        self._last_probe = None
+        self.structured_output = SONAR_STRUCTURED_OUTPUT
+        self._stats_lock = threading.Lock()
         self.model = 'sonar-pro'
+        self.prompt_variant = PROMPT_VARIANT
+        self.cache = cache if cache is not None else VerdictCache()
+        self.long_input_tokens = LONG_INPUT_TOKENS
+        self.chunk_tokens = CHUNK_TOKENS
+        self.chunk_concurrency = CHUNK_CONCURRENCY
+        self.score_threshold = SCORE_FRAUD_THRESHOLD
 
     def analyse(self, text: str, model_type: str = "reviews", stream: bool = False, image_base64: str = None) -> Union[Dict, Generator]:
         try: 
-            messages = self._build_messages(text, image_base64, model_type)
+            cache_key = self._cache_key(text, image_base64, model_type)
+            cached = self.cache.get(cache_key)
             if stream:
-                return self._handle_stream(messages, model_type)
+                if cached is not None:
+                    return iter([cached])
+                messages = self._build_messages(text, image_base64, model_type)
+                return self._cache_stream(self._handle_stream(messages, model_type), cache_key)
+
+            if cached is not None:
+                return cached
+
+            if self._is_long_input(text, image_base64):
+                result = self._analyse_chunks(text, model_type)
             else:
-                return self._handle_non_stream(messages, model_type)
+                messages = self._build_messages(text, image_base64, model_type)
+                result = self._handle_non_stream(messages, model_type)
+            if "error" not in result:
+                self.cache.set(cache_key, result)
+            return result
             
         except Exception as e:
             print(f"Error during analysis: {e}")
+            metrics.inc('errors_total', stage='sonar')
             return {"error": str(e)}
+
+    async def aanalyse(self, text: str, model_type: str = "reviews", stream: bool = False, image_base64: str = None) -> Union[Dict, AsyncGenerator]:
+        # Non-blocking counterpart of analyse() sharing its cache, prompts and parsing
+        try:
+            cache_key = self._cache_key(text, image_base64, model_type)
+            cached = await self._acache_get(cache_key)
+            if stream:
+                messages = None if cached is not None else self._build_messages(text, image_base64, model_type)
+                return self._acache_stream(messages, model_type, cache_key, cached)
+
+            if cached is not None:
+                return cached
+
+            if self._is_long_input(text, image_base64):
+                result = await self._aanalyse_chunks(text, model_type)
+            else:
+                messages = self._build_messages(text, image_base64, model_type)
+                result = await self._ahandle_non_stream(messages, model_type)
+            if "error" not in result:
+                await self._acache_set(cache_key, result)
+            return result
+
+        except Exception as e:
+            print(f"Error during analysis: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    def score(self, text: str, model_type: str = "reviews", image_base64: str = None) -> Dict:
+        # Score-only analysis for triage: the stream is closed as soon as the score has arrived, so the reasoning
+        # is never generated or paid for. A full verdict already in the cache is returned as it is.
+        try:
+            cached = self.cache.get(self._cache_key(text, image_base64, model_type))
+            if cached is not None:
+                return cached
+            if not self._is_long_input(text, image_base64):
+                return self._score_messages(self._build_messages(text, image_base64, model_type))
+
+            chunks = chunk_text(text, self.chunk_tokens)
+            with ThreadPoolExecutor(max_workers=max(1, min(self.chunk_concurrency, len(chunks)))) as executor:
+                results = list(executor.map(lambda chunk: self._score_messages(self._build_messages(chunk, None, model_type)), chunks))
+            return self._merge_scores(chunks, results)
+
+        except Exception as e:
+            print(f"Error during scoring: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    async def ascore(self, text: str, model_type: str = "reviews", image_base64: str = None) -> Dict:
+        try:
+            cached = await self._acache_get(self._cache_key(text, image_base64, model_type))
+            if cached is not None:
+                return cached
+            if not self._is_long_input(text, image_base64):
+                return await self._ascore_messages(self._build_messages(text, image_base64, model_type))
+
+            chunks = chunk_text(text, self.chunk_tokens)
+            semaphore = asyncio.Semaphore(max(1, self.chunk_concurrency))
+
+            async def score_chunk(chunk: str) -> Dict:
+                async with semaphore:
+                    return await self._ascore_messages(self._build_messages(chunk, None, model_type))
+
+            results = await asyncio.gather(*(score_chunk(chunk) for chunk in chunks))
+            return self._merge_scores(chunks, list(results))
+
+        except Exception as e:
+            print(f"Error during scoring: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    def _score_messages(self, messages: list) -> Dict:
+        try:
+            start = time.perf_counter()
+            stream = self._create(messages, stream=True, max_tokens=SCORE_MAX_TOKENS)
+            parser = StreamingScoreParser()
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if not parser.parts:
+                            self._observe('sonar_first_token', start)
+                        if parser.feed(content) is not None:
+                            break
+            finally:
+                stream.close()  # Stops generation upstream and frees the connection
+            self._observe('sonar_score', start)
+            return self._score_result(parser)
+        except Exception as e:
+            print(f"Error scoring: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    async def _ascore_messages(self, messages: list) -> Dict:
+        try:
+            start = time.perf_counter()
+            stream = await self._acreate(messages, stream=True, max_tokens=SCORE_MAX_TOKENS)
+            parser = StreamingScoreParser()
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if not parser.parts:
+                            self._observe('sonar_first_token', start)
+                        if parser.feed(content) is not None:
+                            break
+            finally:
+                await stream.close()
+            self._observe('sonar_score', start)
+            return self._score_result(parser)
+        except Exception as e:
+            print(f"Error scoring: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    def _score_result(self, parser: StreamingScoreParser) -> Dict:
+        # No repair here: the answer was cut short on purpose, so there is nothing more to reformat
+        score = parser.score
+        if score is None:
+            score = parse_verdict(parser.text())['confidence']
+        return {"fraud_detected": score < self.score_threshold, "confidence": score, "score_only": True}
+
+    def _merge_scores(self, chunks: List[str], results: List[Dict]) -> Dict:
+        merged = self._merge_results(chunks, results)
+        if "error" in merged:
+            return merged
+        return {
+            "fraud_detected": merged['confidence'] < self.score_threshold,
+            "confidence": merged['confidence'],
+            "score_only": True,
+            "chunks": len(chunks)
+        }
+
+    def _is_long_input(self, text: Optional[str], image_base64: Optional[str]) -> bool:
+        return bool(text) and not image_base64 and estimate_tokens(text) > self.long_input_tokens
+
+    def _analyse_chunk(self, chunk: str, model_type: str) -> Dict:
+        # Chunks are cached on their own so a page that changes in one place only re-analyses that chunk
+        try:
+            cache_key = self._cache_key(chunk, None, model_type)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            result = self._handle_non_stream(self._build_messages(chunk, None, model_type), model_type)
+            if "error" not in result:
+                self.cache.set(cache_key, result)
+            return result
+        except Exception as e:
+            print(f"Error analysing chunk: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    def _analyse_chunks(self, text: str, model_type: str) -> Dict:
+        # Map-reduce over review-aligned chunks so latency tracks chunk size rather than page size
+        chunks = chunk_text(text, self.chunk_tokens)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.chunk_concurrency, len(chunks)))) as executor:
+            results = list(executor.map(lambda chunk: self._analyse_chunk(chunk, model_type), chunks))
+        return self._merge_results(chunks, results)
+
+    async def _aanalyse_chunk(self, chunk: str, model_type: str, semaphore: asyncio.Semaphore) -> Dict:
+        try:
+            cache_key = self._cache_key(chunk, None, model_type)
+            cached = await self._acache_get(cache_key)
+            if cached is not None:
+                return cached
+            async with semaphore:
+                result = await self._ahandle_non_stream(self._build_messages(chunk, None, model_type), model_type)
+            if "error" not in result:
+                await self._acache_set(cache_key, result)
+            return result
+        except Exception as e:
+            print(f"Error analysing chunk: {e}")
+            metrics.inc('errors_total', stage='sonar')
+            return {"error": str(e)}
+
+    async def _aanalyse_chunks(self, text: str, model_type: str) -> Dict:
+        chunks = chunk_text(text, self.chunk_tokens)
+        semaphore = asyncio.Semaphore(max(1, self.chunk_concurrency))
+        results = await asyncio.gather(*(self._aanalyse_chunk(chunk, model_type, semaphore) for chunk in chunks))
+        return self._merge_results(chunks, list(results))
+
+    def _merge_results(self, chunks: List[str], results: List[Dict]) -> Dict:
+        # Length-weighted mean score; the lowest-scoring chunk's reasoning explains the verdict
+        scored = []
+        for chunk, result in zip(chunks, results):
+            try:
+                scored.append((len(chunk), float(result['confidence']), result))
+            except (KeyError, TypeError, ValueError):
+                continue  # Failed or unparseable chunk
+        if not scored:
+            return {"error": f"All {len(chunks)} chunks failed to analyse"}
+
+        total = sum(weight for weight, _, _ in scored)
+        confidence = sum(weight * score for weight, score, _ in scored) / total
+        flagged = sum(1 for _, _, result in scored if result.get('fraud_detected'))
+        worst = min(scored, key=lambda item: item[1])[2]
+        indicators = []
+        for _, _, result in sorted(scored, key=lambda item: item[1]):
+            indicators.extend(i for i in result.get('indicators') or [] if i not in indicators)
+        return {
+            "fraud_detected": flagged > 0,
+            "reasoning": f"{worst.get('reasoning', '').strip()} ({flagged} of {len(chunks)} sections flagged)",
+            "confidence": round(confidence, 2),
+            "verdict": worst.get('verdict'),
+            "indicators": indicators,
+            "chunks": len(chunks)
+        }
+
+    async def _acache_stream(self, messages: Optional[list], model_type: str, cache_key: str, cached: Optional[Dict]) -> AsyncGenerator:
+        if cached is not None:
+            yield cached
+            return
+        async for chunk in self._ahandle_stream(messages, model_type):
+            if 'partial' not in chunk and 'error' not in chunk:
+                await self._acache_set(cache_key, chunk)
+            yield chunk
+
+    async def _acache_get(self, cache_key: str) -> Optional[Dict]:
+        # The verdict cache's disk tier is SQLite, so the async paths reach it from the default executor
+        return await asyncio.get_running_loop().run_in_executor(None, self.cache.get, cache_key)
+
+    async def _acache_set(self, cache_key: str, verdict: Dict) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.cache.set, cache_key, verdict)
+
+    def _cache_stream(self, chunks: Generator, cache_key: str) -> Generator:
+        # Pass chunks through and cache the final parsed verdict once the stream completes
+        for chunk in chunks:
+            if 'partial' not in chunk and 'error' not in chunk:
+                self.cache.set(cache_key, chunk)
+            yield chunk
+
+    def _cache_key(self, text: Optional[str], image_base64: Optional[str], model_type: str) -> str:
+        # Key on the decoded image bytes so that data-URL prefixes and base64 padding don't cause misses,
+        # and on whitespace-normalised text so that re-scrapes of the same page hit
+        if image_base64:
+            payload = b'image:' + base64.b64decode(image_base64.split(",", 1)[-1]) + b'\x00' + (text or '').encode('utf-8')
+        else:
+            payload = b'text:' + ' '.join((text or '').split()).encode('utf-8')
+        return VerdictCache.make_key(payload, model_type, self.model, self._get_system_prompt(model_type))
     
     def _get_system_prompt(self, model_type: str) -> str:
-        prompts = {
-            "prescription": (
-                """
-                You are a highly specialized medical fraud detection AI trained on a vast corpus of authentic and forged prescriptions, pharmacological databases, and clinical best practices. 
-                Your primary objective is to identify fraudulent, forged, or medically unsafe prescriptions.
-
-                Analyze each prescription for the following:
-                - Logical consistency between medication, dosage, and patient context (if provided).
-                - Invalid, outdated, or dangerous drug combinations.
-                - Red flags such as impossible dosages, incorrect formats, or unlicensed prescribers.
-                - Signs of forgery, such as inconsistent terminology, atypical abbreviations, or altered structure.
-
-                Output a structured analysis that includes:
-                1. Specific fraud indicators found.
-                2. Risk level (Low / Moderate / High).
-                3. Recommended actions (e.g., flag for review, urgent rejection, pharmacist verification).
-                4. Reasoning grounded in clinical knowledge and fraud detection patterns.
-
-                Act with precision, caution, and a strong bias toward patient safety.
-
-                Do not answer in the first person, but answer as through a medical fraud detection AI, with a professional and objective tone.
-                Also state "high confidence" only if you are sure about the prescription being correct and "recommend verification" if it doesn't look correct.
-                Only output 200 characters of text.
-                You must say "high confidence" if you are sure about the prescription being correct and "recommend verification" if it doesn't look correct.
-                The first 3 characters of the output must be a decimal value of how fraudulent the prescription is, between 0.0 and 1.0 with 0.0 being high fraud and 1.0 being no fraud.
-                This should be followed by a semicolon (;) and then the reasoning.
-                """
-            ),
-            "reviews": (
-                """
-                You are an advanced AI trained in linguistic forensics and deception detection, with expertise in analyzing online reviews and articles for fraud, manipulation, and astroturfing.
-
-                Your task is to evaluate the authenticity of the provided content by:
-                - Identifying unnatural patterns such as exaggerated positivity/negativity, repetition, emotional inflation, or copy-paste anomalies.
-                - Detecting signs of coordinated bot activity, sudden review bursts, or unnatural reviewer behavior.
-                - Analyzing language for deception markers: hedging, vagueness, hyperbole, or implausible specificity.
-
-                Provide an expert report including:
-                1. Linguistic and behavioral fraud signals present.
-                2. Confidence level in the detection (Low / Medium / High).
-                3. Examples from the text supporting your assessment.
-                4. Final verdict: Likely Genuine / Possibly Fraudulent / Likely Fraudulent.
-
-                Base your output on known patterns in fake reviews, psychological profiling, and forensic linguistic principles.
-
-                Do not answer in the first person, but answer as through a medical fraud detection AI, with a professional and objective tone.
-                Ensure the review is done on the appearance of the text and the content of the text and if appropriate the source.
-                Only output 200 characters of text.
-                Also state "high confidence" only if you are sure about the review being correct and "recommend verification" if it doesn't look correct.
-                Only output 200 characters of text.
-                You must say "high confidence" if you are sure about the review being correct and "recommend verification" if it doesn't look correct.
-                The first 3 characters of the output must be a decimal value of how fraudulent the review is, between 0.0 and 1.0 with 0.0 being high fraud and 1.0 being no fraud.
-                This should be followed by a semicolon (;) and then the reasoning.
-                """
-            )
-        }
-        return prompts.get(model_type)
+        return get_prompt(model_type, self.prompt_variant)
 
 
     def _build_messages(self, text: Optional[str], image_base64: Optional[str], model_type: str) -> list:
@@ -120,60 +405,297 @@ class SonarClient:
             })
         elif image_base64:
             clean_base64 = image_base64.split(",", 1)[-1]
+            mime_type = self._image_mime_type(image_base64)
+            prompt = "Please analyze the provided image."
+            if text:
+                prompt += f"\nText extracted from the image by OCR:\n{text}"
             content.append({
                 "type": "text",
-                "text": "Please analyze the provided image."
+                "text": prompt
             })
             content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{clean_base64}"
+                    "url": f"data:{mime_type};base64,{clean_base64}"
                 }
             })
 
         messages.append({"role": "user", "content": content})
 
-        print(f"Messages for {model_type} model: {messages}")
+        debug_sample(f"Messages for {model_type} model", messages)
         return messages
     
+    @staticmethod
+    def _image_mime_type(image_base64: str) -> str:
+        # Trust the data URL's MIME type, otherwise sniff the magic bytes of the decoded image
+        if image_base64.startswith('data:') and ';' in image_base64:
+            return image_base64[5:image_base64.index(';')]
+        header = base64.b64decode(image_base64[:16])
+        if header.startswith(b'\xff\xd8'):
+            return 'image/jpeg'
+        if header.startswith(b'GIF8'):
+            return 'image/gif'
+        if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+            return 'image/webp'
+        return 'image/png'
+
+    @staticmethod
+    def _transport_options() -> Dict[str, Any]:
+        return {
+            "limits": httpx.Limits(
+                max_connections=SONAR_MAX_CONNECTIONS,
+                max_keepalive_connections=SONAR_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=SONAR_KEEPALIVE_EXPIRY
+            ),
+            "timeout": httpx.Timeout(SONAR_TIMEOUT, connect=SONAR_CONNECT_TIMEOUT),
+            "http2": SONAR_HTTP2 and HTTP2_AVAILABLE
+        }
+
+    def _output_options(self) -> Dict[str, Any]:
+        if not self.structured_output:
+            return {}
+        return {"response_format": {"type": "json_schema", "json_schema": {"schema": VERDICT_SCHEMA}}}
+
+    def _request_tokens(self, messages: list, max_tokens: int = MAX_TOKENS) -> int:
+        # Prompt estimate plus the completion budget, charged against the tokens-per-minute limit
+        text = []
+        for message in messages:
+            content = message['content']
+            if isinstance(content, str):
+                text.append(content)
+            else:
+                text.extend(part.get('text', '') for part in content)
+        return estimate_tokens(''.join(text)) + max_tokens
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        # Seconds to wait before retrying, or None if the error is final
+        if attempt >= self.max_retries:
+            return None
+        retry_after = None
+        if isinstance(error, APIStatusError):
+            if error.status_code not in RETRY_STATUSES:
+                return None
+            retry_after = self._retry_after(error.response.headers)
+        elif not isinstance(error, APIConnectionError):  # Includes timeouts
+            return None
+
+        jitter = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))  # Full jitter
+        if retry_after is None:
+            delay = jitter
+        elif retry_after > self.backoff_max:
+            return None  # Better to fail now than hold the request open for that long
+        else:
+            delay = retry_after + random.uniform(0, self.backoff)  # Don't let every waiting client return at once
+        with self._stats_lock:
+            self.retries += 1
+        metrics.inc('sonar_retries_total')
+        print(f"Sonar call failed ({error}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    @staticmethod
+    def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            value = headers.get('retry-after')
+            if not value:
+                return None
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _create(self, messages: list, stream: bool = False, max_tokens: int = MAX_TOKENS) -> Any:
+        tokens = self._request_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(tokens)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.25,
+                    stream=stream,
+                    timeout=self.timeout,
+                    **self._output_options()
+                )
+                self._record_call(True)
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._record_call(False, e)
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _acreate(self, messages: list, stream: bool = False, max_tokens: int = MAX_TOKENS) -> Any:
+        tokens = self._request_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(tokens)
+            try:
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.25,
+                    stream=stream,
+                    timeout=self.timeout,
+                    **self._output_options()
+                )
+                self._record_call(True)
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._record_call(False, e)
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _record_call(self, ok: bool, error: Optional[BaseException] = None) -> None:
+        # Only failures of Sonar itself count towards unhealthy; a 4xx caused by the input says nothing about it
+        if not ok and not (isinstance(error, APIConnectionError) or (isinstance(error, APIStatusError) and error.status_code >= 500)):
+            return
+        with self._stats_lock:
+            self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def probe(self) -> bool:
+        # Any HTTP answer from the API host counts as reachable. The request goes through the shared pool, so it
+        # also leaves a warm connection for the next analysis
+        try:
+            self._http.head(str(self.client.base_url), timeout=SONAR_CONNECT_TIMEOUT)
+            reachable = True
+        except httpx.HTTPError as e:
+            print(f"Sonar health probe failed: {e}")
+            reachable = False
+        with self._stats_lock:
+            self._reachable = reachable
+            self._last_probe = time.monotonic()
+            if reachable:
+                self.consecutive_failures = 0  # Otherwise a worker taken out of rotation would never see a good call
+        return reachable
+
+    def health(self) -> Dict:
+        with self._stats_lock:
+            due = SONAR_HEALTH_INTERVAL > 0 and (self._last_probe is None or time.monotonic() - self._last_probe >= SONAR_HEALTH_INTERVAL)
+        if due:
+            self.probe()
+        with self._stats_lock:
+            reachable = self._reachable
+            failures = self.consecutive_failures
+        return {"healthy": reachable and failures < SONAR_UNHEALTHY_FAILURES, "reachable": reachable, "consecutive_failures": failures}
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            retries = self.retries
+            repairs = self.repairs
+        return {
+            "retries": retries,
+            "repairs": repairs,
+            "http2": SONAR_HTTP2 and HTTP2_AVAILABLE,
+            "prompts": [prompt_version(model_type, self.prompt_variant) for model_type in ("prescription", "reviews")],
+            **self.rate_limiter.stats()
+        }
+
     def _handle_non_stream(self, messages: list, model_type: str) -> Dict:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=250,
-            temperature=0.25
-        )
+        start = time.perf_counter()
+        response = self._create(messages)
+        self._observe('sonar_total', start)
         content = response.choices[0].message.content.strip()
-        return self._parse_response(content)
+        return self._parse_or_repair(messages, content)
 
     def _handle_stream(self, messages: list, model_type: str) -> Generator:
-        stream = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=250,
-            temperature=0.25,
-            stream=True
-        )
+        start = time.perf_counter()
+        stream = self._create(messages, stream=True)  # Only opening the stream is retried, never a half-sent answer
 
-        full_response = []
+        parser = StreamingScoreParser()
         for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                if not parser.parts:
+                    self._observe('sonar_first_token', start)
+                yield self._partial(content, parser.feed(content))
+        self._observe('sonar_total', start)
+        yield self._parse_or_repair(messages, parser.text())
+
+    async def _ahandle_non_stream(self, messages: list, model_type: str) -> Dict:
+        start = time.perf_counter()
+        response = await self._acreate(messages)
+        self._observe('sonar_total', start)
+        content = response.choices[0].message.content.strip()
+        return await self._aparse_or_repair(messages, content)
+
+    async def _ahandle_stream(self, messages: list, model_type: str) -> AsyncGenerator:
+        start = time.perf_counter()
+        stream = await self._acreate(messages, stream=True)
+
+        parser = StreamingScoreParser()
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
             content = chunk.choices[0].delta.content
             if content:
-                full_response.append(content)
-                yield {"partial": content}
-        yield self._parse_response(''.join(full_response)) 
+                if not parser.parts:
+                    self._observe('sonar_first_token', start)
+                yield self._partial(content, parser.feed(content))
+        self._observe('sonar_total', start)
+        yield await self._aparse_or_repair(messages, parser.text())
+
+    @staticmethod
+    def _observe(stage: str, start: float) -> None:
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    @staticmethod
+    def _partial(content: str, score: Optional[float]) -> Dict:
+        # The partial that completes the score carries it, so clients can show it before the reasoning arrives
+        return {"partial": content} if score is None else {"partial": content, "score": score}
+
+    def _repair_messages(self, messages: list, content: str) -> Optional[list]:
+        # A reformatting request over the answer alone; resending the input would double the cost of the call
+        if not content.strip():
+            return None
+        with self._stats_lock:
+            self.repairs += 1
+        metrics.inc('sonar_repairs_total')
+        return [messages[0], {"role": "user", "content": REPAIR_PROMPT + content}]
+
+    def _parse_or_repair(self, messages: list, content: str) -> Dict:
+        try:
+            return self._parse_response(content)
+        except ResponseParseError as e:
+            print(f"Unparseable Sonar response ({e}), asking for a repair")
+            repair = self._repair_messages(messages, content)
+        if repair is None:
+            return {"error": "Empty response from Sonar"}
+        try:
+            return self._parse_response(self._create(repair).choices[0].message.content.strip())
+        except ResponseParseError as e:
+            return {"error": str(e)}
+
+    async def _aparse_or_repair(self, messages: list, content: str) -> Dict:
+        try:
+            return self._parse_response(content)
+        except ResponseParseError as e:
+            print(f"Unparseable Sonar response ({e}), asking for a repair")
+            repair = self._repair_messages(messages, content)
+        if repair is None:
+            return {"error": "Empty response from Sonar"}
+        try:
+            return self._parse_response((await self._acreate(repair)).choices[0].message.content.strip())
+        except ResponseParseError as e:
+            return {"error": str(e)}
 
     def _parse_response(self, content: str) -> Dict:
-        fraud_keywords = ["fraud", "forgery", "unsafe", 
-                          "dangerous", "invalid", "red flag",
-                          "unlicensed", "counterfeit", "suspicious"]
-        print(f"Raw response content: {content}")
-        confidence, reasoning = content.split(';', 1)
-        return {
-            "fraud_detected": any(keyword in content.lower() for keyword in fraud_keywords),
-            "reasoning": reasoning,
-            "confidence": confidence
-        }
+        debug_sample("Raw response content", content)
+        with metrics.timer('response_parse'):
+            return parse_verdict(content)
 
     def _calculate_confidence(self, text: str) -> float:
         confidence = 0.5
@@ -1,6 +1,21 @@
 # Utility functions for the fraud detection system.
 
-__all__ = ["ImageProcessor", "WebScraper"]
+import importlib
+from typing import Any
 
-from .image_processing import ImageProcessor
-from .web_scraper import WebScraper
+__all__ = ["ImageProcessor", "PageCache", "WebScraper"]
+
+# Submodules are imported when first used (PEP 562), so importing one utility doesn't load them all
+_EXPORTS = {
+    "ImageProcessor": ".image_processing",
+    "PageCache": ".page_cache",
+    "WebScraper": ".web_scraper",
+}
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,119 @@
+# Main-content extraction for scraped pages. The fast parsers are optional; BeautifulSoup is always available
+# as the fallback and produces the same text.
+
+import functools
+import os
+from typing import Callable, Dict, List, Optional
+
+from .lazy_import import LazyModule
+
+# Parsers are imported on the first scrape rather than with the app
+bs4 = LazyModule('bs4')
+lexbor = LazyModule('selectolax.lexbor')
+lxml_html = LazyModule('lxml.html')
+lxml_etree = LazyModule('lxml.etree')
+
+# Checked in order; the first match is the review container
+SELECTORS = [
+    'article',
+    'main',
+    'div.content',
+    'div.main-content',
+    'div.post-content',
+]
+UNWANTED_TAGS = ['script', 'style', 'nav', 'footer', 'header', 'aside']
+MAX_PARSE_BYTES = int(os.getenv('MAX_PARSE_BYTES', 2 * 1024 * 1024))  # Measured in characters of decoded HTML
+EXTRACT_BACKEND = os.getenv('EXTRACT_BACKEND', 'auto')
+
+_TEXT_SEPARATOR = '\x00'  # Never appears in parsed text, so empty text nodes can be dropped after joining
+
+def _join_text(parts: List[str]) -> str:
+    # Equivalent of BeautifulSoup's get_text(separator='\n', strip=True)
+    return '\n'.join(part for part in (p.strip() for p in parts) if part)
+
+def _extract_bs4(html: str) -> str:
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    for selector in SELECTORS:
+        for element in soup.select(selector):
+            # A container inside e.g. <header> would have been removed by a whole-document cleanup pass
+            if element.find_parent(UNWANTED_TAGS):
+                continue
+            for unwanted in element(UNWANTED_TAGS):
+                unwanted.decompose()
+            return element.get_text(separator='\n', strip=True)
+    return ''
+
+def _extract_selectolax(html: str) -> str:
+    tree = lexbor.LexborHTMLParser(html)
+    unwanted = set(UNWANTED_TAGS)
+    for selector in SELECTORS:
+        for node in tree.css(selector):
+            parent = node.parent
+            while parent is not None and parent.tag not in unwanted:
+                parent = parent.parent
+            if parent is not None:
+                continue
+            node.strip_tags(UNWANTED_TAGS)
+            return _join_text(node.text(separator=_TEXT_SEPARATOR).split(_TEXT_SEPARATOR))
+    return ''
+
+def _class_xpath(tag: str, css_class: str) -> str:
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]"
+
+@functools.lru_cache(maxsize=None)
+def _lxml_selectors() -> List:
+    return [
+        lxml_etree.XPath(_class_xpath(*selector.split('.', 1)) if '.' in selector else f'//{selector}')
+        for selector in SELECTORS
+    ]
+
+def _lxml_text(element, unwanted: set) -> List[str]:
+    # Text nodes in document order, skipping unwanted subtrees and comments but keeping the text after them
+    parts = [element.text] if element.text else []
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in unwanted:
+            parts.extend(_lxml_text(child, unwanted))
+        if child.tail:
+            parts.append(child.tail)
+    return parts
+
+def _extract_lxml(html: str) -> str:
+    root = lxml_html.fromstring(html)
+    unwanted = set(UNWANTED_TAGS)
+    for selector in _lxml_selectors():
+        for element in selector(root):
+            if any(ancestor.tag in unwanted for ancestor in element.iterancestors()):
+                continue
+            return _join_text(_lxml_text(element, unwanted))
+    return ''
+
+BACKENDS: Dict[str, Optional[Callable[[str], str]]] = {
+    'selectolax': _extract_selectolax if lexbor.available else None,
+    'lxml': _extract_lxml if lxml_html.available else None,
+    'bs4': _extract_bs4,
+}
+
+def available_backends() -> List[str]:
+    return [name for name, extract in BACKENDS.items() if extract is not None]
+
+def extract_content(html: str, backend: str = EXTRACT_BACKEND, max_bytes: int = MAX_PARSE_BYTES) -> str:
+    # Returns the text of the first review container on the page, or '' if there is none
+    if not html:
+        return ''
+    if max_bytes and len(html) > max_bytes:
+        html = html[:max_bytes]  # Parsers recover from the truncated markup
+
+    if backend == 'auto':
+        backend = available_backends()[0]
+    extract = BACKENDS.get(backend)
+    if extract is None:
+        print(f"Extraction backend {backend} is not available, falling back to bs4")
+        extract = _extract_bs4
+
+    try:
+        return extract(html)
+    except Exception as e:
+        if extract is _extract_bs4:
+            raise
+        print(f"Error extracting with {backend}, falling back to bs4: {e}")
+        return _extract_bs4(html)
@@ -1,24 +1,149 @@
 # Need to check if this is the best way, or to send this to sora itself, the image.
 
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
 import base64
-from PIL import Image
+import os
+import threading
+from PIL import Image, ImageOps
 from io import BytesIO
-import pytesseract
 import numpy as np
-import cv2
+
+from .lazy_import import LazyModule
+from .metrics import debug_sample, metrics
+
+# Only the OCR path needs these; normalising images for Sonar uses PIL alone
+cv2 = LazyModule('cv2')
+pytesseract = LazyModule('pytesseract')
+
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1600))  # Longest side sent to Sonar, in pixels
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+FORMAT_ALIASES = {'MPO': 'JPEG'}  # Pillow reports many phone-camera JPEGs as MPO; the first frame is a plain JPEG
+
+# OCR preprocessing: 'adaptive' picks a denoising tier from a noise estimate, or force one of PREPROCESS_TIERS
+PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'adaptive')
+PREPROCESS_TIERS = ['none', 'fast', 'full']
+PREPROCESS_MAX_DIMENSION = int(os.getenv('PREPROCESS_MAX_DIMENSION', 2000))  # Plenty for OCR, caps denoising cost
+NOISE_LOW = float(os.getenv('PREPROCESS_NOISE_LOW', 2.0))  # Below this estimated sigma, skip denoising
+NOISE_HIGH = float(os.getenv('PREPROCESS_NOISE_HIGH', 8.0))  # Above it, run the full colour NLM
+NOISE_SAMPLE_SIZE = 512  # Centre crop the noise is estimated on, taken after the PREPROCESS_MAX_DIMENSION downscale so it measures what the denoiser sees
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+HASH_SIZE = 16  # Difference hash over a 17x16 grayscale thumbnail, 256 bits
+HASH_INK_THRESHOLD = 128  # Pixels darker than this bound the document content the hash is taken over
 
 class ImageProcessor:
-    def __init__(self, ocr_config:str = '--oem 3 --psm 6'):
+    def __init__(self, ocr_config:str = '--oem 3 --psm 6', max_dimension: int = IMAGE_MAX_DIMENSION, jpeg_quality: int = IMAGE_JPEG_QUALITY, ocr_timeout: float = 0):
         # Tesseract OCR configuration (default ocr engine with page segmentation mode 6)
         self.ocr_config = ocr_config
-        self.supported_formats = ['jpg', 'jpeg', 'png', 'bmp', 'gif']
+        self.ocr_timeout = ocr_timeout  # Seconds before the tesseract subprocess is killed, 0 for no limit
+        self.preprocess_mode = PREPROCESS_MODE
+        self.supported_formats = ['jpg', 'jpeg', 'png', 'bmp', 'gif', 'webp']
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._stats_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        # Loads the OCR libraries and runs tesseract once at startup, so a missing binary is reported before the
+        # first prescription arrives
+        cv2.load()
+        try:
+            pytesseract.get_tesseract_version()
+        except (pytesseract.TesseractNotFoundError, OSError) as e:
+            print(f"OCR unavailable: {str(e)}")
+
+    def normalize_image(self, image_data: str) -> Tuple[Optional[str], Dict]:
+        # Shrink an uploaded image before it is sent to Sonar: decode once, apply and strip EXIF,
+        # downsample to max_dimension and re-encode, returning a data URL with the real MIME type
+        if not image_data:
+            print("No image data provided.")
+            return None, {}
+
+        try:
+            if image_data.startswith('data:'):
+                image_data = image_data.split(',', 1)[1]
+            with metrics.timer('image_decode'):
+                original = base64.b64decode(image_data)
+                image = Image.open(BytesIO(original))
+                source_format = FORMAT_ALIASES.get(image.format, image.format)
+                if source_format is None or source_format.lower() not in self.supported_formats:
+                    print(f"Unsupported image format: {source_format}")
+                    return None, {}
+
+                exif = image.getexif()
+                oriented = ImageOps.exif_transpose(image)  # Bake in the camera rotation before the EXIF is dropped
+            resized = max(oriented.size) > self.max_dimension
+            if resized:
+                oriented.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+            encoded, output_format = self._encode_compact(oriented), 'JPEG'
+            # A small, clean original (e.g. a flat PNG scan) can beat JPEG; keep it when nothing had to change
+            if not resized and not exif and source_format in MIME_TYPES and len(original) <= len(encoded):
+                encoded, output_format = original, source_format
+
+            stats = {
+                "original_bytes": len(original),
+                "normalized_bytes": len(encoded),
+                "saved_bytes": len(original) - len(encoded),
+                "format": output_format,
+                "width": oriented.size[0],
+                "height": oriented.size[1],
+                "phash": self.perceptual_hash(oriented)
+            }
+            with self._stats_lock:
+                self.bytes_in += len(original)
+                self.bytes_out += len(encoded)
+            debug_sample("Normalized image", stats)
+
+            data_url = f"data:{MIME_TYPES[output_format]};base64,{base64.b64encode(encoded).decode('ascii')}"
+            return data_url, stats
+
+        except Exception as e:
+            print(f"Error normalizing image data: {e}")
+            return None, {}
+
+    def _encode_compact(self, image: Image.Image) -> bytes:
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # JPEG has no alpha channel; flatten onto white like a printed prescription
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)  # No exif= argument, so metadata is dropped
+        return buffer.getvalue()
+
+    @staticmethod
+    def perceptual_hash(image: Image.Image) -> int:
+        # Survives rescans, recompression, resizing and small edits; compare with Hamming distance.
+        # 256 bits rather than the usual 64, since prescriptions on the same template share their coarse layout
+        gray = image.convert('L')
+        ink = gray.point(lambda p: 255 if p < HASH_INK_THRESHOLD else 0).getbbox()
+        if ink:
+            gray = gray.crop(ink)  # Trimming the margins makes a recrop hash like the original
+        pixels = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.float32)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {"bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "saved_bytes": self.bytes_in - self.bytes_out}
     
-    def process_image(self, image_data: str) -> Tuple[Optional[str], Optional[str]]:
+    def process_image(self, image_data: Union[str, bytes]) -> Tuple[Optional[Image.Image], Optional[str]]:
+        # Returns the preprocessed image and its OCR text, all in memory so concurrent calls can't collide
+        result = self.ocr_image(image_data)
+        return result.get("processed"), result.get("text")
+
+    def ocr_image(self, image_data: Union[str, bytes]) -> Dict:
+        # Like process_image, but also reports which preprocessing tier ran and the noise estimate behind it
         # Typical string input: data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAA...
         if not image_data:
             print("No image data provided.")
-            return None, None
+            return {}
 
         try:
             if isinstance(image_data, str):
@@ -30,24 +155,27 @@ class ImageProcessor:
 
             image = Image.open(BytesIO(img_bytes))
 
-            if image.format.lower() not in self.supported_formats:
+            if FORMAT_ALIASES.get(image.format, image.format or '').lower() not in self.supported_formats:
                 print(f"Unsupported image format: {image.format}")
-                return None, None
+                return {}
         
-            processed_img = self._preprocess_image(image)
-            temp_path = '/tmp/processed_image.png'
-            processed_img.save(temp_path, format='PNG')
-            text = pytesseract.image_to_string(processed_img, config=self.ocr_config)
-            return temp_path, text.strip()
+            processed_img, tier, noise = self._preprocess_image(image)
+            text = pytesseract.image_to_string(processed_img, config=self.ocr_config, timeout=self.ocr_timeout)
+            return {"processed": processed_img, "text": text.strip(), "tier": tier, "noise": noise}
 
         except Exception as e:
             print(f"Error processing image data: {e}")
-            return None, None
+            return {}
         
-    def _preprocess_image(self, image: Image.Image) -> Image.Image:
-        # Improve image quality for OCR
+    def _preprocess_image(self, image: Image.Image, mode: Optional[str] = None) -> Tuple[Image.Image, str, float]:
+        # Improve image quality for OCR, denoising only as much as the image needs
+        mode = mode or self.preprocess_mode
         try:
-            cv_img = np.array(image)
+            if max(image.size) > PREPROCESS_MAX_DIMENSION:
+                image = image.copy()
+                image.thumbnail((PREPROCESS_MAX_DIMENSION, PREPROCESS_MAX_DIMENSION), Image.LANCZOS)
+
+            cv_img = np.array(image if image.mode in ('RGB', 'RGBA', 'L') else image.convert('RGB'))
             if cv_img.ndim == 3 and cv_img.shape[2] == 4:
                 cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGRA2BGR)  # Remove transparency factor
             elif cv_img.ndim == 3:
@@ -55,15 +183,42 @@ class ImageProcessor:
             else:
                 cv_img = cv2.cvtColor(cv_img, cv2.COLOR_GRAY2BGR)
 
-            cv_img = cv2.fastNlMeansDenoisingColored(cv_img, None, 10, 10, 7, 21)  # Denoise image
-            cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)  # Convert to grayscale
-            cv_img = cv2.threshold(cv_img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]  # Binarize image
+            gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)  # Convert to grayscale
+            noise = self._estimate_noise(gray)
+            tier = mode if mode in PREPROCESS_TIERS else self._choose_tier(noise)
 
-            return Image.fromarray(cv_img)
+            if tier == 'full':
+                cv_img = cv2.fastNlMeansDenoisingColored(cv_img, None, 10, 10, 7, 21)  # Denoise image
+                gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+            elif tier == 'fast':
+                gray = cv2.fastNlMeansDenoising(gray, None, 10, 7, 11)  # One channel and a smaller search window
+            gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]  # Binarize image
+
+            debug_sample("Preprocessed image", {"tier": tier, "noise": round(noise, 1)})
+            return Image.fromarray(gray), tier, noise
 
         except Exception as e:
             print(f"Error converting image to array: {e}")
-            return image
+            return image, 'none', 0.0
+
+    @staticmethod
+    def _estimate_noise(gray: np.ndarray) -> float:
+        # Immerkaer's fast noise estimate: the Laplacian-difference kernel cancels smooth image structure
+        h, w = gray.shape
+        top, left = max(0, (h - NOISE_SAMPLE_SIZE) // 2), max(0, (w - NOISE_SAMPLE_SIZE) // 2)
+        sample = gray[top:top + NOISE_SAMPLE_SIZE, left:left + NOISE_SAMPLE_SIZE].astype(np.float32)
+        if sample.shape[0] < 3 or sample.shape[1] < 3:
+            return 0.0
+        response = cv2.filter2D(sample, -1, NOISE_KERNEL)[1:-1, 1:-1]
+        return float(np.sqrt(np.pi / 2) * np.abs(response).sum() / (6 * response.size))
+
+    @staticmethod
+    def _choose_tier(noise: float) -> str:
+        if noise < NOISE_LOW:
+            return 'none'
+        if noise < NOISE_HIGH:
+            return 'fast'
+        return 'full'
         
     @staticmethod
     def validate_webcam():
@@ -79,5 +234,5 @@ if __name__ == "__main__":
     with open('test-image.png', 'rb') as f:
         image_data = base64.b64encode(f.read()).decode('utf-8')
     
-    path, text = processor.process_image(image_data)
-    print(f'Extracted Text: {text} at {path}' if path else 'No text extracted.')
+    processed_img, text = processor.process_image(image_data)
+    print(f'Extracted Text: {text}' if processed_img else 'No text extracted.')
@@ -0,0 +1,324 @@
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.db')  # Jobs outlive the process, so this is a file by default
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', 10000))  # Queued jobs before new ones are rejected
+JOB_TTL = int(os.getenv('JOB_TTL', 24 * 60 * 60))  # Finished jobs are kept this long for polling
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))  # Also picks up jobs queued by other processes
+JOB_LEASE = float(os.getenv('JOB_LEASE', 60))  # Running jobs whose owner stops renewing them are queued again after this
+CALLBACK_TIMEOUT = float(os.getenv('JOB_CALLBACK_TIMEOUT', 10))
+CALLBACK_RETRIES = int(os.getenv('JOB_CALLBACK_RETRIES', 3))
+CALLBACK_WORKERS = int(os.getenv('JOB_CALLBACK_WORKERS', 2))  # Separate from JOB_WORKERS so slow clients don't hold up analyses
+
+# Lower runs first: interactive requests jump ahead of bulk audits
+LANES = {"interactive": 0, "bulk": 1}
+
+class JobQueueFull(Exception):
+    pass
+
+def callback_url_error(url: Any) -> Optional[str]:
+    # Why url can't be used as a callback, or None. The host must resolve to public addresses only, so that clients
+    # can't point the worker at loopback, link-local or internal services
+    parts = urlsplit(url) if isinstance(url, str) else None
+    if parts is None or parts.scheme not in ('http', 'https') or not parts.hostname:
+        return "callback_url must be an http(s) URL"
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (OSError, UnicodeError, ValueError):
+        return "callback_url host cannot be resolved"
+    if not addresses or not all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses):
+        return "callback_url must point to a public address"
+    return None
+
+class JobQueue:
+    # Runs analyses in a bounded pool of worker threads, fed from a SQLite table so that queued jobs and results
+    # survive a restart and can be shared by several server processes. runner(input_type, content, model_type, mode)
+    # returns the same (body, status) as /analyse.
+    def __init__(self, runner: Callable[..., Tuple[Dict[str, Any], int]], workers: int = JOB_WORKERS, db_path: str = JOB_QUEUE_PATH,
+                 max_queued: int = JOB_MAX_QUEUED, ttl: int = JOB_TTL, lease: float = JOB_LEASE):
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.lease = lease
+        self.completed = 0
+        self.failed = 0
+        self.callbacks_failed = 0
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._stopped = threading.Event()  # Wakes the heartbeat, which doesn't wait on _wakeup so it never takes a worker's notify
+        self._renewer: Optional[threading.Thread] = None
+        self._callbacks: Optional[Tuple[int, ThreadPoolExecutor]] = None  # (pid, pool); created on first callback
+        self._pid = None
+        self.instance = self._instance()
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None  # Opened on first use, so importing the app creates no file
+
+    def _instance(self) -> str:
+        # Owner token for running jobs. A pid alone can be reused, e.g. by the same server after a container restart,
+        # and a forked worker must not share its parent's token
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.instance = uuid.uuid4().hex
+        return self.instance
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        conn = self._conn
+        if conn is None:
+            conn = self._conn = self._connect()
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are explicit so that a job is claimed by exactly one worker, even across processes
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, lane INTEGER, status TEXT, input_type TEXT, content TEXT, model_type TEXT, mode TEXT, '
+            'callback_url TEXT, callback_status TEXT, result TEXT, status_code INTEGER, owner TEXT, lease_until REAL, '
+            'created_at REAL, started_at REAL, finished_at REAL)'
+        )
+        if 'lease_until' not in {row[1] for row in db.execute('PRAGMA table_info(jobs)')}:
+            db.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL')  # Stores written before leases existed
+        db.execute('CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, lane, created_at)')
+        return db
+
+    def reopen(self) -> None:
+        # The next use opens a connection for this process; an in-memory store starts empty rather than share the
+        # parent's handle
+        with self._lock:
+            self._conn = None
+
+    def start(self) -> None:
+        # Worker threads start on first use so importing the app never spawns them
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]  # None survive a fork
+            if self._threads:
+                return
+            self._stopping = False
+            self._stopped.clear()
+            self._renewer = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            self._renewer.start()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def resume(self) -> None:
+        # Jobs left running by a process that has since died are queued again once their lease runs out; workers
+        # start if any are waiting. Jobs of live processes sharing the store keep being renewed and are left alone
+        self._requeue_expired()
+        with self._lock:
+            pending = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if pending:
+            self.start()
+
+    def _requeue_expired(self) -> None:
+        with self._lock:
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_until = NULL "
+                    "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)", (time.time(),)
+                )
+            except sqlite3.Error as e:
+                print(f"Error requeueing jobs: {e}")
+
+    def _heartbeat(self) -> None:
+        # Renews the lease on every job this process is running, so long analyses are not taken over by others
+        while not self._stopped.wait(self.lease / 3):
+            with self._lock:
+                try:
+                    self._db.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                        (time.time() + self.lease, self._instance())
+                    )
+                except sqlite3.Error as e:
+                    print(f"Error renewing job leases: {e}")
+
+    def submit(self, input_type: str, content: Any, model_type: Optional[str] = None, mode: str = 'full',
+               lane: str = 'interactive', callback_url: Optional[str] = None) -> Dict[str, Any]:
+        if lane not in LANES:
+            raise ValueError(f"Unknown priority '{lane}' (expected one of {', '.join(LANES)})")
+        if callback_url is not None:
+            error = callback_url_error(callback_url)
+            if error:
+                raise ValueError(error)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({queued} jobs waiting)")
+            self._db.execute(
+                'INSERT INTO jobs (id, lane, status, input_type, content, model_type, mode, callback_url, created_at) '
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, LANES[lane], str(input_type), str(content), model_type, mode, callback_url, time.time())
+            )
+            self._wakeup.notify()
+        self.start()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, lane, status, callback_url, callback_status, result, status_code, created_at, started_at, finished_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            position = None
+            if row and row[2] == 'queued':
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (lane < ? OR (lane = ? AND created_at < ?))",
+                    (row[1], row[1], row[7])
+                ).fetchone()[0]
+        if not row:
+            return None
+        job = {
+            "job_id": row[0],
+            "priority": next(name for name, lane in LANES.items() if lane == row[1]),
+            "status": row[2],
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
+        if position is not None:
+            job["queue_position"] = position
+        if row[5] is not None:
+            job["result"] = json.loads(row[5])
+            job["status_code"] = row[6]
+        if row[3]:
+            job["callback_status"] = row[4] or 'pending'
+        return job
+
+    def _claim(self) -> Optional[Tuple]:
+        # Highest-priority lane first, oldest first within a lane
+        with self._lock:
+            try:
+                self._db.execute('BEGIN IMMEDIATE')
+                row = self._db.execute(
+                    "SELECT id, input_type, content, model_type, mode, callback_url FROM jobs WHERE status = 'queued' "
+                    'ORDER BY lane, created_at LIMIT 1'
+                ).fetchone()
+                if row:
+                    now = time.time()
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ? WHERE id = ?",
+                        (now, self._instance(), now + self.lease, row[0])
+                    )
+                self._db.execute('COMMIT')
+                return row
+            except sqlite3.Error as e:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+                print(f"Error claiming job: {e}")
+                return None
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+            job = self._claim()
+            if job is None:
+                self._purge()
+                self._requeue_expired()  # Picks up jobs of a peer process that died mid-analysis
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(JOB_POLL_INTERVAL)
+                continue
+            self._run(*job)
+
+    def _run(self, job_id: str, input_type: str, content: str, model_type: Optional[str], mode: str, callback_url: Optional[str]) -> None:
+        try:
+            body, status = self.runner(input_type, content, model_type, mode or 'full')
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            body, status = {"error": f"Analysis failed: {str(e)}"}, 500
+        state = 'done' if status < 500 else 'failed'
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, result = ?, status_code = ?, finished_at = ?, lease_until = NULL WHERE id = ?',
+                (state, json.dumps(body), status, time.time(), job_id)
+            )
+            if state == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        if callback_url:
+            self._callback_pool().submit(self._deliver, job_id, callback_url)
+
+    def _callback_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._callbacks is None or self._callbacks[0] != os.getpid():  # Pool threads don't survive a fork
+                self._callbacks = (os.getpid(), ThreadPoolExecutor(CALLBACK_WORKERS, thread_name_prefix='job-callback'))
+            return self._callbacks[1]
+
+    def _deliver(self, job_id: str, callback_url: str) -> None:
+        # POSTs the finished job to the client, retrying with backoff; the result stays pollable either way.
+        # The host is checked again in case its DNS changed since submission, and redirects are not followed
+        payload = self.get(job_id)
+        delivered = False
+        error = callback_url_error(callback_url)
+        if error:
+            print(f"Callback for job {job_id} not sent: {error}")
+        for attempt in range(0 if error else CALLBACK_RETRIES + 1):
+            try:
+                response = requests.post(callback_url, json=payload, timeout=CALLBACK_TIMEOUT, allow_redirects=False)
+                if response.status_code < 500:
+                    delivered = 200 <= response.status_code < 300
+                    break
+            except requests.RequestException as e:
+                print(f"Callback for job {job_id} failed: {e}")
+            if attempt < CALLBACK_RETRIES:
+                time.sleep(2 ** attempt)
+        with self._lock:
+            self._db.execute('UPDATE jobs SET callback_status = ? WHERE id = ?', ('delivered' if delivered else 'failed', job_id))
+            if not delivered:
+                self.callbacks_failed += 1
+
+    def _purge(self) -> None:
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (time.time() - self.ttl,))
+            except sqlite3.Error as e:
+                print(f"Error purging jobs: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._db.execute('SELECT status, lane, COUNT(*) FROM jobs GROUP BY status, lane').fetchall()
+            stats = {"completed": self.completed, "failed": self.failed, "callbacks_failed": self.callbacks_failed,
+                     "workers": sum(1 for thread in self._threads if thread.is_alive())}
+        stats["queued"] = {name: 0 for name in LANES}
+        stats["running"] = 0
+        for status, lane, count in rows:
+            if status == 'queued':
+                stats["queued"][next(name for name, value in LANES.items() if value == lane)] = count
+            elif status == 'running':
+                stats["running"] += count
+        return stats
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None) -> None:
+        # Workers finish the job they are running; queued jobs stay in the store for the next process
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        self._stopped.set()
+        if self._callbacks is not None and self._callbacks[0] == os.getpid():
+            self._callbacks[1].shutdown(wait=False)  # Undelivered callbacks stay 'pending'; the result can still be polled
+            self._callbacks = None
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads + ([self._renewer] if self._renewer else []):
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,36 @@
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Any, Optional
+
+class LazyModule:
+    # Stands in for a heavy module and imports it on first attribute access, so that importing the backend
+    # doesn't pay for libraries (cv2, tesseract, parsers) that a process may never use
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    @property
+    def available(self) -> bool:
+        # Whether the module is installed, without importing it
+        if self._module is not None:
+            return True
+        try:
+            return importlib.util.find_spec(self._name) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}' ({'loaded' if self.loaded else 'not loaded'})>"
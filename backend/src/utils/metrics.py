@@ -0,0 +1,132 @@
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+METRICS_PREFIX = 'aethon'
+DEBUG_SAMPLE_RATE = float(os.getenv('DEBUG_SAMPLE_RATE', 0))  # Fraction of payload dumps that are logged
+DEBUG_MAX_CHARS = int(os.getenv('DEBUG_MAX_CHARS', 500))
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DESCRIPTIONS = {
+    "stage_seconds": "Time spent in each processing stage",
+    "request_seconds": "Request latency by endpoint",
+    "requests_total": "Requests by endpoint and status code",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "errors_total": "Failures by stage",
+    "sonar_retries_total": "Sonar calls retried after a transient failure",
+    "sonar_repairs_total": "Unparseable Sonar answers sent back for reformatting"
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+class Metrics:
+    # Counters and latency histograms kept in process and rendered in the Prometheus text format by /metrics
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = _Histogram(self.buckets)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram.counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        # Times a stage into stage_seconds and counts it under errors_total if it raises
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('errors_total', stage=stage)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def count(self, name: str, **labels: str) -> int:
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+            return histogram.count if histogram else 0
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{METRICS_PREFIX}_{name}{_format_labels(labels)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{METRICS_PREFIX}_{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+                    lines.append(f"{METRICS_PREFIX}_{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{METRICS_PREFIX}_{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{METRICS_PREFIX}_{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _header(lines: List[str], name: str, kind: str) -> None:
+        description = DESCRIPTIONS.get(name, name.replace('_', ' '))
+        lines.append(f"# HELP {METRICS_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# Shared by every module in the process
+metrics = Metrics()
+
+debug_logger = logging.getLogger('aethon.debug')
+if DEBUG_SAMPLE_RATE > 0 and not debug_logger.handlers:
+    debug_logger.addHandler(logging.StreamHandler())
+    debug_logger.setLevel(logging.DEBUG)
+
+def debug_sample(message: str, payload: Any) -> None:
+    # Request bodies, prompts and raw answers for a sampled fraction of calls, truncated so that base64
+    # images don't end up in the log. Nothing is formatted for calls that aren't sampled.
+    if DEBUG_SAMPLE_RATE <= 0 or random.random() >= DEBUG_SAMPLE_RATE:
+        return
+    text = repr(payload)
+    if len(text) > DEBUG_MAX_CHARS:
+        text = f"{text[:DEBUG_MAX_CHARS]}... ({len(text)} characters)"
+    debug_logger.debug("%s: %s", message, text)
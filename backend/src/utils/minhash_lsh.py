@@ -0,0 +1,289 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REVIEW_INDEX_PATH = os.getenv('REVIEW_INDEX_PATH', ':memory:')  # Point at a file to remember reviews across restarts
+REVIEW_DUPLICATE_THRESHOLD = float(os.getenv('REVIEW_DUPLICATE_THRESHOLD', 0.6))  # Estimated Jaccard similarity
+NUM_PERM = 128
+LSH_BANDS = 32  # 32 bands of 4 rows find pairs at 0.6 similarity 99% of the time
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 3
+REVIEW_MIN_WORDS = int(os.getenv('REVIEW_MIN_WORDS', 6))  # Shorter lines are ratings, buttons and other boilerplate
+REVIEW_BUCKET_CAP = int(os.getenv('REVIEW_BUCKET_CAP', 8))  # Stored reviews per LSH bucket; bounds every lookup, and other_pages counts up to it
+REVIEW_INDEX_MAX_REVIEWS = int(os.getenv('REVIEW_INDEX_MAX_REVIEWS', 100000))  # Oldest reviews are pruned beyond this
+MAX_SOURCES = 5  # Other pages listed per cluster
+SNIPPET_CHARS = 120
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Fixed seed so signatures stored by one process stay comparable with the next
+_rng = np.random.RandomState(20240528)
+_PERM_A = _rng.randint(1, 2 ** 32 - 1, size=(NUM_PERM, 1), dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2 ** 32 - 1, size=(NUM_PERM, 1), dtype=np.uint64)
+
+def _shingle_hashes(review: str) -> np.ndarray:
+    # crc32 rather than hash() because str hashing is salted per process
+    words = WORD_PATTERN.findall(review.lower())
+    if len(words) < REVIEW_MIN_WORDS:
+        return np.zeros(0, dtype=np.uint64)
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.array([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64)
+
+def _snippet(review: str) -> str:
+    return review if len(review) <= SNIPPET_CHARS else review[:SNIPPET_CHARS].rsplit(' ', 1)[0] + '...'
+
+class ReviewIndex:
+    # MinHash signatures of individual reviews, banded for LSH so near-duplicate reviews are found by bucket
+    # lookups rather than by comparing against every review seen before
+    def __init__(self, db_path: str = REVIEW_INDEX_PATH, threshold: float = REVIEW_DUPLICATE_THRESHOLD,
+                 bucket_cap: int = REVIEW_BUCKET_CAP, max_reviews: int = REVIEW_INDEX_MAX_REVIEWS):
+        self.threshold = threshold
+        self.bucket_cap = bucket_cap
+        self.max_reviews = max_reviews
+        self.pages = 0
+        self.clusters = 0
+        self.cross_page = 0
+        self._lock = threading.Lock()  # Counters only; lookups share the serialized connection without it
+        self._write_lock = threading.Lock()
+        self.db_path = db_path
+        self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Reviews are stored once per distinct page content (its digest); pages maps every URL onto its content,
+        # so the same page scraped under many URLs costs one set of rows
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS reviews ('
+            'id INTEGER PRIMARY KEY, page TEXT, snippet TEXT, signature BLOB, seen_at REAL)'
+        )
+        db.execute('CREATE TABLE IF NOT EXISTS pages (source TEXT PRIMARY KEY, digest TEXT, seen_at REAL)')
+        db.execute('CREATE TABLE IF NOT EXISTS lsh_buckets (band INTEGER, bucket BLOB, review_id INTEGER)')
+        db.execute('CREATE INDEX IF NOT EXISTS lsh_lookup ON lsh_buckets (band, bucket)')
+        db.execute('CREATE INDEX IF NOT EXISTS lsh_review ON lsh_buckets (review_id)')
+        db.execute('CREATE INDEX IF NOT EXISTS reviews_page ON reviews (page)')
+        db.execute('CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest)')
+        db.commit()
+        return db
+
+    @staticmethod
+    def signatures(reviews: List[str]) -> Tuple[List[int], np.ndarray]:
+        # Returns the indices of reviews long enough to shingle and their signatures, one row each
+        hashes = [_shingle_hashes(review) for review in reviews]
+        kept = [i for i, h in enumerate(hashes) if len(h)]
+        if not kept:
+            return [], np.zeros((0, NUM_PERM), dtype=np.uint32)
+        flat = np.concatenate([hashes[i] for i in kept])
+        offsets = np.cumsum([0] + [len(hashes[i]) for i in kept[:-1]])
+        # All permutations of all shingles at once, then the minimum per review
+        permuted = (_PERM_A * flat + _PERM_B) & _MAX_HASH  # Overflow wraps, which keeps it a fine hash family
+        return kept, np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+
+    @staticmethod
+    def _buckets(signature: np.ndarray) -> List[bytes]:
+        return [signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes() for band in range(LSH_BANDS)]
+
+    def find_duplicates(self, reviews: List[str], source: Optional[str] = None) -> List[Dict]:
+        # Clusters near-duplicate reviews within the page and notes other pages carrying the same review.
+        # The page is then stored under source (its URL) so later pages are compared against it.
+        kept, signatures = self.signatures(reviews)
+        buckets = [self._buckets(signature) for signature in signatures]
+
+        # Within the page: union reviews that share an LSH bucket and whose signatures agree closely enough
+        parent = list(range(len(kept)))
+
+        def root(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        seen: Dict[Tuple[int, bytes], int] = {}
+        for i, review_buckets in enumerate(buckets):
+            for band, bucket in enumerate(review_buckets):
+                j = seen.setdefault((band, bucket), i)
+                if j != i and root(i) != root(j) and np.mean(signatures[i] == signatures[j]) >= self.threshold:
+                    parent[root(i)] = root(j)
+
+        # Only one review per cluster is looked up and stored; its copies would match the same pages
+        representatives = [i for i in range(len(kept)) if root(i) == i]
+        found, bucket_sizes = self._previous_sources(
+            signatures[representatives], [buckets[i] for i in representatives], source
+        )
+        sources = {i: found[n] for n, i in enumerate(representatives)}
+        if source:
+            self._store(reviews, [kept[i] for i in representatives], signatures[representatives],
+                        [buckets[i] for i in representatives], source, bucket_sizes)
+
+        members: Dict[int, List[int]] = {}
+        for i in range(len(kept)):
+            members.setdefault(root(i), []).append(i)
+        clusters = []
+        for group in members.values():
+            elsewhere = sorted(sources[root(group[0])])
+            if len(group) < 2 and not elsewhere:
+                continue
+            clusters.append({
+                "size": len(group),
+                "reviews": [kept[i] for i in group],
+                "sample": _snippet(reviews[kept[group[0]]]),
+                "seen_on": elsewhere[:MAX_SOURCES],
+                "other_pages": len(elsewhere)
+            })
+        clusters.sort(key=lambda c: (c['size'], c['other_pages']), reverse=True)
+
+        with self._lock:
+            self.pages += 1
+            self.clusters += len(clusters)
+            self.cross_page += sum(1 for c in clusters if c['other_pages'])
+        return clusters
+
+    def _previous_sources(self, signatures: np.ndarray, buckets: List[List[bytes]], source: Optional[str]) -> Tuple[List[set], Dict[Tuple[int, bytes], int]]:
+        # Other pages holding a near-duplicate of each review, found through the stored LSH buckets, and how full
+        # each of this page's buckets already is
+        candidates: Dict[int, set] = {}
+        bucket_sizes: Dict[Tuple[int, bytes], int] = {}
+        for band in range(LSH_BANDS):
+            wanted: Dict[bytes, List[int]] = {}
+            for i, review_buckets in enumerate(buckets):
+                wanted.setdefault(review_buckets[band], []).append(i)
+            keys = list(wanted)
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f'SELECT bucket, review_id FROM lsh_buckets WHERE band = ? AND bucket IN ({",".join("?" * len(chunk))})',
+                    [band] + chunk
+                ).fetchall()
+                for bucket, review_id in rows:
+                    bucket = bytes(bucket)
+                    size = bucket_sizes.get((band, bucket), 0)
+                    bucket_sizes[(band, bucket)] = size + 1
+                    if size < self.bucket_cap:
+                        for i in wanted[bucket]:
+                            candidates.setdefault(i, set()).add(review_id)
+
+        found = [set() for _ in range(len(buckets))]
+        ids = sorted({review_id for ids in candidates.values() for review_id in ids})
+        rows: Dict[int, int] = {}
+        pages: List[str] = []
+        stored: List[bytes] = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for review_id, page, signature in self._db.execute(
+                f'SELECT id, page, signature FROM reviews WHERE id IN ({",".join("?" * len(chunk))})', chunk
+            ):
+                rows[review_id] = len(pages)
+                pages.append(page)
+                stored.append(signature)
+        matrix = np.frombuffer(b''.join(stored), dtype=np.uint32).reshape(-1, NUM_PERM)
+
+        matched: Dict[int, set] = {}
+        for i, review_ids in candidates.items():
+            # Ids missing from rows were pruned or replaced since the bucket query
+            hits = np.array([rows[r] for r in review_ids if r in rows], dtype=np.int64)
+            if not len(hits):
+                continue
+            similar = hits[np.mean(matrix[hits] == signatures[i], axis=1) >= self.threshold]
+            if len(similar):
+                matched[i] = {pages[row] for row in similar}
+
+        digests = sorted({page for pages in matched.values() for page in pages})
+        urls: Dict[str, set] = {}
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            for url, digest in self._db.execute(
+                f'SELECT source, digest FROM pages WHERE digest IN ({",".join("?" * len(chunk))})', chunk
+            ):
+                if url != source:
+                    urls.setdefault(digest, set()).add(url)
+        for i, pages in matched.items():
+            for page in pages:
+                found[i].update(urls.get(page, ()))
+        return found, bucket_sizes
+
+    def _store(self, reviews: List[str], kept: List[int], signatures: np.ndarray, buckets: List[List[bytes]], source: str,
+               bucket_sizes: Dict[Tuple[int, bytes], int]) -> None:
+        digest = hashlib.sha256(signatures.tobytes()).hexdigest()
+        with self._write_lock:
+            try:
+                now = time.time()
+                previous = self._db.execute('SELECT digest FROM pages WHERE source = ?', (source,)).fetchone()
+                self._db.execute('INSERT OR REPLACE INTO pages (source, digest, seen_at) VALUES (?, ?, ?)', (source, digest, now))
+                if previous and previous[0] != digest:
+                    self._drop_unreferenced([previous[0]])  # A re-scraped page replaces its earlier reviews
+
+                if self._db.execute('SELECT 1 FROM reviews WHERE page = ? LIMIT 1', (digest,)).fetchone():
+                    self._db.execute('UPDATE reviews SET seen_at = ? WHERE page = ?', (now, digest))
+                else:
+                    rows = []
+                    for i, signature, review_buckets in zip(kept, signatures, buckets):
+                        review_id = self._db.execute(
+                            'INSERT INTO reviews (page, snippet, signature, seen_at) VALUES (?, ?, ?, ?)',
+                            (digest, _snippet(reviews[i]), signature.tobytes(), now)
+                        ).lastrowid
+                        for band, bucket in enumerate(review_buckets):
+                            # Full buckets hold boilerplate or reviews already stored many times; skipping them
+                            # keeps every later lookup bounded
+                            size = bucket_sizes.get((band, bucket), 0)
+                            if size < self.bucket_cap:
+                                bucket_sizes[(band, bucket)] = size + 1
+                                rows.append((band, bucket, review_id))
+                    self._db.executemany('INSERT INTO lsh_buckets (band, bucket, review_id) VALUES (?, ?, ?)', rows)
+                    self._prune()
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing review index: {e}")
+
+    def _drop_unreferenced(self, digests: List[str]) -> None:
+        for digest in digests:
+            if not self._db.execute('SELECT 1 FROM pages WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+                self._db.execute('DELETE FROM lsh_buckets WHERE review_id IN (SELECT id FROM reviews WHERE page = ?)', (digest,))
+                self._db.execute('DELETE FROM reviews WHERE page = ?', (digest,))
+
+    def _prune(self) -> None:
+        # Keeps the newest reviews, dropping whole pages down to 90% of max_reviews once the limit is passed
+        count = self._db.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+        if count <= self.max_reviews:
+            return
+        cutoff = self._db.execute(
+            'SELECT seen_at FROM reviews ORDER BY seen_at DESC LIMIT 1 OFFSET ?', (int(self.max_reviews * 0.9),)
+        ).fetchone()[0]
+        stale = [row[0] for row in self._db.execute('SELECT DISTINCT page FROM reviews WHERE seen_at <= ?', (cutoff,))]
+        for start in range(0, len(stale), 500):
+            chunk = stale[start:start + 500]
+            self._db.execute(f'DELETE FROM pages WHERE digest IN ({",".join("?" * len(chunk))})', chunk)
+        self._db.execute('DELETE FROM lsh_buckets WHERE review_id IN (SELECT id FROM reviews WHERE seen_at <= ?)', (cutoff,))
+        self._db.execute('DELETE FROM reviews WHERE seen_at <= ?', (cutoff,))
+
+    def reopen(self) -> None:
+        # A new connection for this process; an in-memory store starts empty rather than share the parent's handle
+        with self._write_lock:
+            self._db = self._connect()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {"pages": self.pages, "clusters": self.clusters, "cross_page_clusters": self.cross_page}
+        stats["stored_reviews"] = self._db.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+        return stats
+
+def compact_reviews(reviews: List[str], clusters: List[Dict], max_clusters: int = 10) -> str:
+    # Keeps one copy of each duplicated review and leads with the duplicate evidence, so the prompt carries
+    # the signal instead of the repetition. The count of other pages grows as pages are indexed, so only whether
+    # there are any goes into the prompt; otherwise every re-scrape would miss the verdict cache
+    if not clusters:
+        return '\n'.join(reviews)
+    repeated = {i for cluster in clusters for i in cluster['reviews'][1:]}
+    evidence = ["Duplicate review evidence found before analysis:"]
+    for cluster in clusters[:max_clusters]:
+        elsewhere = ", also posted on other pages" if cluster['other_pages'] else ''
+        evidence.append(f"- {cluster['size']}x near-identical{elsewhere}: \"{cluster['sample']}\"")
+    if len(clusters) > max_clusters:
+        evidence.append(f"- {len(clusters) - max_clusters} more duplicate groups")
+    kept = [review for i, review in enumerate(reviews) if i not in repeated]
+    return '\n'.join(evidence) + '\n\nReviews with duplicates removed:\n' + '\n'.join(kept)
@@ -0,0 +1,107 @@
+import asyncio
+import base64
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from typing import Dict, Optional, Union
+
+from .image_processing import ImageProcessor
+
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', os.cpu_count() or 2))
+OCR_QUEUE_SIZE = int(os.getenv('OCR_QUEUE_SIZE', 32))  # Jobs queued or running before new ones are rejected
+OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', 30))
+
+class OCRQueueFull(Exception):
+    pass
+
+# Each worker process builds its own ImageProcessor once, so cv2/tesseract setup isn't paid per job
+_worker_processor = None
+
+def _init_worker(ocr_config: str, ocr_timeout: float) -> None:
+    global _worker_processor
+    _worker_processor = ImageProcessor(ocr_config=ocr_config, ocr_timeout=ocr_timeout)
+
+def _ocr_job(image_bytes: bytes) -> str:
+    return _worker_processor.ocr_image(image_bytes).get("text") or ''
+
+class OCRPool:
+    # Runs ImageProcessor.process_image in worker processes so denoising and tesseract never stall a server thread
+    def __init__(self, workers: int = OCR_WORKERS, queue_size: int = OCR_QUEUE_SIZE, timeout: float = OCR_TIMEOUT, ocr_config: str = '--oem 3 --psm 6'):
+        self.workers = workers
+        self.timeout = timeout
+        self.ocr_config = ocr_config
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor = None  # Started on first use so importing this module never forks
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # tesseract gets the same deadline, so a timed-out job also frees its worker
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.ocr_config, self.timeout)
+                )
+            return self._executor
+
+    def submit(self, image_data: Union[str, bytes]) -> Future:
+        # Raises OCRQueueFull instead of queueing unboundedly when the pool is saturated
+        if isinstance(image_data, str):
+            image_data = base64.b64decode(image_data.split(',', 1)[-1])
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise OCRQueueFull(f"OCR queue is full ({self.workers} workers busy)")
+
+        try:
+            future = self._get_executor().submit(_ocr_job, image_data)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        self._slots.release()
+        with self._lock:
+            self.in_flight -= 1
+
+    def result(self, future: Future, timeout: Optional[float] = None) -> str:
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except TimeoutError:
+            future.cancel()  # Only succeeds if the job hasn't started yet
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def run(self, image_data: Union[str, bytes], timeout: Optional[float] = None) -> str:
+        return self.result(self.submit(image_data), timeout)
+
+    async def arun(self, image_data: Union[str, bytes], timeout: Optional[float] = None) -> str:
+        future = self.submit(image_data)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"submitted": self.submitted, "rejected": self.rejected, "timed_out": self.timed_out, "in_flight": self.in_flight}
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)  # Outside the lock, as finishing jobs take it to update the counters
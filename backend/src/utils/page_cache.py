@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from .metrics import metrics
+
+PAGE_CACHE_PATH = os.getenv('PAGE_CACHE_PATH', ':memory:')  # Point at a file to keep pages across restarts
+PAGE_CACHE_MAX_PAGES = int(os.getenv('PAGE_CACHE_MAX_PAGES', 2000))  # Least recently fetched pages are dropped beyond this
+
+class PageCache:
+    # Stores scraped pages with their HTTP validators so that re-fetches can be revalidated with a conditional request
+    def __init__(self, db_path: str = PAGE_CACHE_PATH, max_pages: int = PAGE_CACHE_MAX_PAGES):
+        self.max_pages = max_pages
+        self.hits = 0  # 304 Not Modified responses served from the cache
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path = db_path
+        self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT, parsed TEXT, fetched_at REAL)'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS pages_fetched ON pages (fetched_at)')
+        db.commit()
+        return db
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    'SELECT etag, last_modified, body, parsed FROM pages WHERE url = ?', (url,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading page cache: {e}")
+                return None
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "body": row[2], "parsed": row[3]}
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], body: Optional[str], parsed: Optional[str]) -> None:
+        with self._lock:
+            try:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO pages (url, etag, last_modified, body, parsed, fetched_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, etag, last_modified, body, parsed, time.time())
+                )
+                if self.max_pages > 0:
+                    self._db.execute(
+                        'DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)',
+                        (self.max_pages,)
+                    )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing page cache: {e}")
+
+    def conditional_headers(self, cached: Optional[Dict]) -> Dict[str, str]:
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def record(self, not_modified: bool, url: Optional[str] = None) -> None:
+        metrics.inc('cache_requests_total', cache='page', result='not_modified' if not_modified else 'modified')
+        with self._lock:
+            if not_modified:
+                self.hits += 1
+                if url:
+                    try:  # A revalidated page counts as freshly fetched for eviction
+                        self._db.execute('UPDATE pages SET fetched_at = ? WHERE url = ?', (time.time(), url))
+                        self._db.commit()
+                    except sqlite3.Error as e:
+                        print(f"Error writing page cache: {e}")
+            else:
+                self.misses += 1
+
+    def reopen(self) -> None:
+        # A new connection for this process; an in-memory store starts empty rather than share the parent's handle
+        with self._lock:
+            self._db = self._connect()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pages = self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            return {"not_modified": self.hits, "full_fetches": self.misses, "pages": pages}
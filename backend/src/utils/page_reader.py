@@ -0,0 +1,76 @@
+import codecs
+import re
+from typing import List, Optional
+
+# Only the tags that decide whether the review container has closed; everything else is left to the parser
+TAG_PATTERN = re.compile(r'<(/?)(article|nav|header|footer|aside|script|style)\b', re.IGNORECASE)
+CONTAINER_TAG = 'article'  # Highest-priority selector, so the first one outside removed elements is always the result
+UNWANTED_TAGS = {'nav', 'header', 'footer', 'aside'}
+RAW_TEXT_TAGS = {'script', 'style'}  # Contents may contain tag-like strings that must not be counted
+_TAG_OVERLAP = 16  # Longest tag prefix the pattern can match, kept between chunks so split tags are still seen
+
+class PageReader:
+    # Decodes a streamed page body incrementally, enforces a byte cap and notices when the first
+    # <article> has closed so the download can stop early
+    def __init__(self, encoding: Optional[str], max_bytes: int, stop_at_container: bool = True):
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.max_bytes = max_bytes
+        self.stop_at_container = stop_at_container
+        self.size = 0
+        self.truncated = False
+        self.container_closed = False
+        self._parts: List[str] = []
+        self._pending = ''
+        self._depth = 0
+        self._unwanted_depth = 0
+        self._raw_tag: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> bool:
+        # Returns True once reading can stop
+        if self.max_bytes and self.size + len(chunk) >= self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        self.size += len(chunk)
+
+        text = self._decoder.decode(chunk, final=self.truncated)
+        self._parts.append(text)
+        if self.stop_at_container:
+            self._scan(text)
+        return self.container_closed or self.truncated
+
+    def text(self) -> str:
+        if not self.truncated and not self.container_closed:
+            self._parts.append(self._decoder.decode(b'', final=True))
+        return ''.join(self._parts)
+
+    def _scan(self, text: str) -> None:
+        buffer = self._pending + text
+        scanned_to = 0
+        for match in TAG_PATTERN.finditer(buffer):
+            if match.end() == len(buffer):
+                break  # The tag name may continue in the next chunk
+            scanned_to = match.end()
+            if self._handle_tag(match.group(2).lower(), closing=bool(match.group(1))):
+                self.container_closed = True
+                return
+        self._pending = buffer[max(scanned_to, len(buffer) - _TAG_OVERLAP):]
+
+    def _handle_tag(self, tag: str, closing: bool) -> bool:
+        if self._raw_tag:
+            if closing and tag == self._raw_tag:
+                self._raw_tag = None
+        elif tag in RAW_TEXT_TAGS:
+            if not closing:
+                self._raw_tag = tag
+        elif tag in UNWANTED_TAGS:
+            self._unwanted_depth = max(0, self._unwanted_depth + (-1 if closing else 1))
+        elif tag == CONTAINER_TAG and self._unwanted_depth == 0:
+            if not closing:
+                self._depth += 1
+            elif self._depth > 0:
+                self._depth -= 1
+                return self._depth == 0
+        return False
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from itertools import combinations
+from typing import Dict, List, Optional
+
+PHASH_INDEX_PATH = os.getenv('PHASH_INDEX_PATH', ':memory:')  # Point at a file to remember submissions across restarts
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', 31))  # Hamming distance (of 256 bits) that counts as the same image
+PHASH_INDEX_MAX_ENTRIES = int(os.getenv('PHASH_INDEX_MAX_ENTRIES', 200000))  # Oldest hashes are evicted beyond this
+HASH_BITS = 256  # ImageProcessor.perceptual_hash
+BANDS = 16  # Multi-index hashing: a match within distance d agrees with the query to within d // BANDS bits in some band
+BAND_BITS = HASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+if hasattr(int, 'bit_count'):  # Python 3.10+
+    def hamming(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+else:
+    def hamming(a: int, b: int) -> int:
+        return bin(a ^ b).count('1')
+
+def _flip_masks(radius: int) -> List[int]:
+    # Every BAND_BITS-bit mask with at most radius bits set, i.e. the neighbourhood probed in each band
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(BAND_BITS), bits):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+class PHashIndex:
+    # Near-duplicate lookup over perceptual hashes of past submissions. Each hash is split into BANDS substrings
+    # that are indexed exactly, so a query only verifies the few entries sharing a nearby substring instead of
+    # scanning every stored hash.
+    def __init__(self, max_distance: int = PHASH_MAX_DISTANCE, db_path: Optional[str] = PHASH_INDEX_PATH,
+                 max_entries: int = PHASH_INDEX_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.matches = 0
+        self._hashes: Dict[int, int] = {}  # entry -> hash, oldest first
+        self._verdicts: Dict[int, Dict] = {}
+        self._ids: Dict[int, int] = {}  # hash -> entry
+        self._next_entry = 0
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self._masks: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self.db_path = db_path
+        if db_path:
+            self._db = self._connect()
+            for row in self._db.execute('SELECT hash, fraud_detected, confidence, reasoning FROM phashes ORDER BY created_at'):
+                self._insert(int(row[0], 16), {"fraud_detected": bool(row[1]), "confidence": row[2], "reasoning": row[3]})
+            self._evict()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS phashes ('
+            'hash TEXT PRIMARY KEY, fraud_detected INTEGER, confidence REAL, reasoning TEXT, created_at REAL)'
+        )
+        db.commit()
+        return db
+
+    def _insert(self, image_hash: int, verdict: Dict) -> None:
+        entry = self._ids.get(image_hash)
+        if entry is not None:
+            self._verdicts[entry] = verdict  # Same image analysed again, keep the latest verdict
+            self._hashes[entry] = self._hashes.pop(entry)  # and count it as the newest for eviction
+            return
+        entry = self._next_entry
+        self._next_entry += 1
+        self._ids[image_hash] = entry
+        self._hashes[entry] = image_hash
+        self._verdicts[entry] = verdict
+        for band in range(BANDS):
+            self._bands[band].setdefault((image_hash >> (band * BAND_BITS)) & BAND_MASK, []).append(entry)
+
+    def _evict(self) -> None:
+        # Drops the oldest entries past max_entries from memory and the store
+        evicted = []
+        while self.max_entries > 0 and len(self._hashes) > self.max_entries:
+            entry = next(iter(self._hashes))
+            image_hash = self._hashes.pop(entry)
+            del self._verdicts[entry]
+            del self._ids[image_hash]
+            for band in range(BANDS):
+                value = (image_hash >> (band * BAND_BITS)) & BAND_MASK
+                entries = self._bands[band][value]
+                entries.remove(entry)
+                if not entries:
+                    del self._bands[band][value]
+            evicted.append((f'{image_hash:064x}',))
+        if evicted and self._db is not None:
+            try:
+                self._db.executemany('DELETE FROM phashes WHERE hash = ?', evicted)
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing perceptual hash index: {e}")
+
+    def add(self, image_hash: int, analysis: Dict) -> None:
+        try:
+            confidence = float(analysis.get('confidence', 0.5))
+        except (TypeError, ValueError):
+            confidence = 0.5
+        verdict = {
+            "fraud_detected": bool(analysis.get('fraud_detected', False)),
+            "confidence": confidence,
+            "reasoning": analysis.get('reasoning', '')
+        }
+        with self._lock:
+            self._insert(image_hash, verdict)
+            self._evict()
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO phashes (hash, fraud_detected, confidence, reasoning, created_at) VALUES (?, ?, ?, ?, ?)',
+                        (f'{image_hash:064x}', int(verdict['fraud_detected']), confidence, verdict['reasoning'], time.time())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing perceptual hash index: {e}")
+
+    def lookup(self, image_hash: int, max_distance: Optional[int] = None) -> Optional[Dict]:
+        # Returns the closest stored verdict within max_distance, with its distance, or None
+        max_distance = self.max_distance if max_distance is None else max_distance
+        radius = max_distance // BANDS
+        with self._lock:
+            masks = self._masks.get(radius)
+            if masks is None:
+                masks = self._masks[radius] = _flip_masks(radius)
+
+            candidates = set()
+            for band in range(BANDS):
+                buckets = self._bands[band]
+                value = (image_hash >> (band * BAND_BITS)) & BAND_MASK
+                for mask in masks:
+                    entries = buckets.get(value ^ mask)
+                    if entries:
+                        candidates.update(entries)
+
+            best, best_distance = None, max_distance + 1
+            for entry in candidates:
+                distance = hamming(image_hash, self._hashes[entry])
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+
+            self.lookups += 1
+            if best is None:
+                return None
+            self.matches += 1
+            return dict(self._verdicts[best], distance=best_distance)
+
+    def reopen(self) -> None:
+        # A new connection for this process; an in-memory store starts empty rather than share the parent's handle
+        with self._lock:
+            if self.db_path:
+                self._db = self._connect()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._hashes), "lookups": self.lookups, "matches": self.matches}
@@ -0,0 +1,134 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .text_chunking import split_reviews
+
+PRESCREEN_ENABLED = os.getenv('PRESCREEN_ENABLED', '1') == '1'
+PRESCREEN_THRESHOLD = float(os.getenv('PRESCREEN_THRESHOLD', 0.8))  # Fraud score at which Sonar is skipped
+PRESCREEN_MIN_WORDS = int(os.getenv('PRESCREEN_MIN_WORDS', 2))  # Fewer words than this can't be judged either way
+MIN_REVIEWS = 4  # Cross-review duplication needs a few reviews to mean anything
+NGRAM_SIZE = 5  # Word shingles shared between reviews
+DUPLICATE_SHARE = 0.5  # A review whose shingles mostly occur in other reviews counts as a copy
+MIN_REPETITION_WORDS = 20  # Repetition ratio is noisy on short reviews
+OUTLIER_Z = 3.5  # Modified z-score of review length that counts as an outlier
+OUTLIER_WEIGHT = 0.2  # Length outliers alone never decide, but push a borderline page over the threshold
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5, 0xFF51AFD7ED558CCD],
+                dtype=np.uint64)[:NGRAM_SIZE]
+
+def _word_hashes(review: str) -> np.ndarray:
+    return np.array([hash(word) for word in WORD_PATTERN.findall(review.lower())], dtype=np.int64).view(np.uint64)
+
+def _shingles(words: np.ndarray) -> np.ndarray:
+    # Hash of each run of NGRAM_SIZE words, computed as one vector operation per position in the run
+    count = len(words) - NGRAM_SIZE + 1
+    if count <= 0:
+        return words[:0]
+    shingles = np.zeros(count, dtype=np.uint64)
+    for i in range(NGRAM_SIZE):
+        shingles ^= words[i:i + count] * _MIX[i]  # Wraps around on overflow, which is fine for hashing
+    return shingles
+
+class PreScreener:
+    # Cheap text features that settle clear-cut review pages locally, so only ambiguous ones cost a Sonar call
+    def __init__(self, threshold: float = PRESCREEN_THRESHOLD, min_words: int = PRESCREEN_MIN_WORDS, enabled: bool = PRESCREEN_ENABLED):
+        self.threshold = threshold
+        self.min_words = min_words
+        self.enabled = enabled
+        self.screened = 0
+        self.answered = 0
+        self._lock = threading.Lock()
+
+    def features(self, text: str) -> Dict:
+        reviews = split_reviews(text)
+        words = [_word_hashes(review) for review in reviews]
+        total_words = sum(len(w) for w in words)
+        # Reviewer names, dates and star ratings come out as separate short lines; only review bodies are compared
+        bodies = [w for w in words if len(w) >= NGRAM_SIZE]
+
+        repetition = 0.0
+        long_bodies = [w for w in bodies if len(w) >= MIN_REPETITION_WORDS]
+        if long_bodies:
+            # Words repeated within the same review, e.g. keyword-stuffed spam; vocabulary reuse across reviews is normal
+            repeats = sum(len(w) - len(np.unique(w)) for w in long_bodies)
+            repetition = repeats / sum(len(w) for w in long_bodies)
+
+        duplicated = 0.0
+        if len(bodies) >= MIN_REVIEWS:
+            shingles = [np.unique(_shingles(w)) for w in bodies]
+            sizes = np.array([len(s) for s in shingles])
+            # Each review's shingles are unique within it, so a shingle seen twice overall is shared between reviews
+            owners = np.concatenate(shingles)
+            values, counts = np.unique(owners, return_counts=True)
+            shared = (counts[np.searchsorted(values, owners)] > 1).astype(np.int64)
+            per_review = np.add.reduceat(shared, np.concatenate(([0], np.cumsum(sizes)[:-1]))) / sizes
+            duplicated = float(np.mean(per_review >= DUPLICATE_SHARE))
+
+        outliers = 0.0
+        if len(bodies) >= MIN_REVIEWS:
+            lengths = np.array([len(w) for w in bodies], dtype=np.float64)
+            deviation = np.abs(lengths - np.median(lengths))
+            mad = np.median(deviation)
+            if mad > 0:
+                outliers = float(np.mean(0.6745 * deviation / mad > OUTLIER_Z))
+
+        return {
+            "words": total_words,
+            "reviews": len(bodies),
+            "repetition_ratio": round(float(repetition), 3),
+            "duplicate_ratio": round(duplicated, 3),
+            "length_outliers": round(outliers, 3),
+            "score": round(min(1.0, max(duplicated, 2 * max(0.0, repetition - 0.5)) + OUTLIER_WEIGHT * outliers), 3)
+        }
+
+    def screen(self, text: Optional[str], model_type: str) -> Optional[Dict]:
+        # Returns a local verdict for clear-cut review text, or None when Sonar should decide
+        if not self.enabled or model_type != 'reviews' or not text:
+            return None
+
+        signals = self.features(text)
+        verdict = None
+        if signals['words'] < self.min_words:
+            verdict = {
+                "fraud_detected": False,
+                "reasoning": f"Only {signals['words']} word(s) of review text, too little to assess; recommend verification.",
+                "confidence": 0.5
+            }
+        elif signals['score'] >= self.threshold:
+            verdict = {
+                "fraud_detected": True,
+                "reasoning": self._reasoning(signals),
+                "confidence": round(1.0 - signals['score'], 2)  # Same scale as Sonar: 0.0 is certain fraud
+            }
+
+        with self._lock:
+            self.screened += 1
+            if verdict:
+                self.answered += 1
+        if verdict:
+            verdict.update({"prescreened": True, "signals": signals})
+        return verdict
+
+    @staticmethod
+    def _reasoning(signals: Dict) -> str:
+        found: List[str] = []
+        if signals['duplicate_ratio']:
+            found.append(f"{signals['duplicate_ratio']:.0%} of {signals['reviews']} reviews copy text from other reviews")
+        if signals['repetition_ratio'] > 0.5:
+            found.append(f"{signals['repetition_ratio']:.0%} of words are repeats")
+        if signals['length_outliers']:
+            found.append(f"{signals['length_outliers']:.0%} of reviews have outlying lengths")
+        return "Flagged by local pre-screen: " + "; ".join(found) + "."
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "screened": self.screened,
+                "answered_locally": self.answered,
+                "avoided_fraction": round(self.answered / self.screened, 3) if self.screened else 0.0
+            }
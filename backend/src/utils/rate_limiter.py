@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+from typing import Dict
+
+class TokenBucket:
+    # Refills at rate units per second up to capacity. Callers reserve what they need straight away and sleep
+    # off any deficit, so a burst is spread out in arrival order instead of failing upstream with 429s.
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        # Returns how long the caller must wait before using the reserved amount
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+class RateLimiter:
+    # Request and token budgets for one upstream API, e.g. Sonar's per-minute limits; 0 disables a budget
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60))
+        self.tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60))
+        self.waits = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if delay > 0:
+            with self._lock:
+                self.waits += 1
+                self.waited += delay
+        return delay
+
+    def acquire(self, tokens: int = 0) -> None:
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"throttled": self.waits, "throttled_seconds": round(self.waited, 3)}
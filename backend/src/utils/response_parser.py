@@ -0,0 +1,117 @@
+import json
+import re
+from typing import Dict, List, Optional
+
+VERDICTS = ("genuine", "suspicious", "fraudulent")
+
+# JSON schema requested from the API when structured output is enabled. The score comes first so that a
+# stream can be scored from its first few tokens.
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number"},
+        "verdict": {"type": "string", "enum": list(VERDICTS)},
+        "indicators": {"type": "array", "items": {"type": "string"}},
+        "reasoning": {"type": "string"}
+    },
+    "required": ["score", "verdict", "indicators", "reasoning"]
+}
+
+# Scanned once per response instead of once per keyword
+FRAUD_PATTERN = re.compile(r"fraud|\bforg(?:e|ed|es|ery|eries|ing)\b|unsafe|dangerous|invalid|red flag|unlicensed|counterfeit|suspicious", re.IGNORECASE)
+JSON_SCORE_PATTERN = re.compile(r'"score"\s*:\s*"?(-?\d+(?:\.\d+)?)')
+COMPLETE_SCORE_PATTERN = re.compile(r'"score"\s*:\s*"?(-?\d+(?:\.\d+)?)(?=[\s,}"])')  # Something follows the number
+LEADING_SCORE_PATTERN = re.compile(r'\s*(?:\*\*)?(?:score\s*[:=]?\s*)?(-?\d+(?:\.\d+)?)\s*(?:\*\*)?\s*[;:\-|,\n]', re.IGNORECASE)
+OBJECT_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+
+class ResponseParseError(ValueError):
+    pass
+
+def _clamp(score: float) -> float:
+    return round(max(0.0, min(1.0, score)), 2)
+
+def _score_from_json(data: Dict) -> Optional[float]:
+    try:
+        return _clamp(float(data.get('score')))
+    except (TypeError, ValueError):
+        return None
+
+def parse_verdict(content: str) -> Dict:
+    # Accepts the JSON object asked for by the prompt, the same wrapped in a code fence or prose, or the older
+    # "0.8; reasoning" form. Raises ResponseParseError when no score can be found at all.
+    content = (content or '').strip()
+    match = OBJECT_PATTERN.search(content)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            score = _score_from_json(data)
+            if score is not None:
+                indicators = data.get('indicators') or []
+                if not isinstance(indicators, list):
+                    indicators = [indicators]
+                indicators = [str(indicator) for indicator in indicators]
+                verdict = str(data.get('verdict', '')).lower()
+                reasoning = str(data.get('reasoning', '')).strip()
+                if verdict in VERDICTS:
+                    fraud_detected = verdict != 'genuine'
+                else:
+                    verdict = None
+                    fraud_detected = bool(indicators) or bool(FRAUD_PATTERN.search(reasoning))
+                return {
+                    "fraud_detected": fraud_detected,
+                    "reasoning": reasoning,
+                    "confidence": score,
+                    "verdict": verdict,
+                    "indicators": indicators
+                }
+
+    score = leading_score(content)
+    if score is None:
+        match = JSON_SCORE_PATTERN.search(content)  # Truncated JSON still gives a usable score
+        if match is None:
+            raise ResponseParseError(f"No score in response: {content[:80]!r}")
+        score = _clamp(float(match.group(1)))
+        reasoning = ''
+    else:
+        reasoning = LEADING_SCORE_PATTERN.sub('', content, count=1).strip()
+    return {
+        "fraud_detected": bool(FRAUD_PATTERN.search(content)),
+        "reasoning": reasoning,
+        "confidence": score,
+        "verdict": None,
+        "indicators": []
+    }
+
+def leading_score(text: str) -> Optional[float]:
+    # The score of the older "0.8; reasoning" form, once its separator has arrived
+    match = LEADING_SCORE_PATTERN.match(text)
+    if match is None:
+        return None
+    return _clamp(float(match.group(1)))
+
+class StreamingScoreParser:
+    # Fed streamed deltas, reports the score as soon as it is complete, usually within the first few tokens
+    def __init__(self):
+        self.parts: List[str] = []
+        self.score: Optional[float] = None
+        self._length = 0
+
+    def feed(self, delta: str) -> Optional[float]:
+        # Returns the score on the delta that completes it, otherwise None
+        self.parts.append(delta)
+        self._length += len(delta)
+        if self.score is not None or self._length > 200:
+            return None  # A score that hasn't shown up by now isn't where it should be
+        text = ''.join(self.parts)
+        match = COMPLETE_SCORE_PATTERN.search(text)
+        if match:
+            self.score = _clamp(float(match.group(1)))
+        elif not text.lstrip().startswith(('{', '`')):
+            self.score = leading_score(text)
+        return self.score
+
+    def text(self) -> str:
+        return ''.join(self.parts)
@@ -0,0 +1,46 @@
+import re
+from typing import List
+
+CHARS_PER_TOKEN = 4  # Rough average for English text; close enough for sizing requests
+BLANK_LINE_PATTERN = re.compile(r'\n\s*\n')
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_reviews(text: str) -> List[str]:
+    # Extracted pages separate reviews with blank lines when the markup has them, otherwise each text node is a line
+    paragraphs = [p.strip() for p in BLANK_LINE_PATTERN.split(text) if p.strip()]
+    if len(paragraphs) > 1:
+        return paragraphs
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    # Packs whole reviews into chunks of at most max_tokens, only splitting a review that is too long on its own
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current: List[str] = []
+    size = 0
+    for review in split_reviews(text):
+        for piece in _split_long(review, max_chars):
+            if current and size + len(piece) + 1 > max_chars:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def _split_long(review: str, max_chars: int) -> List[str]:
+    if len(review) <= max_chars:
+        return [review]
+    pieces = []
+    while len(review) > max_chars:
+        cut = review.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(review[:cut].strip())
+        review = review[cut:].strip()
+    if review:
+        pieces.append(review)
+    return pieces
@@ -1,17 +1,42 @@
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 from urllib.robotparser import RobotFileParser
-from typing import Optional, Tuple
+from functools import partial
+from typing import Dict, Mapping, Optional, Tuple
+import asyncio
+import os
+import re
+import threading
+import time
+import httpx
 import requests
-from bs4 import BeautifulSoup
+from .html_extract import extract_content
+from .metrics import metrics
+from .page_cache import PageCache
+from .page_reader import PageReader
 
 TIMEOUT = 10
 MAX_RETRIES = 3
+RETRY_STATUSES = [500, 502, 503, 504]
+ROBOTS_TTL = int(os.getenv('ROBOTS_TTL', 60 * 60))
+ROBOTS_ERROR_TTL = int(os.getenv('ROBOTS_ERROR_TTL', 5 * 60))  # Shorter, so a site is retried soon after its robots.txt errors
+ROBOTS_MAX_TTL = 24 * 60 * 60  # RFC 9309 asks crawlers not to trust a cached robots.txt for longer than a day
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+MAX_PAGE_BYTES = int(os.getenv('MAX_PAGE_BYTES', 5 * 1024 * 1024))  # Hard cap on the decompressed body we read
+CHUNK_SIZE = 64 * 1024
 
 class WebScraper:
-    def __init__(self, timeout: int = TIMEOUT, max_retries: int = MAX_RETRIES):
+    def __init__(self, timeout: int = TIMEOUT, max_retries: int = MAX_RETRIES, robots_ttl: int = ROBOTS_TTL, page_cache: Optional[PageCache] = None, max_page_bytes: int = MAX_PAGE_BYTES):
         self.session = requests.Session()
+        self.max_page_bytes = max_page_bytes
+        self.page_cache = page_cache if page_cache is not None else PageCache()
         self.timeout = timeout
+        self.max_retries = max_retries
+        self.robots_ttl = robots_ttl
+        self._robots_cache = {}  # origin -> (expires_at, RobotFileParser)
+        self._robots_lock = threading.Lock()
+        self._async_client = None  # Created on first async fetch, inside the serving event loop
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
             'Accept-Language': 'en-US,en;q=0.5' # q value such that it accepts any english content
@@ -19,9 +44,9 @@ class WebScraper:
 
         # When retrying, we will wait 0.2 seconds before the first retry and double the wait time for each subsequent retry.
         retry = Retry(
-            total=MAX_RETRIES,
+            total=max_retries,
             backoff_factor=0.2,
-            status_forcelist=[500, 502, 503, 504]
+            status_forcelist=RETRY_STATUSES
         )
 
         # Retry logic is applied to both HTTP and HTTPS requests.
@@ -29,56 +54,198 @@ class WebScraper:
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
 
-    # Use robots.txt to check if the URL can be fetched
+    @staticmethod
+    def _robots_url(url: str) -> Tuple[str, str]:
+        # robots.txt always lives at the root of the origin, whatever page is being fetched
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'
+        return origin, f'{origin}/robots.txt'
+
+    def _cached_robots(self, origin: str) -> Tuple[bool, Optional[RobotFileParser]]:
+        with self._robots_lock:
+            entry = self._robots_cache.get(origin)
+            if entry and entry[0] > time.time():
+                return True, entry[1]
+            return False, None
+
+    def _store_robots(self, origin: str, robots_url: str, status: Optional[int], text: str = '', headers: Optional[Mapping] = None) -> RobotFileParser:
+        # status is None when robots.txt could not be fetched at all (timeout, connection error).
+        # 401/403 disallow and other 4xx allow, as in RobotFileParser.read(). Unlike read(), a server error or an
+        # unreachable robots.txt also disallows (RFC 9309 2.3.1.4), cached only for ROBOTS_ERROR_TTL
+        rp = RobotFileParser(robots_url)
+        ttl = ROBOTS_ERROR_TTL
+        if status is None or status >= 500:
+            rp.disallow_all = True
+        else:
+            if status in (401, 403):
+                rp.disallow_all = True
+            elif 400 <= status < 500:
+                rp.allow_all = True
+            else:
+                rp.parse(text.splitlines())
+            ttl = self._robots_ttl(headers or {})
+
+        with self._robots_lock:
+            self._robots_cache[origin] = (time.time() + ttl, rp)
+        return rp
+
+    def _robots_ttl(self, headers: Mapping) -> int:
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return 0
+        match = MAX_AGE_PATTERN.search(cache_control)
+        if match:
+            return min(int(match.group(1)), ROBOTS_MAX_TTL)
+        return self.robots_ttl
+
+    def _robots_allows(self, rp: RobotFileParser, url: str) -> bool:
+        return rp.can_fetch(self.headers['User-Agent'], url) # Check page permissions
+
+    # Use robots.txt to check if the URL can be fetched, fetching it at most once per origin per TTL
     def _can_fetch(self, url: str) -> bool:
-        try:
-            rp = RobotFileParser()
-            rp.set_url(f'{url.rstrip("/")}/robots.txt')
-            rp.read()
-            return rp.can_fetch(self.headers['User-Agent'], url) # Check page permissions
-        except Exception as e:
-            print(f"Error checking robots.txt: {e}")
-            return True # Default to True if robots.txt cannot be read
+        origin, robots_url = self._robots_url(url)
+        cached, rp = self._cached_robots(origin)
+        if not cached:
+            try:
+                with metrics.timer('robots_check'):
+                    response = self.session.get(robots_url, headers=self.headers, timeout=self.timeout)
+                rp = self._store_robots(origin, robots_url, response.status_code, response.text, response.headers)
+            except Exception as e:
+                print(f"Error checking robots.txt: {e}")
+                rp = self._store_robots(origin, robots_url, None)
+        return self._robots_allows(rp, url)
 
-    def fetch_page(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+    def fetch_page(self, url: str, keep_raw: bool = False) -> Tuple[Optional[str], Optional[str]]:
+        # Returns (raw HTML, extracted text); the raw HTML is only kept when asked for
         if not self._can_fetch(url):
             raise Exception(f"Fetching {url} is disallowed by robots.txt")
             return None, None
 
         try:
-            response = self.session.get(
-                url,
+            # Revalidate pages we have seen before; requests negotiates gzip (and brotli when installed) by default
+            cached = self._cached_page(url, keep_raw)
+            with metrics.timer('page_fetch'):
+                response = self.session.get(
+                    url,
+                    headers={**self.headers, **self.page_cache.conditional_headers(cached)},
+                    timeout=self.timeout,
+                    stream=True
+                )
+                try:
+                    if response.status_code == 304 and cached:
+                        self.page_cache.record(not_modified=True, url=url)
+                        return cached['body'] if keep_raw else None, cached['parsed']
+
+                    response.raise_for_status()
+                    reader = PageReader(response.encoding, self.max_page_bytes, stop_at_container=not keep_raw)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if reader.feed(chunk):
+                            break
+                finally:
+                    response.close()  # Drops the rest of the body when we stopped early
+
+            html = reader.text()
+            parsed = self._parse_content(html)
+            self._store_page(url, response.headers, html if keep_raw else None, parsed)
+            return html if keep_raw else None, parsed # If valid, otherwise revert to ..., response.url
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return None, None
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return None, None
+
+    def _cached_page(self, url: str, keep_raw: bool) -> Optional[Dict]:
+        cached = self.page_cache.get(url)
+        if cached and keep_raw and cached['body'] is None:
+            return None  # Stored without its HTML, so a 304 couldn't give the caller the raw page
+        return cached
+
+    def _store_page(self, url: str, headers: Mapping, body: Optional[str], parsed: Optional[str]) -> None:
+        self.page_cache.record(not_modified=False)
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:  # Pages without validators can't be revalidated, so aren't worth storing
+            self.page_cache.set(url, etag, last_modified, body, parsed)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
                 headers=self.headers,
-                timeout=self.timeout
+                timeout=self.timeout,
+                follow_redirects=True,
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries)  # Retries failed connections
             )
-            response.raise_for_status() 
-            return response.text, self._parse_content(response.text) # If valid, otherwise revert to ..., response.url
-        except requests.exceptions.RequestException as e:
+        return self._async_client
+
+    async def _aget(self, url: str, headers: Optional[Mapping] = None) -> httpx.Response:
+        # Mirror the sync session's status retries with the same exponential backoff. The body is left unread
+        client = self._get_async_client()
+        for attempt in range(self.max_retries + 1):
+            response = await client.send(client.build_request('GET', url, headers=headers), stream=True)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            await response.aclose()
+            await asyncio.sleep(0.2 * (2 ** attempt))
+
+    async def _acan_fetch(self, url: str) -> bool:
+        origin, robots_url = self._robots_url(url)
+        cached, rp = self._cached_robots(origin)
+        if not cached:
+            try:
+                with metrics.timer('robots_check'):
+                    response = await self._get_async_client().get(robots_url)
+                rp = self._store_robots(origin, robots_url, response.status_code, response.text, response.headers)
+            except Exception as e:
+                print(f"Error checking robots.txt: {e}")
+                rp = self._store_robots(origin, robots_url, None)
+        return self._robots_allows(rp, url)
+
+    async def afetch_page(self, url: str, keep_raw: bool = False) -> Tuple[Optional[str], Optional[str]]:
+        # Non-blocking counterpart of fetch_page() for the ASGI server
+        if not await self._acan_fetch(url):
+            raise Exception(f"Fetching {url} is disallowed by robots.txt")
+
+        try:
+            # The page cache is SQLite, and it and the CPU-bound parsing are kept off the event loop
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(None, self._cached_page, url, keep_raw)
+            with metrics.timer('page_fetch'):
+                response = await self._aget(url, self.page_cache.conditional_headers(cached))
+                try:
+                    if response.status_code == 304 and cached:
+                        await loop.run_in_executor(None, partial(self.page_cache.record, not_modified=True, url=url))
+                        return cached['body'] if keep_raw else None, cached['parsed']
+
+                    response.raise_for_status()
+                    reader = PageReader(response.charset_encoding, self.max_page_bytes, stop_at_container=not keep_raw)
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        if reader.feed(chunk):
+                            break
+                finally:
+                    await response.aclose()
+
+            html = reader.text()
+            parsed = await loop.run_in_executor(None, self._parse_content, html)
+            await loop.run_in_executor(None, self._store_page, url, response.headers, html if keep_raw else None, parsed)
+            return html if keep_raw else None, parsed
+        except httpx.HTTPError as e:
             print(f"Error fetching {url}: {e}")
             return None, None
         except Exception as e:
             print(f"Unexpected error: {e}")
             return None, None
 
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def _parse_content(self, content: str) -> str:
         try:
-            soup = BeautifulSoup(content, 'html.parser')
-
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                element.decompose()
-            
-            selectors = [
-                'article',
-                'main',
-                'div.content',
-                'div.main-content',
-                'div.post-content',
-            ]
-            for selector in selectors:
-                element = soup.select_one(selector)
-                if element:
-                    return element.get_text(separator='\n', strip=True)
+            # Uses the fastest installed parser; see html_extract for the container selectors and removed elements
+            with metrics.timer('html_parse'):
+                return extract_content(content)
 
         except Exception as e:
             print(f"Error parsing content: {e}")
@@ -86,6 +253,6 @@ class WebScraper:
         
 if __name__ == '__main__':
     scraper = WebScraper()
-    raw_html, content = scraper.fetch_page("https://www.nandos.co.uk/")
+    raw_html, content = scraper.fetch_page("https://www.nandos.co.uk/", keep_raw=True)
     print(f"Content length: {len(content)} characters")
     print(f"Raw HTML length: {len(raw_html)} characters")
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    from .utils.metrics import metrics
+except ImportError:
+    from utils.metrics import metrics
+
+CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', 1024))
+CACHE_TTL = int(os.getenv('VERDICT_CACHE_TTL', 24 * 60 * 60))
+CACHE_PATH = os.getenv('VERDICT_CACHE_PATH')  # Optional SQLite file for the on-disk tier
+
+class VerdictCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: int = CACHE_TTL, db_path: Optional[str] = CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (expires_at, verdict), oldest first
+        self._lock = threading.Lock()
+        self.db_path = db_path
+        self._db = self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute('CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, expires_at REAL, verdict TEXT)')
+        db.commit()
+        return db
+
+    @staticmethod
+    def make_key(payload: bytes, model_type: str, model: str, system_prompt: Optional[str]) -> str:
+        # Length-prefix every part so that no two different inputs can hash to the same byte stream
+        digest = hashlib.sha256()
+        for part in (model_type.encode(), model.encode(), (system_prompt or '').encode(), payload):
+            digest.update(len(part).to_bytes(8, 'big'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                metrics.inc('cache_requests_total', cache='verdict', result='hit')
+                return dict(entry[1])
+            if entry:
+                del self._memory[key]
+
+            stored = self._disk_get(key, now)
+            if stored is not None:
+                expires_at, verdict = stored
+                self.hits += 1
+                self.disk_hits += 1
+                metrics.inc('cache_requests_total', cache='verdict', result='disk_hit')
+                self._memory_set(key, verdict, expires_at)  # Promoted entries keep their original expiry
+                return dict(verdict)
+
+            self.misses += 1
+            metrics.inc('cache_requests_total', cache='verdict', result='miss')
+            return None
+
+    def set(self, key: str, verdict: Dict) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._memory_set(key, dict(verdict), expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO verdicts (key, expires_at, verdict) VALUES (?, ?, ?)',
+                        (key, expires_at, json.dumps(verdict))
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    print(f"Error writing verdict cache: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM verdicts')
+                self._db.commit()
+
+    def reopen(self) -> None:
+        # A new connection for this process; an in-memory store starts empty rather than share the parent's handle
+        with self._lock:
+            self._db = self._connect()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._memory)
+            }
+
+    def _memory_set(self, key: str, verdict: Dict, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires_at, verdict)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)  # Evict least recently used
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Dict]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute('SELECT expires_at, verdict FROM verdicts WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return None
+            if row[0] <= now:
+                self._db.execute('DELETE FROM verdicts WHERE key = ?', (key,))
+                self._db.commit()
+                return None
+            return row[0], json.loads(row[1])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error reading verdict cache: {e}")
+            return None
@@ -0,0 +1,25 @@
+import base64
+import os
+import sys
+from io import BytesIO
+import pytest
+from PIL import Image
+
+# The backend modules import each other relative to src/, as they do when app.py is run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('PERPLEXITY_API_KEY', 'test-key')
+os.environ.setdefault('JOB_QUEUE_PATH', ':memory:')  # Jobs are persisted to jobs.db by default
+os.environ.setdefault('SONAR_HEALTH_INTERVAL', '0')  # No reachability probes from /status
+
+@pytest.fixture
+def client():
+    from app import app
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def png_base64() -> str:
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'white').save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
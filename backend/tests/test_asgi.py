@@ -0,0 +1,152 @@
+import asyncio
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from asgi import app
+from utils.web_scraper import WebScraper
+
+def run(coro):
+    return asyncio.run(coro)
+
+@patch('asgi.sonar.aanalyse')
+def test_analyse_text(mock_sonar):
+    """The ASGI server keeps the /analyse contract"""
+    async def fake_analyse(text, image_base64, model_type):
+        return {"fraud_detected": True, "reasoning": "Repeated phrasing", "confidence": 0.1}
+    mock_sonar.side_effect = fake_analyse
+
+    async def scenario():
+        response = await app.test_client().post('/analyse', json={"input": ["text", "Buy now!!!"]})
+        return response.status_code, await response.get_json()
+
+    status, data = run(scenario())
+    assert status == 200
+    assert data['fraud_detected'] is True
+    assert data['processed_text'] == "Buy now!!!"
+
+@patch('asgi.sonar.aanalyse')
+def test_batch_overlaps_analyses(mock_sonar):
+    """Batch items are awaited concurrently on one event loop"""
+    async def slow_analyse(text, image_base64, model_type):
+        await asyncio.sleep(0.2)
+        return {"fraud_detected": False, "reasoning": text, "confidence": 0.9}
+    mock_sonar.side_effect = slow_analyse
+
+    async def scenario():
+        response = await app.test_client().post('/analyse/batch', json={
+            "inputs": [["text", f"review {i}"] for i in range(5)] + [["bogus", "data"]]
+        })
+        return await response.get_json()
+
+    start = time.time()
+    results = run(scenario())['results']
+    assert time.time() - start < 0.6
+    assert [r['reasoning'] for r in results[:5]] == [f"review {i}" for i in range(5)]
+    assert results[5]['status'] == 400
+
+@patch('asgi.sonar.aanalyse')
+def test_slow_preparation_stays_off_the_event_loop(mock_sonar):
+    """Review indexing runs in a thread, so a slow lookup doesn't hold up other requests"""
+    async def fake_analyse(text, image_base64, model_type):
+        return {"fraud_detected": False, "reasoning": "ok", "confidence": 0.9}
+    mock_sonar.side_effect = fake_analyse
+
+    def slow_find_duplicates(reviews, source=None):
+        time.sleep(0.3)
+        return []
+
+    async def scenario():
+        client = app.test_client()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        response = await client.post('/analyse', json={"input": ["text", "Great product, would buy again from this shop"]})
+        task.cancel()
+        return response.status_code, ticks
+
+    with patch('app.review_index.find_duplicates', side_effect=slow_find_duplicates):
+        status, ticks = run(scenario())
+    assert status == 200
+    assert ticks >= 10
+
+def test_afetch_page_respects_robots():
+    """Async scraping checks robots.txt and parses the page off the event loop"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith('robots.txt'):
+            return httpx.Response(200, text="User-agent: *\nDisallow: /private")
+        return httpx.Response(200, text="<html><body><article>Five stars</article></body></html>")
+
+    scraper = WebScraper()
+    scraper._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        _, text = await scraper.afetch_page("https://example.com/reviews")
+        with pytest.raises(Exception, match="robots.txt"):
+            await scraper.afetch_page("https://example.com/private")
+        await scraper.aclose()
+        return text
+
+    assert run(scenario()) == "Five stars"
+
+def count_ticks_during(coro_factory):
+    # Runs the coroutine alongside a 10ms ticker; a blocked event loop shows up as missing ticks
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        result = await coro_factory()
+        task.cancel()
+        return result, ticks
+    return run(scenario())
+
+def test_verdict_cache_stays_off_the_event_loop():
+    """The SQLite-backed verdict cache is read and written from a thread by the async Sonar paths"""
+    from asgi import sonar
+
+    def slow_get(key):
+        time.sleep(0.3)
+        return None
+
+    async def fake_non_stream(messages, model_type):
+        return {"fraud_detected": False, "reasoning": "ok", "confidence": 0.9}
+
+    with patch.object(sonar.cache, 'get', side_effect=slow_get), patch.object(sonar.cache, 'set') as cache_set, \
+         patch.object(sonar, '_ahandle_non_stream', side_effect=fake_non_stream):
+        result, ticks = count_ticks_during(lambda: sonar.aanalyse("Great pharmacy"))
+    assert result['confidence'] == 0.9
+    cache_set.assert_called_once()
+    assert ticks >= 10
+
+def test_job_store_stays_off_the_event_loop():
+    """Submitting and polling jobs reach the SQLite job store from a thread"""
+    job = {"job_id": "abc", "priority": "interactive", "status": "queued", "queue_position": 0}
+
+    def slow(*args):
+        time.sleep(0.3)
+        return job
+
+    async def submit_and_poll():
+        client = app.test_client()
+        submitted = await client.post('/jobs', json={"input": ["text", "Great pharmacy"]})
+        polled = await client.get('/jobs/abc')
+        return submitted.status_code, polled.status_code
+
+    with patch('asgi.job_queue') as queue:
+        queue.submit.side_effect = slow
+        queue.get.side_effect = slow
+        statuses, ticks = count_ticks_during(submit_and_poll)
+    assert statuses == (202, 200)
+    assert ticks >= 20
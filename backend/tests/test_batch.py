@@ -0,0 +1,43 @@
+import time
+from unittest.mock import patch
+
+@patch('app.sonar.analyse')
+def test_batch_preserves_order_and_item_errors(mock_sonar, client):
+    """Batch results come back in input order with per-item errors"""
+    mock_sonar.side_effect = lambda text, image_base64, model_type: {
+        "fraud_detected": "fake" in text, "reasoning": text, "confidence": 0.5
+    }
+
+    response = client.post('/analyse/batch', json={
+        "inputs": [["text", "a fake review"], ["bogus", "data"], ["text", "a real review"]]
+    })
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [200, 400, 200]
+    assert results[0]['fraud_detected'] is True
+    assert "invalid" in results[1]['error'].lower()
+    assert results[2]['reasoning'] == "a real review"
+
+@patch('app.sonar.analyse')
+def test_batch_runs_concurrently(mock_sonar, client):
+    """Batch latency tracks the slowest item rather than the sum"""
+    def slow_analyse(text, image_base64, model_type):
+        time.sleep(0.2)
+        return {"fraud_detected": False, "reasoning": "", "confidence": 0.9}
+    mock_sonar.side_effect = slow_analyse
+
+    start = time.time()
+    response = client.post('/analyse/batch', json={
+        "inputs": [["text", f"review {i}"] for i in range(4)],
+        "concurrency": 4
+    })
+
+    assert response.status_code == 200
+    assert time.time() - start < 0.6
+
+def test_batch_requires_inputs(client):
+    """Batch endpoint rejects requests without an inputs list"""
+    response = client.post('/analyse/batch', json={"input": ["text", "data"]})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,43 @@
+import time
+from unittest.mock import MagicMock
+from sonar_client import SonarClient
+from utils.text_chunking import chunk_text
+from verdict_cache import VerdictCache
+
+def test_chunks_keep_reviews_whole():
+    """Reviews are packed into bounded chunks without being split"""
+    reviews = [f"Review {i}: " + "good " * 20 for i in range(30)]
+    chunks = chunk_text('\n\n'.join(reviews), max_tokens=100)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert sum(chunk.count('Review ') for chunk in chunks) == 30
+
+def test_oversized_review_is_split_on_words():
+    """A single review longer than a chunk is split at word boundaries"""
+    chunks = chunk_text("word " * 500, max_tokens=50)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert ' '.join(chunks).split() == ["word"] * 500
+
+def test_long_input_is_analysed_in_parallel_chunks():
+    """Long pages are analysed chunk by chunk concurrently and merged into one verdict"""
+    client = SonarClient(cache=VerdictCache(max_entries=100, ttl=60, db_path=None))
+    client.long_input_tokens, client.chunk_tokens, client.chunk_concurrency = 200, 100, 8
+
+    def fake_call(messages, model_type):
+        time.sleep(0.1)
+        text = messages[-1]['content'][0]['text']
+        if 'copy' in text:
+            return {"fraud_detected": True, "reasoning": " Copy-paste reviews", "confidence": "0.1"}
+        return {"fraud_detected": False, "reasoning": " Genuine", "confidence": "0.9"}
+    client._handle_non_stream = MagicMock(side_effect=fake_call)
+
+    text = '\n\n'.join([f"genuine review {i} " * 5 for i in range(20)] + ["copy paste " * 5] * 4)
+    start = time.time()
+    result = client.analyse(text=text, model_type="reviews")
+
+    assert time.time() - start < 0.1 * client._handle_non_stream.call_count
+    assert result['fraud_detected'] is True
+    assert 0.1 < result['confidence'] < 0.9
+    assert result['reasoning'].startswith("Copy-paste reviews")
+    assert result['chunks'] == client._handle_non_stream.call_count > 1
@@ -0,0 +1,42 @@
+import glob
+import os
+import pytest
+from bs4 import BeautifulSoup
+from utils.html_extract import available_backends, extract_content
+from utils.web_scraper import WebScraper
+
+PAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'pages', '*.html')))
+
+def legacy_parse(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+        element.decompose()
+    for selector in ['article', 'main', 'div.content', 'div.main-content', 'div.post-content']:
+        element = soup.select_one(selector)
+        if element:
+            return element.get_text(separator='\n', strip=True)
+    return ''
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('path', PAGES, ids=os.path.basename)
+def test_backends_match_legacy_output(backend, path):
+    """Every extraction backend returns the same text as the original BeautifulSoup pass"""
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    assert extract_content(html, backend=backend) == legacy_parse(html)
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_container_inside_removed_element_is_skipped(backend):
+    """A matching container inside e.g. <aside> is ignored, as if it had been removed first"""
+    html = "<aside><article>Advert</article></aside><main>Real <script>x()</script>reviews<nav>Home</nav></main>"
+    assert extract_content(html, backend=backend) == "Real\nreviews"
+
+def test_parse_is_capped():
+    """Only the first max_bytes of a page are parsed"""
+    html = "<article>" + "a" * 100 + "</article><main>late</main>"
+    assert extract_content(html, max_bytes=50) == "a" * 41
+
+def test_unknown_backend_falls_back_to_bs4():
+    """Requesting an unavailable backend still extracts content"""
+    assert WebScraper()._parse_content("<main>Hello</main>") == "Hello"
+    assert extract_content("<main>Hello</main>", backend='missing') == "Hello"
@@ -0,0 +1,122 @@
+import base64
+import os
+from io import BytesIO
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from sonar_client import SonarClient
+from utils.image_processing import ImageProcessor
+from verdict_cache import VerdictCache
+
+TEST_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'utils', 'test-image.png')
+
+def encode(image: Image.Image, fmt: str, **kwargs) -> str:
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def decode(data_url: str) -> Image.Image:
+    return Image.open(BytesIO(base64.b64decode(data_url.split(',', 1)[1])))
+
+def test_large_photo_is_downsampled_and_stripped():
+    """Phone photos are shrunk, rotated per EXIF and sent without metadata"""
+    photo = Image.effect_noise((4000, 3000), 64).convert('RGB')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+    exif[0x010F] = 'PhoneMaker'
+    data = 'data:image/jpeg;base64,' + encode(photo, 'JPEG', quality=95, exif=exif)
+
+    data_url, stats = ImageProcessor(max_dimension=1600).normalize_image(data)
+
+    assert data_url.startswith('data:image/jpeg;base64,')
+    normalized = decode(data_url)
+    assert normalized.size == (1200, 1600)  # Portrait after applying the orientation tag
+    assert not normalized.getexif()
+    assert stats['saved_bytes'] > 0
+    assert stats['normalized_bytes'] < stats['original_bytes']
+
+def test_transparent_png_is_flattened_to_jpeg():
+    """Transparent scans become JPEG on a white background"""
+    with open(TEST_IMAGE, 'rb') as f:
+        data = base64.b64encode(f.read()).decode('ascii')
+    data_url, stats = ImageProcessor(max_dimension=400).normalize_image(data)
+
+    assert stats['format'] == 'JPEG'
+    assert max(decode(data_url).size) == 400
+
+def test_unreadable_image_is_rejected():
+    """Invalid image data is reported instead of being sent to Sonar"""
+    assert ImageProcessor().normalize_image(base64.b64encode(b'not an image').decode()) == (None, {})
+
+@pytest.mark.parametrize('fmt,mime', [('JPEG', 'image/jpeg'), ('PNG', 'image/png'), ('GIF', 'image/gif')])
+def test_messages_use_real_mime_type(fmt, mime):
+    """Images are labelled with their actual format rather than always image/png"""
+    raw = encode(Image.new('RGB', (8, 8)), fmt)
+    client = SonarClient(cache=VerdictCache(max_entries=1, ttl=1, db_path=None))
+    messages = client._build_messages(None, raw, 'prescription')
+    assert messages[-1]['content'][1]['image_url']['url'].startswith(f'data:{mime};base64,')
+
+def phone_mpo() -> str:
+    # Multi-picture JPEG, as written by many phone cameras; Pillow reports its format as MPO
+    with open(TEST_IMAGE, 'rb') as f:
+        page = Image.open(f).convert('RGB')
+    return encode(page, 'MPO', save_all=True, append_images=[page.resize((64, 64))])
+
+def test_phone_mpo_is_accepted_as_jpeg():
+    """MPO uploads are normalised like any JPEG instead of being rejected"""
+    data = phone_mpo()
+    assert Image.open(BytesIO(base64.b64decode(data))).format == 'MPO'
+    data_url, stats = ImageProcessor().normalize_image(data)
+    assert data_url.startswith('data:image/jpeg;base64,')
+    assert decode(data_url).format in ('JPEG', 'MPO')  # Passed through untouched, its first frame is a plain JPEG
+    assert stats['phash']
+
+@patch('app.sonar.analyse')
+def test_mpo_upload_reaches_sonar_with_its_verdict(mock_sonar):
+    """An MPO prescription is analysed and Sonar's verdict is returned unchanged"""
+    from app import app
+    mock_sonar.return_value = {"fraud_detected": True, "reasoning": "Altered dosage", "confidence": "0.15"}
+    with app.test_client() as client:
+        response = client.post('/analyse', json={"input": ["image", phone_mpo()], "model_type": "prescription"})
+    assert response.status_code == 200
+    assert response.get_json()['fraud_detected'] is True
+    assert mock_sonar.call_args.kwargs['image_base64'].startswith('data:image/jpeg;base64,')
+
+@pytest.mark.skipif(not os.getenv('SONAR_LIVE_TESTS'), reason="Set SONAR_LIVE_TESTS=1 to call the real Sonar API")
+def test_normalized_image_keeps_verdict():
+    """Normalizing the test prescription does not change Sonar's verdict"""
+    with open(TEST_IMAGE, 'rb') as f:
+        original = 'data:image/png;base64,' + base64.b64encode(f.read()).decode('ascii')
+    normalized, _ = ImageProcessor().normalize_image(original)
+    client = SonarClient(cache=VerdictCache(max_entries=0, ttl=1, db_path=None))
+
+    before = client.analyse(text=None, image_base64=original, model_type='prescription')
+    after = client.analyse(text=None, image_base64=normalized, model_type='prescription')
+
+    assert before['fraud_detected'] == after['fraud_detected']
+    assert abs(float(before['confidence']) - float(after['confidence'])) <= 0.2
+
+FIXTURE_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'images')
+
+@pytest.mark.parametrize('name,tier', [('prescription_clean.png', 'none'), ('prescription_phone.jpg', 'none'), ('prescription_noisy.jpg', 'full')])
+def test_adaptive_preprocessing_picks_tier_from_noise(name, tier):
+    """Clean scans skip denoising while grainy photos still get the full colour NLM"""
+    _, chosen, _ = ImageProcessor()._preprocess_image(Image.open(os.path.join(FIXTURE_IMAGES, name)))
+    assert chosen == tier
+
+def test_forced_tier_and_resolution_cap():
+    """PREPROCESS_MODE-style forcing runs the requested tier on a capped, binarized image"""
+    processed, tier, _ = ImageProcessor()._preprocess_image(Image.effect_noise((3000, 1000), 20).convert('RGB'), 'fast')
+    assert tier == 'fast'
+    assert processed.size == (2000, 667)
+    assert set(processed.getdata()) <= {0, 255}
+
+def test_ocr_image_reports_tier():
+    """ocr_image returns the OCR text along with the tier that ran"""
+    with open(os.path.join(FIXTURE_IMAGES, 'prescription_clean.png'), 'rb') as f:
+        raw = f.read()
+    with patch('utils.image_processing.pytesseract.image_to_string', return_value=' Amoxicillin 500mg \n') as ocr:
+        result = ImageProcessor().ocr_image(raw)
+    assert result['text'] == 'Amoxicillin 500mg'
+    assert result['tier'] == 'none'
+    ocr.assert_called_once()
@@ -0,0 +1,210 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from utils.job_queue import JobQueue, JobQueueFull
+
+def wait_for(queue: JobQueue, job_id: str, timeout: float = 5) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_job_runs_and_result_is_polled():
+    """A submitted job returns at once and its result is available once a worker has run it"""
+    gate = threading.Event()
+    runner = MagicMock(side_effect=lambda *args: gate.wait(5) and ({"fraud_detected": False, "confidence": 0.9}, 200))
+    queue = JobQueue(runner, workers=1, db_path=':memory:')
+    try:
+        job = queue.submit('text', 'Great pharmacy', 'reviews', 'score')
+        assert job['status'] in ('queued', 'running')
+        gate.set()
+        done = wait_for(queue, job['job_id'])
+        assert done['status'] == 'done'
+        assert done['result'] == {"fraud_detected": False, "confidence": 0.9}
+        assert done['status_code'] == 200
+        runner.assert_called_once_with('text', 'Great pharmacy', 'reviews', 'score')
+    finally:
+        gate.set()
+        queue.shutdown()
+
+def test_failed_analysis_marks_job_failed():
+    """Server-side errors and exceptions leave the job failed with the error body"""
+    queue = JobQueue(MagicMock(side_effect=RuntimeError('boom')), workers=1, db_path=':memory:')
+    try:
+        done = wait_for(queue, queue.submit('text', 'x')['job_id'])
+        assert done['status'] == 'failed'
+        assert done['status_code'] == 500
+        assert 'boom' in done['result']['error']
+        assert queue.stats()['failed'] == 1
+    finally:
+        queue.shutdown()
+
+def test_interactive_lane_runs_before_bulk():
+    """Queued interactive jobs are claimed ahead of older bulk jobs"""
+    order = []
+    gate = threading.Event()
+
+    def runner(input_type, content, model_type, mode):
+        gate.wait(5)
+        order.append(content)
+        return {"fraud_detected": False}, 200
+
+    queue = JobQueue(runner, workers=1, db_path=':memory:')
+    try:
+        first = queue.submit('text', 'first', lane='bulk')
+        while queue.get(first['job_id'])['status'] == 'queued':
+            time.sleep(0.01)
+        bulk = queue.submit('text', 'bulk', lane='bulk')
+        interactive = queue.submit('text', 'interactive')
+        assert queue.get(bulk['job_id'])['queue_position'] == 1
+        assert queue.get(interactive['job_id'])['queue_position'] == 0
+        assert queue.stats()['queued'] == {"interactive": 1, "bulk": 1}
+        gate.set()
+        wait_for(queue, bulk['job_id'])
+        assert order == ['first', 'interactive', 'bulk']
+    finally:
+        gate.set()
+        queue.shutdown()
+
+def test_full_queue_and_unknown_lane_are_rejected():
+    """Submissions beyond max_queued raise JobQueueFull and unknown lanes raise ValueError"""
+    queue = JobQueue(MagicMock(), workers=1, db_path=':memory:', max_queued=1)
+    with patch.object(queue, 'start'):
+        queue.submit('text', 'a')
+        with pytest.raises(JobQueueFull):
+            queue.submit('text', 'b')
+        with pytest.raises(ValueError):
+            queue.submit('text', 'c', lane='urgent')
+
+def test_store_is_opened_on_first_use(tmp_path):
+    """Creating the queue, as importing the app does, leaves no file behind until the queue is used"""
+    path = tmp_path / 'jobs.db'
+    queue = JobQueue(MagicMock(), workers=1, db_path=str(path))
+    assert not path.exists()
+    assert queue.stats()['running'] == 0
+    assert path.exists()
+
+def test_jobs_survive_restart(tmp_path):
+    """Queued jobs, and interrupted jobs once their lease runs out, are run by the next process even if it has the same pid"""
+    path = str(tmp_path / 'jobs.db')
+    old = JobQueue(MagicMock(), workers=1, db_path=path, lease=0.2)
+    with patch.object(old, 'start'):
+        queued = old.submit('text', 'queued')
+        interrupted = old.submit('text', 'interrupted')
+    claimed = old._claim()[0]  # Claimed but never finished, as if the process died mid-analysis
+
+    runner = MagicMock(return_value=({"fraud_detected": True}, 200))
+    new = JobQueue(runner, workers=1, db_path=path, lease=0.2)  # Same pid, as after a container restart
+    try:
+        with patch.object(new, 'start'):
+            new.resume()
+        assert new.get(claimed)['status'] == 'running'  # Still leased to the old process
+        time.sleep(0.3)
+        new.resume()
+        assert wait_for(new, queued['job_id'])['status'] == 'done'
+        assert wait_for(new, interrupted['job_id'])['status'] == 'done'
+        assert runner.call_count == 2
+    finally:
+        new.shutdown()
+
+def test_resume_leaves_jobs_of_live_processes():
+    """Running jobs owned by a live process sharing the store are not queued again"""
+    queue = JobQueue(MagicMock(), workers=1, db_path=':memory:')
+    with patch.object(queue, 'start'):
+        job = queue.submit('text', 'x')
+        queue._claim()
+        queue.resume()
+    assert queue.get(job['job_id'])['status'] == 'running'
+
+def test_live_jobs_keep_their_lease(tmp_path):
+    """A process renews the lease on jobs it is running, so other processes sharing the store leave them alone"""
+    path = str(tmp_path / 'jobs.db')
+    release = threading.Event()
+    busy = JobQueue(MagicMock(side_effect=lambda *args: release.wait(5) and ({}, 200)), workers=1, db_path=path, lease=0.3)
+    peer = JobQueue(MagicMock(), workers=1, db_path=path, lease=0.3)
+    try:
+        job = busy.submit('text', 'slow')
+        time.sleep(0.8)
+        with patch.object(peer, 'start'):
+            peer.resume()
+        assert peer.get(job['job_id'])['status'] == 'running'
+        release.set()
+        assert wait_for(busy, job['job_id'])['status'] == 'done'
+    finally:
+        release.set()
+        busy.shutdown()
+
+PUBLIC_HOST = [(2, 1, 6, '', ('93.184.216.34', 443))]
+
+def test_callback_receives_finished_job():
+    """The finished job is POSTed to callback_url, without following redirects, and its delivery is recorded"""
+    runner = MagicMock(return_value=({"fraud_detected": False}, 200))
+    queue = JobQueue(runner, workers=1, db_path=':memory:')
+    with patch('utils.job_queue.socket.getaddrinfo', return_value=PUBLIC_HOST), \
+         patch('utils.job_queue.requests.post', return_value=MagicMock(status_code=200)) as post:
+        try:
+            job = queue.submit('text', 'x', callback_url='https://client.example/hook')
+            wait_for(queue, job['job_id'])
+            deadline = time.time() + 5
+            while queue.get(job['job_id'])['callback_status'] == 'pending' and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            queue.shutdown()
+    assert queue.get(job['job_id'])['callback_status'] == 'delivered'
+    url, = post.call_args[0]
+    assert url == 'https://client.example/hook'
+    assert post.call_args[1]['json']['result'] == {"fraud_detected": False}
+    assert post.call_args[1]['allow_redirects'] is False
+
+def test_slow_callback_does_not_hold_up_jobs():
+    """Callbacks are delivered off the job workers, so the next job runs while a client is slow to answer"""
+    answer = threading.Event()
+    queue = JobQueue(MagicMock(return_value=({"fraud_detected": False}, 200)), workers=1, db_path=':memory:')
+    with patch('utils.job_queue.socket.getaddrinfo', return_value=PUBLIC_HOST), \
+         patch('utils.job_queue.requests.post', side_effect=lambda *args, **kwargs: answer.wait(5) and MagicMock(status_code=200)):
+        try:
+            first = queue.submit('text', 'a', callback_url='https://client.example/hook')
+            second = queue.submit('text', 'b')
+            assert wait_for(queue, second['job_id'], timeout=2)['status'] == 'done'
+            assert queue.get(first['job_id'])['callback_status'] == 'pending'
+        finally:
+            answer.set()
+            queue.shutdown()
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8080/hook", "http://localhost/hook", "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook", "http://[::1]/hook", "ftp://client.example/hook"
+])
+def test_callbacks_to_internal_hosts_are_rejected(url):
+    """Callback URLs that resolve to loopback, link-local or private addresses are refused at submission"""
+    queue = JobQueue(MagicMock(), workers=1, db_path=':memory:')
+    with patch.object(queue, 'start'), pytest.raises(ValueError):
+        queue.submit('text', 'x', callback_url=url)
+    assert queue.stats()['queued'] == {"interactive": 0, "bulk": 0}
+
+def test_jobs_endpoint_accepts_and_reports(client):
+    """POST /jobs answers 202 with a Location and GET /jobs/<id> returns the stored job"""
+    job = {"job_id": "abc", "priority": "bulk", "status": "queued", "queue_position": 0}
+    with patch('app.job_queue') as queue:
+        queue.submit.return_value = job
+        queue.get.side_effect = lambda job_id: job if job_id == 'abc' else None
+        response = client.post('/jobs', json={"input": ["text", "Great pharmacy"], "priority": "bulk", "mode": "score"})
+        assert response.status_code == 202
+        assert response.headers['Location'].endswith('/jobs/abc')
+        queue.submit.assert_called_once_with('text', 'Great pharmacy', None, 'score', 'bulk', None)
+        assert client.get('/jobs/abc').get_json() == job
+        assert client.get('/jobs/missing').status_code == 404
+
+def test_jobs_endpoint_validates_request(client):
+    """Bad priorities, modes and callback URLs are rejected before anything is queued"""
+    with patch('app.job_queue') as queue:
+        assert client.post('/jobs', json={}).status_code == 400
+        assert client.post('/jobs', json={"input": ["text", "x"], "priority": "urgent"}).status_code == 400
+        assert client.post('/jobs', json={"input": ["text", "x"], "mode": "fast"}).status_code == 400
+        assert client.post('/jobs', json={"input": ["text", "x"], "callback_url": "file:///etc/passwd"}).status_code == 400
+        assert client.post('/jobs', json={"input": ["text", "x"], "callback_url": "http://127.0.0.1/hook"}).status_code == 400
+        queue.submit.assert_not_called()
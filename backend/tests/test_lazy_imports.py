@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from typing import Optional
+from utils.lazy_import import LazyModule
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BACKEND_DIR, 'src')
+
+def loaded_after(code: str, cwd: str = SRC_DIR, pythonpath: Optional[str] = SRC_DIR) -> dict:
+    # Runs code in a fresh interpreter and reports which heavy modules it imported
+    probe = code + "\nimport json, sys\nprint(json.dumps({m: m in sys.modules for m in ('cv2', 'pytesseract', 'bs4', 'flask')}))"
+    env = dict(os.environ, JOB_QUEUE_PATH=':memory:', PERPLEXITY_API_KEY='test-key')
+    env.pop('PYTHONPATH', None)
+    if pythonpath:
+        env['PYTHONPATH'] = pythonpath
+    result = subprocess.run([sys.executable, '-c', probe], cwd=cwd, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_lazy_module_imports_on_first_use():
+    """A LazyModule imports nothing until an attribute is read"""
+    module = LazyModule('json')
+    assert not module.loaded
+    assert module.available
+    assert module.dumps([1]) == '[1]'
+    assert module.loaded
+    assert not LazyModule('no_such_module_here').available
+
+def test_sonar_client_skips_ocr_and_web_stack():
+    """Importing SonarClient loads neither Flask nor the OCR and HTML parsing libraries"""
+    assert loaded_after("import sonar_client") == {"cv2": False, "pytesseract": False, "bs4": False, "flask": False}
+
+def test_app_defers_ocr_and_parser_until_used():
+    """The app imports without cv2, tesseract and bs4; each is loaded by the first call that needs it"""
+    assert loaded_after("import app") == {"cv2": False, "pytesseract": False, "bs4": False, "flask": True}
+    assert loaded_after("import app\nfrom utils.html_extract import extract_content\nextract_content('<article>x</article>', 'bs4')")["bs4"]
+    assert loaded_after("import app\napp.image_processor.warm_up()")["cv2"]
+
+def test_package_exports_are_lazy():
+    """The backend package resolves its exports on first access"""
+    code = "import src\nassert 'sonar_client' not in sys.modules and 'src.sonar_client' not in sys.modules\nsrc.SonarClient"
+    assert loaded_after("import sys\n" + code, cwd=BACKEND_DIR)["flask"] is False
+    with pytest.raises(AttributeError):
+        import utils
+        utils.NotAThing
+
+def test_package_imports_without_src_on_path():
+    """From backend/ with no PYTHONPATH, the package exports import through their relative imports"""
+    code = "import sys\nfrom src import SonarClient, run_analysis\nassert 'utils' not in sys.modules and 'verdict_cache' not in sys.modules"
+    assert loaded_after(code, cwd=BACKEND_DIR, pythonpath=None)["cv2"] is False
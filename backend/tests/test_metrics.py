@@ -0,0 +1,67 @@
+import logging
+import pytest
+from unittest.mock import patch
+from utils import metrics as metrics_module
+from utils.metrics import Metrics, debug_sample, metrics
+
+def test_histogram_renders_cumulative_buckets():
+    """Observations land in the first bucket at or above them and render cumulatively"""
+    registry = Metrics(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        registry.observe('stage_seconds', value, stage='page_fetch')
+    text = registry.render()
+    assert 'aethon_stage_seconds_bucket{stage="page_fetch",le="0.1"} 2' in text
+    assert 'aethon_stage_seconds_bucket{stage="page_fetch",le="1"} 3' in text
+    assert 'aethon_stage_seconds_bucket{stage="page_fetch",le="+Inf"} 4' in text
+    assert 'aethon_stage_seconds_count{stage="page_fetch"} 4' in text
+    assert '# TYPE aethon_stage_seconds histogram' in text
+
+def test_timer_counts_failures():
+    """A stage that raises is still timed and is counted as an error"""
+    registry = Metrics()
+    with pytest.raises(ValueError):
+        with registry.timer('html_parse'):
+            raise ValueError("bad markup")
+    assert registry.count('stage_seconds', stage='html_parse') == 1
+    assert registry.value('errors_total', stage='html_parse') == 1
+    assert 'aethon_errors_total{stage="html_parse"} 1' in registry.render()
+
+def test_label_values_are_escaped():
+    """Quotes and backslashes in label values don't break the exposition format"""
+    registry = Metrics()
+    registry.inc('requests_total', endpoint='/a"b\\c')
+    assert 'endpoint="/a\\"b\\\\c"' in registry.render()
+
+def test_debug_sample_is_off_by_default(caplog):
+    """Payloads are only formatted and logged for sampled calls, and truncated"""
+    class Payload:
+        formatted = False
+
+        def __repr__(self):
+            Payload.formatted = True
+            return 'payload'
+
+    with patch.object(metrics_module, 'DEBUG_SAMPLE_RATE', 0):
+        debug_sample("Received data", Payload())
+    assert not Payload.formatted
+
+    with patch.object(metrics_module, 'DEBUG_SAMPLE_RATE', 1.0), caplog.at_level(logging.DEBUG, logger='aethon.debug'):
+        debug_sample("Received data", {"input": ["image", "A" * 10000]})
+    assert len(caplog.records) == 1
+    assert len(caplog.records[0].getMessage()) < 700
+
+@patch('app.sonar.analyse')
+def test_metrics_endpoint_reports_requests_and_stages(mock_sonar, client):
+    """/metrics exposes request counts and the stages a request went through"""
+    mock_sonar.return_value = {"fraud_detected": False, "reasoning": "Fine", "confidence": 0.9}
+    before = metrics.value('requests_total', endpoint='/analyse', status='200')
+    client.post('/analyse', json={"input": ["text", "A perfectly ordinary review of a kettle that boils water."]})
+    assert metrics.value('requests_total', endpoint='/analyse', status='200') == before + 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'aethon_requests_total{endpoint="/analyse",status="200"}' in text
+    assert 'aethon_stage_seconds_count{stage="review_index"}' in text
+    assert 'aethon_request_seconds_bucket{endpoint="/analyse",le="+Inf"}' in text
@@ -0,0 +1,47 @@
+import base64
+import time
+from concurrent.futures import TimeoutError
+from unittest.mock import patch
+import pytest
+from PIL import Image
+from utils.image_processing import ImageProcessor
+from utils.ocr_pool import OCRPool, OCRQueueFull
+
+def slow_job(image_bytes: bytes) -> str:
+    time.sleep(1)
+    return 'slow'
+
+def echo_job(image_bytes: bytes) -> str:
+    return f'{len(image_bytes)} bytes'
+
+def test_process_image_stays_in_memory(png_base64):
+    """OCR returns the processed image itself rather than a shared temp file path"""
+    with patch('utils.image_processing.pytesseract.image_to_string', return_value=' Amoxicillin 500mg ') as ocr:
+        processed, text = ImageProcessor().process_image(png_base64)
+    assert isinstance(processed, Image.Image)
+    assert text == 'Amoxicillin 500mg'
+    assert ocr.call_args[0][0] is processed
+
+@patch('utils.ocr_pool._ocr_job', echo_job)
+def test_pool_runs_jobs_with_in_memory_images():
+    """Jobs receive decoded image bytes and results come back through the future"""
+    pool = OCRPool(workers=2, queue_size=4, timeout=10)
+    try:
+        futures = [pool.submit(b'abc'), pool.submit('data:image/png;base64,' + base64.b64encode(b'abcdef').decode())]
+        assert [pool.result(f) for f in futures] == ['3 bytes', '6 bytes']
+    finally:
+        pool.shutdown()
+
+@patch('utils.ocr_pool._ocr_job', slow_job)
+def test_pool_is_bounded_and_times_out():
+    """A saturated pool rejects new jobs and waits are limited by the job timeout"""
+    pool = OCRPool(workers=1, queue_size=1, timeout=0.2)
+    try:
+        future = pool.submit(b'img')
+        with pytest.raises(OCRQueueFull):
+            pool.submit(b'img')
+        with pytest.raises(TimeoutError):
+            pool.result(future)
+        assert pool.stats() == {"submitted": 1, "rejected": 1, "timed_out": 1, "in_flight": 1}
+    finally:
+        pool.shutdown()
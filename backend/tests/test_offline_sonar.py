@@ -0,0 +1,44 @@
+import os
+import sys
+import pytest
+from sonar_client import SonarClient
+from verdict_cache import VerdictCache
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import fake_sonar
+import static_site
+from utils.web_scraper import WebScraper
+
+@pytest.fixture(scope='module')
+def fake_server():
+    server = fake_sonar.start(latency=0, token_delay=0)
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def client(fake_server, monkeypatch):
+    monkeypatch.setenv('SONAR_BASE_URL', fake_server.base_url)
+    return SonarClient(cache=VerdictCache(max_entries=0, ttl=1, db_path=None))
+
+def test_client_talks_to_the_fake_sonar(client):
+    """The benchmark stand-in speaks the chat completions protocol the client uses"""
+    genuine = client.analyse(text="Boils a litre in four minutes; the lid catch is stiff.", model_type='reviews')
+    assert genuine['fraud_detected'] is False and genuine['confidence'] > 0.8
+    fraud = client.analyse(text="BEST EVER!!! Life changing!!!", model_type='reviews')
+    assert fraud['fraud_detected'] is True and fraud['indicators']
+
+def test_fake_sonar_streams(client):
+    """Streamed answers and score-only calls work against the stand-in"""
+    chunks = list(client.analyse(text="A plain, specific review.", model_type='reviews', stream=True))
+    assert len(chunks) > 2 and chunks[-1]['confidence'] > 0.8
+    assert client.score("Another plain review.", 'reviews')['score_only'] is True
+
+def test_static_site_serves_fixture_pages():
+    """The fixture pages can be scraped locally, robots.txt included"""
+    site = static_site.start()
+    try:
+        _, text = WebScraper().fetch_page(site.url('reviews_small.html'))
+        assert text
+    finally:
+        site.shutdown()
@@ -0,0 +1,113 @@
+import base64
+import os
+import random
+from io import BytesIO
+from unittest.mock import patch
+from PIL import Image, ImageDraw
+from app import phash_index
+from utils.image_processing import ImageProcessor
+from utils.phash_index import PHashIndex, hamming
+
+FIXTURE_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'images')
+
+def encode(image: Image.Image, fmt: str = 'PNG') -> str:
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(256), count):
+        value ^= 1 << bit
+    return value
+
+def test_lookup_matches_brute_force():
+    """The multi-index lookup finds the same nearest hash as a linear scan"""
+    rng = random.Random(7)
+    index = PHashIndex(db_path=None)
+    hashes = [rng.getrandbits(256) for _ in range(2000)]
+    for i, value in enumerate(hashes):
+        index.add(value, {"fraud_detected": i % 2 == 0, "confidence": "0.9", "reasoning": str(i)})
+
+    for distance in (0, 5, 16, 31):
+        query = flip_bits(hashes[42], distance, rng)
+        match = index.lookup(query)
+        assert match['distance'] == min(hamming(query, h) for h in hashes) == distance
+        assert match['reasoning'] == '42'
+    assert index.lookup(flip_bits(hashes[42], 40, rng)) is None
+
+def test_index_persists_across_restarts(tmp_path):
+    """Stored verdicts are reloaded from SQLite"""
+    path = str(tmp_path / 'phash.db')
+    PHashIndex(db_path=path).add(12345, {"fraud_detected": True, "confidence": "0.95", "reasoning": "forged"})
+    match = PHashIndex(db_path=path).lookup(12345)
+    assert match == {"fraud_detected": True, "confidence": 0.95, "reasoning": "forged", "distance": 0}
+
+def test_oldest_hashes_are_evicted(tmp_path):
+    """Past max_entries the oldest hashes leave the index and the store; re-analysed images count as new"""
+    path = str(tmp_path / 'phash.db')
+    index = PHashIndex(db_path=path, max_entries=2)
+    for image_hash in (1 << 200, 1 << 100, 1 << 200, 1 << 10):
+        index.add(image_hash, {"fraud_detected": False})
+    assert index.stats()['entries'] == 2
+    assert index.lookup(1 << 100, max_distance=0) is None
+    assert index.lookup(1 << 200, max_distance=0) is not None
+    assert PHashIndex(db_path=path, max_entries=2).stats()['entries'] == 2
+
+def test_edited_rescan_stays_near():
+    """A recropped copy with a changed date is a near duplicate, a different prescription is not"""
+    original = Image.open(os.path.join(FIXTURE_IMAGES, 'prescription_clean.png')).convert('RGB')
+    width, height = original.size
+    edited = original.crop((20, 20, width - 20, height - 20))
+    draw = ImageDraw.Draw(edited)
+    draw.rectangle((300, 300, 700, 340), fill='white')
+    draw.text((300, 300), "Date: 21/09/2024", fill='black')
+    other = Image.new('RGB', original.size, 'white')
+    ImageDraw.Draw(other).multiline_text((60, 60), "Dr. B. Jones\nRx: Sertraline 50mg\n" * 6, fill='black')
+
+    hash_of = ImageProcessor.perceptual_hash
+    assert hamming(hash_of(original), hash_of(edited)) <= 20
+    assert hamming(hash_of(original), hash_of(other)) > 31
+
+def template_prescription(patient: str, drug: str) -> Image.Image:
+    # One doctor's printed template with a different patient and drug filled in
+    image = Image.new('RGB', (800, 600), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((30, 20, 770, 560), outline='black')
+    draw.text((40, 30), "Dr. A. Smith MD  -  123 High Street  -  Tel 0123 456", fill='black')
+    draw.line((40, 60, 760, 60), fill='black', width=2)
+    draw.text((40, 100), f"Patient: {patient}", fill='black')
+    draw.text((40, 140), f"Rx: {drug}", fill='black')
+    draw.text((40, 500), "Signature: ________", fill='black')
+    return image
+
+@patch('app.sonar.analyse')
+def test_known_fraud_resubmission_is_annotated(mock_sonar, client):
+    """A near-copy of an image already judged fraudulent is still analysed and carries the earlier verdict"""
+    mock_sonar.return_value = {"fraud_detected": True, "reasoning": "Forged signature", "confidence": "0.9"}
+    original = Image.open(os.path.join(FIXTURE_IMAGES, 'prescription_clean.png')).convert('RGB')
+
+    first = client.post('/analyse', json={"input": ["image", encode(original)]})
+    resubmitted = client.post('/analyse', json={"input": ["image", encode(original.resize((1000, 750)), 'JPEG')]})
+
+    assert first.status_code == resubmitted.status_code == 200
+    assert mock_sonar.call_count == 2
+    body = resubmitted.get_json()
+    assert body['near_duplicate']['fraud_detected'] is True
+    assert body['near_duplicate']['distance'] <= 20
+    assert phash_index.stats()['entries'] >= 1
+
+@patch('app.sonar.analyse')
+def test_same_template_different_content_is_not_short_circuited(mock_sonar, client):
+    """A genuine prescription on the template of a known forgery gets its own verdict from Sonar"""
+    forged = template_prescription("John Doe", "Oxycodone 80mg")
+    genuine = template_prescription("Mary Major", "Amoxicillin 500mg")
+    assert hamming(ImageProcessor.perceptual_hash(forged), ImageProcessor.perceptual_hash(genuine)) <= 20
+
+    mock_sonar.return_value = {"fraud_detected": True, "reasoning": "Forged", "confidence": "0.1"}
+    client.post('/analyse', json={"input": ["image", encode(forged)]})
+    mock_sonar.return_value = {"fraud_detected": False, "reasoning": "Consistent details", "confidence": "0.9"}
+    body = client.post('/analyse', json={"input": ["image", encode(genuine)]}).get_json()
+
+    assert mock_sonar.call_count == 2
+    assert body['fraud_detected'] is False
+    assert body['reasoning'] == "Consistent details"
@@ -0,0 +1,59 @@
+import os
+from unittest.mock import patch
+from app import prescreener
+from utils.html_extract import extract_content
+from utils.prescreen import PreScreener
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'pages')
+
+GENUINE = """I bought these headphones for my commute and they have held up well over six months of daily use.
+
+The noise cancelling is decent on the train although it struggles with wind noise when walking outside.
+
+Battery life is shorter than advertised, I get around twenty hours rather than thirty, still fine for me.
+
+Customer support were slow to answer an email about a replacement ear cushion but eventually sent one free."""
+
+def load_page(name: str) -> str:
+    with open(os.path.join(PAGES_DIR, name), encoding='utf-8') as f:
+        return extract_content(f.read())
+
+def test_astroturfed_page_is_answered_locally():
+    """A page of copy-pasted reviews is flagged without Sonar"""
+    verdict = PreScreener().screen(load_page('reviews_astroturfed.html'), 'reviews')
+    assert verdict['fraud_detected'] is True
+    assert verdict['prescreened'] is True
+    assert verdict['signals']['duplicate_ratio'] > 0.9
+    assert verdict['confidence'] < 0.2  # Sonar's scale: low means fraudulent
+
+def test_ambiguous_text_goes_to_sonar():
+    """Ordinary reviews and prescriptions are left for the model"""
+    screener = PreScreener()
+    assert screener.screen(GENUINE, 'reviews') is None
+    assert screener.screen("Amoxicillin " * 50, 'prescription') is None
+    assert screener.stats() == {"screened": 1, "answered_locally": 0, "avoided_fraction": 0.0}
+
+def test_keyword_stuffing_and_empty_text():
+    """Repetitive spam is flagged and text too short to judge gets a neutral local answer"""
+    screener = PreScreener()
+    assert screener.screen("amazing best product buy now " * 10, 'reviews')['fraud_detected'] is True
+    short = screener.screen("!!! Wow !!!", 'reviews')
+    assert short['fraud_detected'] is False and short['confidence'] == 0.5
+    assert screener.stats()['avoided_fraction'] == 1.0
+
+def test_threshold_is_configurable():
+    """A stricter threshold sends borderline pages to Sonar"""
+    text = load_page('reviews_small.html')
+    assert PreScreener(threshold=0.4).screen(text, 'reviews') is not None
+    assert PreScreener(threshold=0.9).screen(text, 'reviews') is None
+
+@patch('app.sonar.analyse')
+def test_analyse_skips_sonar_for_clear_cut_text(mock_sonar, client):
+    """/analyse answers obvious astroturfing locally and reports the avoided call"""
+    before = prescreener.stats()['answered_locally']
+    response = client.post('/analyse', json={"input": ["text", load_page('reviews_astroturfed.html')]})
+
+    assert response.status_code == 200
+    assert response.get_json()['prescreened'] is True
+    mock_sonar.assert_not_called()
+    assert client.get('/status').get_json()['prescreen']['answered_locally'] == before + 1
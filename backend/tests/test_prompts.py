@@ -0,0 +1,52 @@
+from prompts import PROMPTS, clean, get_prompt, prompt_version, token_counts
+from sonar_client import SonarClient
+
+def test_templates_have_no_indentation_or_repeated_lines():
+    """Cleaned prompts carry no leading whitespace and no instruction twice"""
+    for variants in PROMPTS.values():
+        for text in variants.values():
+            lines = [line for line in text.splitlines() if line]
+            assert all(line == line.strip() for line in lines)
+            assert len(lines) == len(set(lines))
+            assert '\n\n\n' not in text
+
+def test_clean_dedents_and_deduplicates():
+    """clean() strips indentation, repeated lines and blank runs"""
+    text = """
+        First rule.
+        Only output 200 characters of text.
+
+
+        Only output 200 characters of text.
+    """
+    assert clean(text) == "First rule.\nOnly output 200 characters of text."
+
+def test_every_variant_keeps_the_output_format():
+    """Both variants ask for the JSON verdict format the parser expects"""
+    for variants in PROMPTS.values():
+        for text in variants.values():
+            assert '"score"' in text
+            assert '"high confidence"' in text
+
+def test_compact_variant_is_smaller():
+    """The compact variant costs fewer input tokens than the full one"""
+    counts = token_counts()
+    for model_type in PROMPTS:
+        assert counts[prompt_version(model_type, 'compact')] < counts[prompt_version(model_type, 'full')]
+
+def test_versions_and_unknown_variants():
+    """Versions identify the template, and unknown variants fall back to the full prompt"""
+    assert prompt_version('reviews', 'full') == 'reviews/full/v3'
+    assert prompt_version('reviews', 'missing') == 'reviews/full/v3'
+    assert get_prompt('reviews', 'missing') == get_prompt('reviews', 'full')
+    assert get_prompt('unknown') is None
+
+def test_client_uses_the_selected_variant():
+    """The Sonar client sends the configured variant and keys its cache on it"""
+    client = SonarClient()
+    full_key = client._cache_key('some text', None, 'reviews')
+    client.prompt_variant = 'compact'
+    assert client._get_system_prompt('reviews') == get_prompt('reviews', 'compact')
+    assert client._build_messages('some text', None, 'reviews')[0]['content'] == get_prompt('reviews', 'compact')
+    assert client._cache_key('some text', None, 'reviews') != full_key
+    assert 'reviews/compact/v2' in client.stats()['prompts']
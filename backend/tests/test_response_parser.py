@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sonar_client import SonarClient
+from utils.response_parser import ResponseParseError, StreamingScoreParser, parse_verdict
+from verdict_cache import VerdictCache
+
+def completion(text: str) -> MagicMock:
+    response = MagicMock()
+    response.choices[0].message.content = text
+    return response
+
+def stream_chunk(text: str) -> MagicMock:
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = text
+    return chunk
+
+@pytest.fixture
+def client():
+    return SonarClient(cache=VerdictCache(max_entries=0, ttl=1, db_path=None))
+
+def test_parses_json_verdict():
+    """The structured answer gives a float score, the model's verdict and its indicators"""
+    result = parse_verdict('{"score": 0.15, "verdict": "fraudulent", "indicators": ["copied text"], "reasoning": "Identical wording."}')
+    assert result == {
+        "fraud_detected": True,
+        "reasoning": "Identical wording.",
+        "confidence": 0.15,
+        "verdict": "fraudulent",
+        "indicators": ["copied text"]
+    }
+    assert parse_verdict('{"score": "0.9", "verdict": "Genuine", "indicators": [], "reasoning": "Specific details."}')['fraud_detected'] is False
+
+def test_tolerates_wrapped_and_legacy_answers():
+    """Code fences, surrounding prose, the old "score;" form and out-of-range scores are all accepted"""
+    fenced = '```json\n{"score": 0.8, "verdict": "genuine", "indicators": [], "reasoning": "Fine"}\n```'
+    assert parse_verdict(fenced)['confidence'] == 0.8
+    legacy = parse_verdict("0.2; Suspicious repetition across reviews")
+    assert legacy['confidence'] == 0.2 and legacy['fraud_detected'] is True
+    assert legacy['reasoning'] == "Suspicious repetition across reviews"
+    assert parse_verdict("**0.95** - high confidence, genuine")['confidence'] == 0.95
+    assert parse_verdict('{"score": 1.7, "verdict": "genuine", "indicators": [], "reasoning": ""}')['confidence'] == 1.0
+    assert parse_verdict('{"score": 0.3, "verdict": "suspicious", "indicators": ["vag')['confidence'] == 0.3  # Truncated
+
+def test_forgot_is_not_forgery():
+    """Only forge, forged, forgery and similar count as a fraud keyword, not forgot or forget"""
+    assert parse_verdict("0.9; The reviewer forgot to mention the delivery time")['fraud_detected'] is False
+    assert parse_verdict("0.9; Easy to forget, but genuine")['fraud_detected'] is False
+    assert parse_verdict("0.2; Signature looks forged")['fraud_detected'] is True
+    assert parse_verdict("0.2; Signs of forgery in the header")['fraud_detected'] is True
+
+def test_rejects_answers_without_a_score():
+    """Prose without a score raises instead of crashing on a missing separator"""
+    with pytest.raises(ResponseParseError):
+        parse_verdict("I cannot assess this review.")
+
+def test_streaming_parser_finds_the_score_early():
+    """The score is reported on the delta that completes it, before the reasoning has arrived"""
+    parser = StreamingScoreParser()
+    deltas = ['{"sc', 'ore": 0.', '35', ', "verdict": "sus', 'picious"}']
+    scores = [parser.feed(delta) for delta in deltas]
+    assert scores == [None, None, None, 0.35, None]
+    legacy = StreamingScoreParser()
+    assert [legacy.feed(delta) for delta in ['0.', '7', ';', ' Looks fine']] == [None, None, 0.7, None]
+
+def test_unparseable_answer_is_repaired_once(client):
+    """A malformed answer gets one cheap reformatting call without the original input"""
+    create = MagicMock(side_effect=[
+        completion("The reviews look coordinated."),
+        completion('{"score": 0.2, "verdict": "fraudulent", "indicators": ["coordination"], "reasoning": "Coordinated."}')
+    ])
+    with patch.object(client.client.chat.completions, 'create', create):
+        result = client.analyse(text="Great product", model_type='reviews')
+    assert result['confidence'] == 0.2
+    assert create.call_count == 2
+    repair = create.call_args.kwargs['messages']
+    assert len(repair) == 2 and "The reviews look coordinated." in repair[1]['content']
+    assert client.stats()['repairs'] == 1
+
+def test_failed_repair_returns_an_error(client):
+    """A second bad answer is reported as an error rather than retried again"""
+    create = MagicMock(side_effect=[completion("No idea."), completion("Still no idea.")])
+    with patch.object(client.client.chat.completions, 'create', create):
+        result = client.analyse(text="Great product", model_type='reviews')
+    assert 'error' in result
+    assert create.call_count == 2
+
+def test_structured_output_is_requested(client):
+    """The JSON schema is sent as response_format unless structured output is turned off"""
+    create = MagicMock(return_value=completion('{"score": 0.9, "verdict": "genuine", "indicators": [], "reasoning": "Fine"}'))
+    with patch.object(client.client.chat.completions, 'create', create):
+        client.analyse(text="Great product", model_type='reviews')
+        assert create.call_args.kwargs['response_format']['type'] == 'json_schema'
+        client.structured_output = False
+        client.analyse(text="Another product", model_type='reviews')
+        assert 'response_format' not in create.call_args.kwargs
+
+def test_stream_partials_carry_the_score(client):
+    """The partial that completes the score carries it as a float"""
+    deltas = ['{"score": 0.4', '5, "verdict": "suspicious", ', '"indicators": [], "reasoning": "Vague."}']
+    with patch.object(client.client.chat.completions, 'create', MagicMock(return_value=iter(map(stream_chunk, deltas)))):
+        chunks = list(client.analyse(text="Great product", model_type='reviews', stream=True))
+    assert [chunk.get('score') for chunk in chunks[:-1]] == [None, 0.45, None]
+    assert chunks[-1]['confidence'] == 0.45 and chunks[-1]['verdict'] == 'suspicious'
@@ -0,0 +1,98 @@
+import os
+from unittest.mock import patch
+from utils.html_extract import extract_content
+from utils.minhash_lsh import ReviewIndex, compact_reviews
+from utils.text_chunking import split_reviews
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'pages')
+
+COPIED = "This is the best blender I have ever owned, it crushes ice in seconds and cleans up easily"
+REVIEWS = [
+    COPIED,
+    "Stopped working after two weeks and the seller never replied to my emails about a refund",
+    COPIED.replace("seconds", "moments") + "!!!",
+    "Decent for smoothies but far too loud to use early in the morning without waking everyone",
+    COPIED.upper(),
+]
+
+def test_near_duplicates_cluster_within_page():
+    """Edited copies of the same review land in one cluster"""
+    clusters = ReviewIndex().find_duplicates(REVIEWS)
+    assert len(clusters) == 1
+    assert clusters[0]['size'] == 3
+    assert sorted(clusters[0]['reviews']) == [0, 2, 4]
+    assert clusters[0]['other_pages'] == 0
+
+def test_duplicates_across_pages(tmp_path):
+    """A review copied from a page seen earlier, even before a restart, is reported with its source"""
+    path = str(tmp_path / 'reviews.db')
+    ReviewIndex(db_path=path).find_duplicates(REVIEWS[:2], source='https://shop.example/a')
+
+    index = ReviewIndex(db_path=path)
+    clusters = index.find_duplicates([REVIEWS[2], REVIEWS[3]], source='https://shop.example/b')
+    assert clusters == [{
+        "size": 1, "reviews": [0], "sample": REVIEWS[2], "seen_on": ['https://shop.example/a'], "other_pages": 1
+    }]
+    # Re-scraping the same page doesn't match its own earlier copy
+    assert index.find_duplicates([REVIEWS[3]], source='https://shop.example/b') == []
+
+def test_compact_reviews_keeps_one_copy():
+    """The prompt gets the duplicate evidence and a single copy of each cluster"""
+    reviews = split_reviews(extract_content(open(os.path.join(PAGES_DIR, 'reviews_astroturfed.html'), encoding='utf-8').read()))
+    clusters = ReviewIndex().find_duplicates(reviews)
+    compact = compact_reviews(reviews, clusters)
+
+    assert compact.startswith("Duplicate review evidence found before analysis:")
+    assert f"{clusters[0]['size']}x near-identical" in compact
+    assert len(compact) < len('\n'.join(reviews))
+
+def test_compact_reviews_is_stable_as_pages_are_indexed():
+    """The prompt text, and so the verdict cache key, doesn't change as more pages carry the same review"""
+    index = ReviewIndex()
+    index.find_duplicates([COPIED], source='https://shop.example/a')
+    first = compact_reviews(REVIEWS, index.find_duplicates(REVIEWS, source='https://shop.example/page'))
+    index.find_duplicates([COPIED], source='https://shop.example/b')
+    clusters = index.find_duplicates(REVIEWS, source='https://shop.example/page')
+    assert clusters[0]['other_pages'] == 2
+    assert "also posted on other pages" in first
+    assert compact_reviews(REVIEWS, clusters) == first
+
+@patch('app.sonar.analyse')
+def test_analyse_attaches_clusters_and_sends_evidence(mock_sonar, client):
+    """/analyse reports duplicate clusters and sends the compacted text to Sonar"""
+    mock_sonar.return_value = {"fraud_detected": True, "reasoning": "Copied reviews", "confidence": "0.2"}
+    response = client.post('/analyse', json={"input": ["text", '\n\n'.join(REVIEWS)]})
+
+    body = response.get_json()
+    assert body['duplicate_reviews'][0]['size'] == 3
+    sent = mock_sonar.call_args.kwargs['text']
+    assert sent.startswith("Duplicate review evidence")
+    assert sent.count("crushes ice") == 2  # The evidence sample plus the one copy kept in the reviews
+
+def test_short_lines_are_not_indexed():
+    """Ratings and other lines under REVIEW_MIN_WORDS neither cluster nor get stored"""
+    index = ReviewIndex()
+    assert index.find_duplicates(['5/5', '5/5', 'Helpful (3)', 'Helpful (3)'], source='https://shop.example/a') == []
+    assert index.stats()['stored_reviews'] == 0
+
+def test_identical_pages_are_stored_once():
+    """The same page under another URL adds no rows, and both URLs are reported to later pages"""
+    index = ReviewIndex()
+    index.find_duplicates(REVIEWS, source='https://shop.example/a')
+    stored = index.stats()['stored_reviews']
+    clusters = index.find_duplicates(REVIEWS, source='https://shop.example/a?ref=mail')
+    assert index.stats()['stored_reviews'] == stored
+    assert clusters[0]['seen_on'] == ['https://shop.example/a']
+
+    clusters = index.find_duplicates([COPIED], source='https://shop.example/c')
+    assert clusters[0]['seen_on'] == ['https://shop.example/a', 'https://shop.example/a?ref=mail']
+
+def test_index_is_bounded():
+    """Lookups read at most bucket_cap reviews per bucket and the oldest pages are pruned past max_reviews"""
+    index = ReviewIndex(bucket_cap=2, max_reviews=4)
+    for n in range(5):
+        index.find_duplicates([COPIED, f"{REVIEWS[1]} order number {n}"], source=f'https://shop.example/{n}')
+    clusters = index.find_duplicates([COPIED], source='https://shop.example/new')
+    assert clusters[0]['other_pages'] <= 2
+    assert index.stats()['stored_reviews'] <= 4
+    assert index._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0] <= 3
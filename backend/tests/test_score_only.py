@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from sonar_client import SCORE_MAX_TOKENS, SonarClient
+from verdict_cache import VerdictCache
+
+DELTAS = ['{"score"', ': 0.15', ', "verdict": "fraudulent"', ', "indicators": []', ', "reasoning": "Copied."}']
+
+def stream_chunk(text: str) -> MagicMock:
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = text
+    return chunk
+
+class FakeStream:
+    # Counts the chunks read before the caller closed it
+    def __init__(self, deltas):
+        self.chunks = [stream_chunk(delta) for delta in deltas]
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+class FakeAsyncStream(FakeStream):
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def sonar():
+    return SonarClient(cache=VerdictCache(max_entries=16, ttl=60, db_path=None))
+
+def test_score_closes_the_stream_once_the_score_arrives(sonar):
+    """Only the chunks up to the score are read, with a small completion budget"""
+    stream = FakeStream(DELTAS)
+    create = MagicMock(return_value=stream)
+    with patch.object(sonar.client.chat.completions, 'create', create):
+        result = sonar.score("Great product", 'reviews')
+    assert result == {"fraud_detected": True, "confidence": 0.15, "score_only": True}
+    assert stream.read == 3 and stream.closed
+    assert create.call_args.kwargs['max_tokens'] == SCORE_MAX_TOKENS
+    assert create.call_args.kwargs['stream'] is True
+
+def test_async_score_closes_the_stream(sonar):
+    """The async path stops reading at the score too"""
+    stream = FakeAsyncStream(['0.9', '; Looks', ' genuine'])
+
+    async def create(**kwargs):
+        return stream
+
+    with patch.object(sonar.async_client.chat.completions, 'create', create):
+        result = asyncio.run(sonar.ascore("Great product", 'reviews'))
+    assert result['confidence'] == 0.9 and result['fraud_detected'] is False
+    assert stream.read == 2 and stream.closed
+
+def test_score_reuses_a_cached_full_verdict(sonar):
+    """A cached full verdict answers a score-only request without a call"""
+    verdict = {"fraud_detected": False, "reasoning": "Specific details.", "confidence": 0.9}
+    sonar.cache.set(sonar._cache_key("Great product", None, 'reviews'), verdict)
+    with patch.object(sonar.client.chat.completions, 'create') as create:
+        assert sonar.score("Great product", 'reviews') == verdict
+    create.assert_not_called()
+
+def test_score_without_a_score_is_an_error(sonar):
+    """A truncated answer with no score is reported rather than repaired"""
+    with patch.object(sonar.client.chat.completions, 'create', MagicMock(return_value=FakeStream(['I cannot', ' assess this']))):
+        assert 'error' in sonar.score("Great product", 'reviews')
+
+@patch('app.sonar.analyse')
+@patch('app.sonar.score')
+def test_batch_score_mode(mock_score, mock_analyse, client):
+    """Batches in score mode use the early-exit call and mark their results"""
+    mock_score.return_value = {"fraud_detected": True, "confidence": 0.2, "score_only": True}
+    response = client.post('/analyse/batch', json={"mode": "score", "inputs": [["text", "a suspicious review here"]]})
+    assert response.status_code == 200
+    result = response.get_json()['results'][0]
+    assert result['score_only'] is True and result['confidence'] == 0.2
+    mock_analyse.assert_not_called()
+
+    assert client.post('/analyse', json={"mode": "brief", "input": ["text", "hello there"]}).status_code == 400
@@ -0,0 +1,150 @@
+from unittest.mock import MagicMock, patch
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+from sonar_client import SonarClient
+from utils.job_queue import JobQueue
+from utils.minhash_lsh import ReviewIndex
+from utils.page_cache import PageCache
+from utils.phash_index import PHashIndex
+from verdict_cache import VerdictCache
+
+def test_status_reports_upstream_and_queue_depth(client):
+    """/status is ready while Sonar is healthy and reports how much work is waiting"""
+    body = client.get('/status')
+    assert body.status_code == 200
+    data = body.get_json()
+    assert data['status'] == 'ok'
+    assert data['upstream']['sonar']['healthy'] is True
+    assert set(data['queue_depth']) == {"jobs_queued", "jobs_running", "ocr_in_flight", "analyses_in_flight"}
+
+def test_status_fails_when_sonar_is_down_or_draining(client):
+    """Readiness turns 503 when Sonar is unhealthy and while the worker drains"""
+    import app
+    with patch.object(app.sonar, 'health', return_value={"healthy": False, "reachable": False, "consecutive_failures": 0}):
+        response = client.get('/status')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'unavailable'
+
+    app.draining.set()
+    try:
+        response = client.get('/status')
+    finally:
+        app.draining.clear()
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'draining'
+
+def sonar_error(status: int) -> Exception:
+    request = httpx.Request('POST', 'https://api.perplexity.ai/chat/completions')
+    if status == 0:
+        return APIConnectionError(request=request)
+    return APIStatusError('error', response=httpx.Response(status, request=request), body=None)
+
+def test_sonar_health_tracks_failed_calls():
+    """Consecutive upstream failures mark Sonar unhealthy until a call succeeds"""
+    sonar = SonarClient(cache=VerdictCache(db_path=None))
+    sonar.max_retries = 0
+    with patch('sonar_client.SONAR_HEALTH_INTERVAL', 0), \
+         patch.object(sonar.client.chat.completions, 'create', side_effect=[sonar_error(502), sonar_error(0), sonar_error(503)]):
+        for _ in range(3):
+            with pytest.raises(Exception):
+                sonar._create([{"role": "user", "content": "x"}])
+        assert sonar.health() == {"healthy": False, "reachable": True, "consecutive_failures": 3}
+    with patch('sonar_client.SONAR_HEALTH_INTERVAL', 0), \
+         patch.object(sonar.client.chat.completions, 'create', return_value=MagicMock()):
+        sonar._create([{"role": "user", "content": "x"}])
+        assert sonar.health()["healthy"] is True
+
+def test_bad_requests_leave_worker_ready(client):
+    """4xx answers caused by the input don't count, and a good probe brings an unhealthy worker back"""
+    import app
+    app.sonar.consecutive_failures = 0
+    try:
+        with patch('sonar_client.SONAR_HEALTH_INTERVAL', 0), \
+             patch.object(app.sonar.client.chat.completions, 'create', side_effect=sonar_error(400)):
+            for _ in range(5):
+                with pytest.raises(APIStatusError):
+                    app.sonar._create([{"role": "user", "content": "x"}])
+            assert client.get('/status').status_code == 200
+
+        app.sonar.consecutive_failures = 5
+        with patch('sonar_client.SONAR_HEALTH_INTERVAL', 30), patch.object(app.sonar, '_last_probe', None), \
+             patch.object(app.sonar._http, 'head', return_value=MagicMock()):
+            assert client.get('/status').status_code == 200
+        assert app.sonar.consecutive_failures == 0
+    finally:
+        app.sonar.consecutive_failures = 0
+
+def test_sonar_probe_is_rate_limited():
+    """The reachability probe runs at most once per interval and uses the shared connection pool"""
+    sonar = SonarClient(cache=VerdictCache(db_path=None))
+    with patch('sonar_client.SONAR_HEALTH_INTERVAL', 30), \
+         patch.object(sonar._http, 'head', side_effect=httpx.ConnectError('refused')) as head:
+        assert sonar.health()["reachable"] is False
+        assert sonar.health()["healthy"] is False
+    assert head.call_count == 1
+
+def test_stores_reopen_connections(tmp_path):
+    """Reopened stores get a new SQLite connection to the same file; in-memory stores get a fresh database"""
+    cache = VerdictCache(db_path=str(tmp_path / 'verdicts.db'))
+    cache.set('key', {"fraud_detected": False})
+    before = cache._db
+    cache.reopen()
+    assert cache._db is not before
+    cache._memory.clear()
+    assert cache.get('key') == {"fraud_detected": False}
+
+    queue = JobQueue(MagicMock(), db_path=':memory:')
+    before = queue._db
+    queue.reopen()
+    assert queue._db is not before
+    with patch.object(queue, 'start'):
+        assert queue.submit('text', 'x')['status'] == 'queued'  # Schema was created on the new connection
+
+    for store in (PageCache(db_path=':memory:'), ReviewIndex(db_path=':memory:'), PHashIndex(db_path=':memory:')):
+        before = store._db
+        store.reopen()
+        assert store._db is not before
+        assert store.stats() is not None
+
+def test_drain_stops_background_work():
+    """drain() marks the process as draining and waits for job and OCR workers"""
+    import app
+    with patch.object(app, 'job_queue') as queue, patch.object(app, 'ocr_pool') as pool:
+        try:
+            app.drain(timeout=5)
+            assert app.draining.is_set()
+        finally:
+            app.draining.clear()
+    queue.shutdown.assert_called_once_with(wait=True, timeout=5)
+    pool.shutdown.assert_called_once_with(wait=True)
+
+def test_server_options():
+    """serve.py preloads the app into threaded workers and sets up per-worker state after the fork"""
+    pytest.importorskip('gunicorn')
+    import serve
+    options = serve.options('127.0.0.1:9000', 3, 8)
+    assert options['preload_app'] is True
+    assert options['worker_class'] == 'gthread'
+    assert (options['workers'], options['threads']) == (3, 8)
+    with patch('app.start_workers') as start_workers:
+        serve.post_fork(MagicMock(), MagicMock())
+    start_workers.assert_called_once()
+
+def test_sigterm_drains_within_graceful_timeout():
+    """Jobs and OCR drain from SIGTERM with the graceful timeout less the exit margin, not after it"""
+    pytest.importorskip('gunicorn')
+    import app
+    import serve
+    worker = MagicMock()
+    worker.cfg.graceful_timeout = 30
+    try:
+        with patch('serve.signal.signal') as install, patch('app.drain') as drain:
+            serve.post_worker_init(worker)
+            install.call_args[0][1](15, None)
+            serve.worker_exit(MagicMock(), worker)
+        drain.assert_called_once_with(timeout=30 - serve.SERVE_EXIT_MARGIN)
+        worker.handle_exit.assert_called_once()
+    finally:
+        serve._drainer = None
+        app.draining.clear()
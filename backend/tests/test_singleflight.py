@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from app import coalesce_key, in_flight
+from utils.singleflight import AsyncSingleFlight, SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Callers arriving while a key is in flight get the leader's result"""
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        leader = executor.submit(flight.do, 'key', work, 21)
+        started.wait()
+        followers = [executor.submit(flight.do, 'key', work, 21) for _ in range(4)]
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == [42] * 5
+    assert calls == [21]
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+    assert flight.do('key', work, 1) == 2  # Finished keys run again
+
+def test_errors_are_shared_and_not_remembered():
+    """A failure reaches every waiting caller, and the next call retries"""
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, 'key', fail)
+        started.wait()
+        follower = executor.submit(flight.do, 'key', fail)
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+def test_async_flight_survives_a_cancelled_caller():
+    """A disconnecting caller doesn't cancel the shared work for the others"""
+    async def scenario():
+        flight = AsyncSingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return 'verdict'
+
+        first = asyncio.ensure_future(flight.do('key', work))
+        second = asyncio.ensure_future(flight.do('key', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, runs, flight.stats()
+
+    result, runs, stats = asyncio.run(scenario())
+    assert result == 'verdict'
+    assert runs == [1]
+    assert stats == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+def test_coalesce_key_normalizes_input():
+    """Equivalent inputs share a key while different model types don't"""
+    assert coalesce_key('url', 'HTTPS://Shop.Example/item?id=1#reviews', None) == coalesce_key('url', 'https://shop.example/item?id=1', None)
+    assert coalesce_key('text', 'Great   product\n', 'reviews') == coalesce_key('text', 'Great product', 'reviews')
+    assert coalesce_key('text', 'Great product', 'reviews') != coalesce_key('text', 'Great product', 'prescription')
+
+@patch('app.web_scraper.fetch_page')
+@patch('app.sonar.analyse')
+def test_identical_batch_items_scrape_and_analyse_once(mock_sonar, mock_fetch, client):
+    """A burst of requests for the same URL makes one scrape and one Sonar call"""
+    def slow_fetch(url):
+        time.sleep(0.2)
+        return None, "Stopped working after two weeks and the seller never replied"
+    mock_fetch.side_effect = slow_fetch
+    mock_sonar.return_value = {"fraud_detected": False, "reasoning": "Plausible", "confidence": "0.8"}
+    before = in_flight.stats()['coalesced']
+
+    response = client.post('/analyse/batch', json={"inputs": [["url", "https://shop.example/item"]] * 4})
+
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [200] * 4
+    assert mock_fetch.call_count == 1
+    assert mock_sonar.call_count == 1
+    assert client.get('/status').get_json()['coalescing']['coalesced'] == before + 3
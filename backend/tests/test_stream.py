@@ -0,0 +1,52 @@
+import json
+import pytest
+from unittest.mock import patch
+from app import app, sonar
+from verdict_cache import VerdictCache
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    sonar.cache = VerdictCache(max_entries=10, ttl=60, db_path=None)
+    with app.test_client() as client:
+        yield client
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def fake_stream(messages, model_type):
+    yield {"partial": "0.2;"}
+    yield {"partial": " Repeated wording"}
+    yield {"fraud_detected": True, "reasoning": " Repeated wording", "confidence": 0.2}
+
+@patch('app.sonar._handle_stream', side_effect=fake_stream)
+def test_stream_forwards_partials_then_verdict(mock_stream, client):
+    """Streaming mode sends partial tokens as SSE events and the verdict last"""
+    response = client.post('/analyse', json={"input": ["text", "Best product ever!"], "stream": True})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    assert [e[0] for e in events] == ['partial', 'partial', 'verdict']
+    assert events[-1][1]['fraud_detected'] is True
+
+@patch('app.sonar._handle_stream', side_effect=fake_stream)
+def test_stream_verdict_is_cached(mock_stream, client):
+    """A completed stream populates the verdict cache for later requests"""
+    client.post('/analyse', json={"input": ["text", "Best product ever!"], "stream": True}).get_data()
+    response = client.post('/analyse', json={"input": ["text", "Best product ever!"]},
+                           headers={'Accept': 'text/event-stream'})
+
+    events = parse_events(response.get_data(as_text=True))
+    assert [e[0] for e in events] == ['verdict']
+    assert mock_stream.call_count == 1
+
+def test_stream_reports_preprocessing_errors_as_json(client):
+    """Invalid inputs fail before the stream opens"""
+    response = client.post('/analyse', json={"input": ["bogus", "data"], "stream": True})
+    assert response.status_code == 400
+    assert "invalid" in response.get_json()['error'].lower()
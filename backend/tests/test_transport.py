@@ -0,0 +1,79 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from unittest.mock import MagicMock, patch
+from sonar_client import SonarClient
+from utils.rate_limiter import RateLimiter, TokenBucket
+from verdict_cache import VerdictCache
+
+def status_error(status: int, headers: dict = None) -> openai.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request('POST', 'https://api.perplexity.ai/chat/completions'))
+    error_class = {429: openai.RateLimitError, 400: openai.BadRequestError}.get(status, openai.InternalServerError)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+def completion(text: str) -> MagicMock:
+    response = MagicMock()
+    response.choices[0].message.content = text
+    return response
+
+@pytest.fixture
+def client():
+    return SonarClient(cache=VerdictCache(max_entries=0, ttl=1, db_path=None))
+
+def test_token_bucket_spreads_a_burst():
+    """Reservations beyond the burst capacity wait in arrival order at the refill rate"""
+    bucket = TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(5)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
+    assert TokenBucket(rate=0, capacity=1).reserve(1000) == 0.0  # Disabled
+
+def test_rate_limiter_budgets_tokens():
+    """Large prompts wait on the tokens-per-minute budget"""
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=6000)  # 100 tokens a second
+    with patch('utils.rate_limiter.time.sleep') as sleep:
+        limiter.acquire(100)
+        limiter.acquire(300)
+    assert sleep.call_args.args[0] == pytest.approx(3.0, abs=0.05)
+    assert limiter.stats()['throttled'] == 1
+
+@patch('sonar_client.time.sleep')
+def test_retry_honours_retry_after(sleep, client):
+    """429s are retried after the server's Retry-After and the call succeeds"""
+    create = MagicMock(side_effect=[status_error(429, {'retry-after': '2'}), status_error(503), completion("0.9;Looks genuine")])
+    with patch.object(client.client.chat.completions, 'create', create):
+        result = client.analyse(text="Great product", model_type='reviews')
+
+    assert result['reasoning'] == "Looks genuine"
+    assert create.call_count == 3
+    first, second = (call.args[0] for call in sleep.call_args_list)
+    assert 2.0 <= first <= 2.0 + client.backoff
+    assert 0 <= second <= client.backoff * 2
+    assert client.stats()['retries'] == 2
+    assert create.call_args.kwargs['timeout'] == client.timeout
+
+@patch('sonar_client.time.sleep')
+def test_client_errors_and_long_retry_after_are_not_retried(sleep, client):
+    """Bad requests and Retry-After beyond the backoff cap fail straight away"""
+    for error in (status_error(400), status_error(429, {'retry-after': '3600'})):
+        with patch.object(client.client.chat.completions, 'create', MagicMock(side_effect=error)) as create:
+            assert 'error' in client.analyse(text="Great product", model_type='reviews')
+        assert create.call_count == 1
+    sleep.assert_not_called()
+
+def test_async_retry_on_connection_error(client):
+    """The async path retries dropped connections with backoff"""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise openai.APIConnectionError(request=httpx.Request('POST', 'https://api.perplexity.ai'))
+        return completion("0.2;Copied reviews")
+
+    client.backoff = 0.01
+    with patch.object(client.async_client.chat.completions, 'create', create):
+        result = asyncio.run(client.aanalyse(text="Great product", model_type='reviews'))
+    assert result['reasoning'] == "Copied reviews"
+    assert len(calls) == 2
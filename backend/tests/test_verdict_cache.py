@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock, patch
+from verdict_cache import VerdictCache
+from sonar_client import SonarClient
+
+VERDICT = {"fraud_detected": True, "reasoning": "Copy-paste reviews", "confidence": "0.2"}
+
+def test_lru_eviction():
+    """Least recently used entries are evicted once the memory tier is full"""
+    cache = VerdictCache(max_entries=2, ttl=60, db_path=None)
+    cache.set('a', VERDICT)
+    cache.set('b', VERDICT)
+    cache.get('a')
+    cache.set('c', VERDICT)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == VERDICT
+    assert cache.get('c') == VERDICT
+
+def test_ttl_expiry():
+    """Entries are not served after their TTL"""
+    cache = VerdictCache(max_entries=10, ttl=60, db_path=None)
+    with patch('verdict_cache.time.time', return_value=1000.0):
+        cache.set('a', VERDICT)
+    with patch('verdict_cache.time.time', return_value=1061.0):
+        assert cache.get('a') is None
+    assert cache.stats()['misses'] == 1
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    """The SQLite tier serves verdicts to a fresh process-level cache"""
+    db_path = str(tmp_path / 'verdicts.db')
+    VerdictCache(max_entries=10, ttl=60, db_path=db_path).set('a', VERDICT)
+
+    cache = VerdictCache(max_entries=10, ttl=60, db_path=db_path)
+    assert cache.get('a') == VERDICT
+    assert cache.stats()['disk_hits'] == 1
+
+def test_disk_hit_keeps_its_expiry(tmp_path):
+    """A verdict promoted from disk into memory still expires when it was first due to"""
+    db_path = str(tmp_path / 'verdicts.db')
+    with patch('verdict_cache.time.time', return_value=1000.0):
+        VerdictCache(max_entries=10, ttl=60, db_path=db_path).set('a', VERDICT)
+
+    cache = VerdictCache(max_entries=10, ttl=60, db_path=db_path)
+    with patch('verdict_cache.time.time', return_value=1050.0):
+        assert cache.get('a') == VERDICT
+    with patch('verdict_cache.time.time', return_value=1061.0):
+        assert cache.get('a') is None
+
+def test_key_depends_on_prompt_and_model():
+    """Changing the model or system prompt invalidates cached verdicts"""
+    key = VerdictCache.make_key(b'text', 'reviews', 'sonar-pro', 'prompt')
+    assert key != VerdictCache.make_key(b'text', 'reviews', 'sonar', 'prompt')
+    assert key != VerdictCache.make_key(b'text', 'reviews', 'sonar-pro', 'prompt v2')
+    assert key != VerdictCache.make_key(b'text', 'prescription', 'sonar-pro', 'prompt')
+
+def test_repeat_submission_skips_api():
+    """A repeated analysis is answered from the cache without a second API call"""
+    client = SonarClient(cache=VerdictCache(max_entries=10, ttl=60, db_path=None))
+    client._handle_non_stream = MagicMock(return_value=VERDICT)
+
+    first = client.analyse(text="Great   product!\n", model_type="reviews")
+    second = client.analyse(text="Great product!", model_type="reviews")
+
+    assert first == second == VERDICT
+    assert client._handle_non_stream.call_count == 1
+    assert client.cache.stats()['hits'] == 1
+
+def test_image_key_ignores_data_url_prefix():
+    """The same image bytes hit the cache whether or not they arrive as a data URL"""
+    client = SonarClient(cache=VerdictCache(max_entries=10, ttl=60, db_path=None))
+    raw = 'aGVsbG8='
+    assert client._cache_key(None, raw, 'prescription') == \
+        client._cache_key(None, 'data:image/png;base64,' + raw, 'prescription')
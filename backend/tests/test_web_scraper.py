@@ -0,0 +1,174 @@
+import asyncio
+import httpx
+import requests
+from utils.page_cache import PageCache
+from utils.page_reader import PageReader
+from unittest.mock import MagicMock, patch
+from utils.web_scraper import WebScraper
+
+def robots_response(status: int, text: str = '', headers: dict = None) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status
+    response.text = text
+    response.headers = headers or {}
+    return response
+
+def test_robots_fetched_once_per_origin():
+    """robots.txt is read from the origin root once and reused for later pages"""
+    scraper = WebScraper()
+    scraper.session.get = MagicMock(return_value=robots_response(200, "User-agent: *\nDisallow: /private"))
+
+    assert scraper._can_fetch("https://shop.example/product/1/reviews")
+    assert scraper._can_fetch("https://shop.example/product/2/reviews")
+    assert not scraper._can_fetch("https://shop.example/private/page")
+
+    scraper.session.get.assert_called_once()
+    assert scraper.session.get.call_args[0][0] == "https://shop.example/robots.txt"
+
+def test_robots_failures_are_cached():
+    """Missing robots.txt allows fetching; server errors and timeouts disallow it; none is re-requested"""
+    scraper = WebScraper()
+    scraper.session.get = MagicMock(side_effect=[robots_response(404), robots_response(503), requests.exceptions.Timeout()])
+
+    assert scraper._can_fetch("https://a.example/page")
+    assert scraper._can_fetch("https://a.example/other")
+    assert not scraper._can_fetch("https://b.example/page")
+    assert not scraper._can_fetch("https://b.example/other")
+    assert not scraper._can_fetch("https://c.example/page")
+    assert not scraper._can_fetch("https://c.example/other")
+    assert scraper.session.get.call_count == 3
+
+def test_robots_errors_are_retried_sooner():
+    """A disallow caused by a server error only lasts ROBOTS_ERROR_TTL"""
+    scraper = WebScraper(robots_ttl=3600)
+    scraper.session.get = MagicMock(side_effect=[robots_response(500), robots_response(200, "")])
+
+    with patch('utils.web_scraper.time.time', return_value=1000.0):
+        assert not scraper._can_fetch("https://shop.example/a")
+    with patch('utils.web_scraper.time.time', return_value=1000.0 + 5 * 60 + 1):
+        assert scraper._can_fetch("https://shop.example/a")
+    assert scraper.session.get.call_count == 2
+
+def test_robots_ttl_honours_cache_headers():
+    """Cache-Control max-age overrides the default TTL"""
+    scraper = WebScraper(robots_ttl=3600)
+    scraper.session.get = MagicMock(return_value=robots_response(200, "", {'Cache-Control': 'max-age=60'}))
+
+    with patch('utils.web_scraper.time.time', return_value=1000.0):
+        scraper._can_fetch("https://shop.example/a")
+    with patch('utils.web_scraper.time.time', return_value=1059.0):
+        scraper._can_fetch("https://shop.example/b")
+    assert scraper.session.get.call_count == 1
+    with patch('utils.web_scraper.time.time', return_value=1061.0):
+        scraper._can_fetch("https://shop.example/c")
+    assert scraper.session.get.call_count == 2
+
+def page_response(status: int, text: str = '', headers: dict = None, chunk_size: int = 16) -> MagicMock:
+    response = robots_response(status, text, headers)
+    response.encoding = 'utf-8'
+    body = text.encode('utf-8')
+    response.iter_content = MagicMock(return_value=iter([body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]))
+    return response
+
+def test_unchanged_page_is_revalidated_not_refetched():
+    """A 304 reuses the stored body and parsed content"""
+    scraper = WebScraper()
+    scraper._can_fetch = MagicMock(return_value=True)
+    html = "<html><body><article>Great value, fast delivery</article></body></html>"
+    scraper.session.get = MagicMock(side_effect=[
+        page_response(200, html, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}),
+        page_response(304)
+    ])
+
+    first = scraper.fetch_page("https://shop.example/reviews", keep_raw=True)
+    second = scraper.fetch_page("https://shop.example/reviews", keep_raw=True)
+
+    assert first == second == (html, "Great value, fast delivery")
+    conditional = scraper.session.get.call_args_list[1][1]['headers']
+    assert conditional['If-None-Match'] == '"v1"'
+    assert conditional['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert scraper.page_cache.stats() == {"not_modified": 1, "full_fetches": 1, "pages": 1}
+
+def test_not_modified_page_keeps_raw_html_only_when_asked():
+    """A 304 answers keep_raw=False callers without the stored HTML, in the sync and async fetchers alike"""
+    html = "<html><body><article>Great value, fast delivery</article></body></html>"
+    headers = {'ETag': '"v1"'}
+    scraper = WebScraper()
+    scraper._can_fetch = MagicMock(return_value=True)
+    scraper.session.get = MagicMock(side_effect=[page_response(200, html, headers), page_response(304)])
+    scraper.fetch_page("https://shop.example/reviews", keep_raw=True)
+    assert scraper.fetch_page("https://shop.example/reviews") == (None, "Great value, fast delivery")
+
+    responses = iter([httpx.Response(200, text=html, headers=headers), httpx.Response(304)])
+    scraper = WebScraper()
+
+    async def allowed(url):
+        return True
+    scraper._acan_fetch = allowed
+    scraper._async_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses)))
+
+    async def scenario():
+        await scraper.afetch_page("https://shop.example/reviews", keep_raw=True)
+        page = await scraper.afetch_page("https://shop.example/reviews")
+        await scraper.aclose()
+        return page
+
+    assert asyncio.run(scenario()) == (None, "Great value, fast delivery")
+
+def test_page_without_validators_is_not_cached():
+    """Pages without ETag or Last-Modified are fetched unconditionally"""
+    scraper = WebScraper()
+    scraper._can_fetch = MagicMock(return_value=True)
+    scraper.session.get = MagicMock(return_value=page_response(200, "<main>Hello</main>"))
+
+    scraper.fetch_page("https://shop.example/reviews")
+    scraper.fetch_page("https://shop.example/reviews")
+
+    assert 'If-None-Match' not in scraper.session.get.call_args[1]['headers']
+    assert scraper.page_cache.get("https://shop.example/reviews") is None
+
+def test_download_stops_after_review_container():
+    """Streaming stops once the first <article> closes and the raw HTML is dropped by default"""
+    scraper = WebScraper()
+    scraper._can_fetch = MagicMock(return_value=True)
+    html = "<header><article>Ad</article></header><article>Solid <b>kettle</b></article>" + "<p>footer</p>" * 1000
+    response = page_response(200, html)
+    scraper.session.get = MagicMock(return_value=response)
+
+    raw, text = scraper.fetch_page("https://shop.example/kettle")
+
+    assert raw is None
+    assert text == "Solid\nkettle"
+    assert len(list(response.iter_content.return_value)) > 0  # Remaining chunks were never read
+    response.close.assert_called_once()
+
+def test_page_reader_caps_bytes():
+    """Bodies beyond the byte cap are cut off"""
+    reader = PageReader('utf-8', max_bytes=10)
+    assert not reader.feed(b'<main>')
+    assert reader.feed(b'Hello world</main>')
+    assert reader.text() == '<main>Hell'
+
+def test_page_reader_handles_split_tags_and_scripts():
+    """Tags split across chunks are seen and tag-like strings inside scripts are ignored"""
+    reader = PageReader('utf-8', max_bytes=0)
+    chunks = [b'<script>s = "</art', b'icle>";</script><arti', b'cle>Caf\xc3', b'\xa9 ok</arti', b'cle>', b'<p>x</p>']
+    stopped_at = next(i for i, chunk in enumerate(chunks) if reader.feed(chunk))
+    assert stopped_at == 4
+    assert 'Caf\u00e9 ok' in reader.text()
+
+def test_page_cache_drops_least_recently_fetched():
+    """Past max_pages, the page fetched or revalidated longest ago is dropped"""
+    cache = PageCache(db_path=':memory:', max_pages=2)
+    with patch('utils.page_cache.time.time', return_value=1000.0):
+        cache.set('https://shop.example/a', '"a"', None, 'a', 'a')
+    with patch('utils.page_cache.time.time', return_value=1001.0):
+        cache.set('https://shop.example/b', '"b"', None, 'b', 'b')
+    with patch('utils.page_cache.time.time', return_value=1002.0):
+        cache.record(not_modified=True, url='https://shop.example/a')
+    with patch('utils.page_cache.time.time', return_value=1003.0):
+        cache.set('https://shop.example/c', '"c"', None, 'c', 'c')
+
+    assert cache.get('https://shop.example/b') is None
+    assert cache.get('https://shop.example/a')['body'] == 'a'
+    assert cache.stats()['pages'] == 2